@@ -1,68 +1,79 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import sqlite3
-import json
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, redirect, url_for
+import logging
 import os
+import sqlite3
 import uuid
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from config import DifyConfig
+from config import DifyConfig, JsonImportConfig, ServerConfig
+import db
+from db import get_db
+from dify_service import lookup_cached, process_dify_file, throttled_error
+import dify_cache
+import image_preprocess
+import import_jobs
+import import_sessions
+import json_import
+import logging_setup
+import metrics
+import migrations
+import part_catalog
+import parts_search
+import purchase_batch
+import purchase_export
+import purchase_queries
+import purchase_records
+import response_cache
+import rollups
+import save_requests
+import static_assets
+import upload_spool
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('main', __name__)
 
-app = Flask(__name__)
+def _use_dify_cache():
+    """False when the caller asked to bypass the Dify result cache for this request"""
+    if request.values.get('no_cache', '').lower() in ('1', 'true', 'yes'):
+        return False
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
 
 def init_db():
-    conn = sqlite3.connect('purchases.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS basic_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            page TEXT,
-            shipment_date TEXT NOT NULL,
-            order_number TEXT NOT NULL,
-            delivery_number TEXT NOT NULL,
-            person_in_charge TEXT NOT NULL,
-            shipping_cost INTEGER NOT NULL,
-            total_amount INTEGER NOT NULL,
-            import_session_id TEXT NOT NULL DEFAULT 'legacy',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS parts_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            basic_info_id INTEGER NOT NULL,
-            part_number TEXT NOT NULL,
-            part_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            unit_price INTEGER NOT NULL,
-            sales_amount INTEGER NOT NULL,
-            FOREIGN KEY (basic_info_id) REFERENCES basic_info (id)
-        )
-    ''')
+    conn = db.connect()
+    db.configure_database(conn)
+    migrations.migrate(conn)
     
-    try:
-        cursor.execute('PRAGMA table_info(basic_info)')
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'page' not in columns:
-            cursor.execute('ALTER TABLE basic_info ADD COLUMN page TEXT')
-            print('Database migration: Added page column to basic_info table')
-    except Exception as e:
-        print(f'Database migration warning: {e}')
+    cursor = conn.cursor()
+    import_jobs.create_tables(cursor)
+    dify_cache.create_tables(cursor)
     
     conn.commit()
     conn.close()
 
-@app.route('/')
+def create_app():
+    """Build the Flask app. The schema is set up separately by ``init_db()``,
+    once per deployment rather than once per worker (see ``wsgi.py``)."""
+    logging_setup.configure()
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    db.init_app(app)
+    metrics.init_app(app)
+    static_assets.init_app(app)
+    upload_spool.init_app(app)
+    return app
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/import')
+@bp.route('/import')
 def import_file():
     return render_template('import.html')
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
         return jsonify({'error': 'ファイルが選択されていません'}), 400
@@ -73,77 +84,22 @@ def upload_file():
     
     if file and file.filename.endswith('.json'):
         try:
-            content = file.read().decode('utf-8')
-            data = json.loads(content)
-            
-            if isinstance(data, dict) and 'text' in data:
-                import re
-                extracted_data = []
-                for item in data['text']:
-                    if isinstance(item, dict):
-                        transformed_item = {
-                            'ページ': item.get('ページ', ''),
-                            '出荷日': item.get('出荷日', ''),
-                            '受注番号': item.get('受注番号', ''),
-                            '納入先番号': item.get('納入先番号', ''),
-                            '担当者': item.get('担当者', ''),
-                            '運賃': item.get('運賃', 0),
-                            '税抜合計': item.get('税抜合計', 0),
-                            '部品番号': item.get('部品番号', []),
-                            '部品名': item.get('部品名', []),
-                            '数量': item.get('数量', []),
-                            '売上単価': item.get('売上単価', []),
-                            '売上金額': item.get('売上金額', [])
-                        }
-                        
-                        if '明細' in item and isinstance(item['明細'], list):
-                            parts_numbers = []
-                            parts_names = []
-                            quantities = []
-                            unit_prices = []
-                            amounts = []
-                            
-                            for detail in item['明細']:
-                                parts_numbers.append(detail.get('部品番号', ''))
-                                parts_names.append(detail.get('部品名', ''))
-                                quantities.append(str(detail.get('数量', 0)))
-                                unit_prices.append(str(detail.get('売上単価', 0)))
-                                amounts.append(str(detail.get('売上金額', 0)))
-                            
-                            transformed_item['部品番号'] = parts_numbers
-                            transformed_item['部品名'] = parts_names
-                            transformed_item['数量'] = quantities
-                            transformed_item['売上単価'] = unit_prices
-                            transformed_item['売上金額'] = amounts
-                        
-                        extracted_data.append(transformed_item)
-                    else:
-                        json_matches = re.findall(r'```json\n(.*?)\n```', str(item), re.DOTALL)
-                        for json_match in json_matches:
-                            try:
-                                parsed_json = json.loads(json_match)
-                                if isinstance(parsed_json, list):
-                                    extracted_data.extend(parsed_json)
-                                else:
-                                    extracted_data.append(parsed_json)
-                            except json.JSONDecodeError:
-                                continue
-                
-                if extracted_data:
-                    data = extracted_data
-                else:
-                    return jsonify({'error': 'Dify形式のJSONからデータを抽出できませんでした'}), 400
-            
-            if not isinstance(data, list):
-                return jsonify({'error': 'JSONデータは配列形式である必要があります'}), 400
-            
-            return jsonify({'success': True, 'data': data})
+            spool, record_count = json_import.spool_records(file.stream)
+        except json_import.ImportTooLarge:
+            limit_mb = JsonImportConfig.MAX_BYTES // (1024 * 1024)
+            return jsonify({'error': f'JSONファイルが大きすぎます（上限 {limit_mb}MB）'}), 413
+        except json_import.ImportFormatError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': f'JSONファイルの読み込みに失敗しました: {str(e)}'}), 400
+        
+        metrics.BATCH_SIZE.observe(record_count, kind='json_import_records')
+        return Response(json_import.stream_response(spool), mimetype='application/json')
     
     return jsonify({'error': '有効なJSONファイルを選択してください'}), 400
 
-@app.route('/api/dify/fetch-data', methods=['POST'])
+@bp.route('/api/dify/fetch-data', methods=['POST'])
+@upload_spool.scan_upload
 def fetch_data_from_dify():
     """Fetch data from Dify workflow using PNG file upload"""
     try:
@@ -157,109 +113,25 @@ def fetch_data_from_dify():
         if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
             return jsonify({'error': 'PNG、JPG、またはJPEGファイルを選択してください'}), 400
         
-        file.seek(0)  # Reset file pointer
-        
-        upload_files = {
-            'file': (file.filename, file, file.content_type)
-        }
-        upload_data = {
-            'user': 'purchases-maintenance-app'
-        }
-        
-        print(f"DEBUG: Uploading file to Dify first")
-        
-        upload_response = requests.post(
-            f"{DifyConfig.DIFY_API_BASE_URL}/v1/files/upload",
-            headers={'Authorization': f'Bearer {DifyConfig.DIFY_API_KEY}'},
-            files=upload_files,
-            data=upload_data,
-            timeout=30
-        )
-        
-        print(f"DEBUG: Upload response status: {upload_response.status_code}")
-        print(f"DEBUG: Upload response text: {upload_response.text}")
-        
-        if upload_response.status_code != 201:
-            return jsonify({
-                'error': f'Difyファイルアップロードエラー: {upload_response.status_code} - {upload_response.text}'
-            }), 500
-        
-        upload_result = upload_response.json()
-        file_id = upload_result.get('id')
-        
-        if not file_id:
-            return jsonify({'error': 'ファイルアップロードからIDを取得できませんでした'}), 500
-        
-        file_extension = file.filename.lower().split('.')[-1] if file.filename else ''
-        file_type = "image" if file_extension in ['png', 'jpg', 'jpeg'] else "file"
-        
-        workflow_payload = {
-            "inputs": {
-                "input_file": [{
-                    "type": file_type,
-                    "transfer_method": "local_file", 
-                    "upload_file_id": file_id
-                }]
-            },
-            "response_mode": "blocking",
-            "user": "purchases-maintenance-app"
-        }
-        
-        print(f"DEBUG: Executing workflow with file ID: {file_id}, file type: {file_type}")
-        
-        workflow_response = requests.post(
-            DifyConfig.get_workflow_run_url(),
-            headers=DifyConfig.get_headers(),
-            json=workflow_payload,
-            timeout=60
-        )
-        
-        print(f"DEBUG: Workflow response status: {workflow_response.status_code}")
-        
-        if workflow_response.status_code != 200:
-            print(f"DEBUG: Full workflow error response: {workflow_response.text}")
-            return jsonify({
-                'error': f'Difyワークフロー実行エラー: {workflow_response.status_code} - {workflow_response.text}'
-            }), 500
-        
-        workflow_result = workflow_response.json()
-        
-        if 'data' in workflow_result and workflow_result['data'].get('status') == 'failed':
-            error_msg = workflow_result['data'].get('error', 'Unknown workflow error')
-            return jsonify({'error': f'Difyワークフロー実行失敗: {error_msg}'}), 500
-        
-        if 'data' in workflow_result and 'outputs' in workflow_result['data']:
-            outputs = workflow_result['data']['outputs']
-            
-            if 'text' in outputs:
-                text_data = outputs['text']
-            else:
-                return jsonify({'error': 'Difyワークフローから"text"キーが見つかりませんでした'}), 500
-            
-            try:
-                if isinstance(text_data, str):
-                    cleaned_text = text_data.strip()
-                    if not cleaned_text or cleaned_text in ['[]', '[\n]', '[\n\n]']:
-                        return jsonify({
-                            'error': 'Difyから有効なデータが抽出されませんでした（画像に請求書データが含まれていない可能性があります）'
-                        }), 500
-                    
-                    data = json.loads(cleaned_text)
-                    if isinstance(data, list) and len(data) == 0:
-                        return jsonify({
-                            'error': 'Difyから有効なデータが抽出されませんでした（空の配列が返されました）'
-                        }), 500
-                else:
-                    data = text_data
-            except json.JSONDecodeError as e:
-                return jsonify({'error': f'JSON解析エラー: {str(e)}'}), 500
-            
-            if not isinstance(data, list):
-                return jsonify({'error': 'データは配列形式である必要があります'}), 400
-            
-            return jsonify({'success': True, 'data': data})
-        else:
-            return jsonify({'error': 'Difyワークフローの実行に失敗しました'}), 500
+        image_hash = dify_cache.hash_stream(file)
+        use_cache = _use_dify_cache()
+        if use_cache:
+            cached = lookup_cached(image_hash)
+            if cached is not None:
+                return jsonify({'success': True, 'data': cached, 'cached': True})
+        
+        # Same upload, throttling and retry handling as the multi-file route and import jobs.
+        preprocess = image_preprocess.BatchReport()
+        data, error = process_dify_file(file.filename, file, file.content_type, use_cache=False,
+                                        preprocess_report=preprocess, image_hash=image_hash)
+        if error:
+            status = 429 if error == throttled_error(file.filename) else 500
+            return jsonify({'error': error}), status
+        
+        result = {'success': True, 'data': data}
+        if preprocess.files:
+            result['preprocess'] = preprocess.as_dict()
+        return jsonify(result)
             
     except requests.exceptions.Timeout:
         return jsonify({'error': 'Dify APIのタイムアウトが発生しました（60秒）'}), 500
@@ -268,7 +140,8 @@ def fetch_data_from_dify():
     except Exception as e:
         return jsonify({'error': f'データ取得中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/api/dify/fetch-data-multiple', methods=['POST'])
+@bp.route('/api/dify/fetch-data-multiple', methods=['POST'])
+@upload_spool.scan_upload
 def fetch_data_from_dify_multiple():
     """Fetch data from Dify workflow using multiple PNG file uploads"""
     try:
@@ -283,121 +156,39 @@ def fetch_data_from_dify_multiple():
         processed_count = 0
         errors = []
         
+        # Each file's (records, error) outcome is stored at its upload index so the
+        # bounded pool can finish in any order while the response keeps file order.
+        outcomes = [None] * len(files)
         for i, file in enumerate(files):
             if file.filename == '':
                 continue
-                
             if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                errors.append(f'{file.filename}: PNG、JPG、またはJPEGファイルではありません')
-                continue
-            
-            try:
-                file.seek(0)
-                
-                upload_files = {
-                    'file': (file.filename, file, file.content_type)
-                }
-                upload_data = {
-                    'user': 'purchases-maintenance-app'
+                outcomes[i] = (None, f'{file.filename}: PNG、JPG、またはJPEGファイルではありません')
+        
+        pending = [i for i, file in enumerate(files) if file.filename != '' and outcomes[i] is None]
+        metrics.BATCH_SIZE.observe(len(pending), kind='dify_files')
+        use_cache = _use_dify_cache()
+        preprocess = image_preprocess.BatchReport()
+        if pending:
+            max_workers = max(1, min(DifyConfig.MAX_CONCURRENT_REQUESTS, len(pending)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    i: executor.submit(process_dify_file, files[i].filename, files[i], files[i].content_type, i, len(files),
+                                    use_cache, preprocess_report=preprocess)
+                    for i in pending
                 }
-                
-                print(f"DEBUG: Uploading file {i+1}/{len(files)}: {file.filename}")
-                
-                upload_response = requests.post(
-                    f"{DifyConfig.DIFY_API_BASE_URL}/v1/files/upload",
-                    headers={'Authorization': f'Bearer {DifyConfig.DIFY_API_KEY}'},
-                    files=upload_files,
-                    data=upload_data,
-                    timeout=30
-                )
-                
-                print(f"DEBUG: Upload response status for {file.filename}: {upload_response.status_code}")
-                
-                if upload_response.status_code != 201:
-                    errors.append(f'{file.filename}: アップロードエラー ({upload_response.status_code})')
-                    continue
-                
-                upload_result = upload_response.json()
-                file_id = upload_result.get('id')
-                
-                if not file_id:
-                    errors.append(f'{file.filename}: ファイルIDの取得に失敗')
-                    continue
-                
-                file_extension = file.filename.lower().split('.')[-1] if file.filename else ''
-                file_type = "image" if file_extension in ['png', 'jpg', 'jpeg'] else "file"
-                
-                workflow_payload = {
-                    "inputs": {
-                        "input_file": [{
-                            "type": file_type,
-                            "transfer_method": "local_file", 
-                            "upload_file_id": file_id
-                        }]
-                    },
-                    "response_mode": "blocking",
-                    "user": "purchases-maintenance-app"
-                }
-                
-                print(f"DEBUG: Executing workflow for {file.filename} with file ID: {file_id}, file type: {file_type}")
-                
-                workflow_response = requests.post(
-                    DifyConfig.get_workflow_run_url(),
-                    headers=DifyConfig.get_headers(),
-                    json=workflow_payload,
-                    timeout=60
-                )
-                
-                print(f"DEBUG: Workflow response status for {file.filename}: {workflow_response.status_code}")
-                
-                if workflow_response.status_code != 200:
-                    error_detail = workflow_response.text if workflow_response.text else "Unknown error"
-                    print(f"DEBUG: Full workflow error response for {file.filename}: {workflow_response.text}")
-                    errors.append(f'{file.filename}: ワークフロー実行エラー ({workflow_response.status_code}): {error_detail}')
-                    continue
-                
-                workflow_result = workflow_response.json()
-                print(f"DEBUG: Workflow result status for {file.filename}: {workflow_result.get('data', {}).get('status', 'unknown')}")
-                if 'data' in workflow_result and workflow_result['data'].get('status') == 'failed':
-                    error_msg = workflow_result['data'].get('error', 'Unknown workflow error')
-                    if 'Provided image is not valid' in error_msg:
-                        errors.append(f'{file.filename}: 画像が無効です（画像形式またはファイルが破損している可能性があります）')
-                    else:
-                        errors.append(f'{file.filename}: Difyワークフロー実行失敗: {error_msg}')
-                    continue
-                
-                if 'data' in workflow_result and 'outputs' in workflow_result['data']:
-                    outputs = workflow_result['data']['outputs']
-                    
-                    if 'text' in outputs:
-                        text_data = outputs['text']
-                        
-                        try:
-                            if isinstance(text_data, str):
-                                cleaned_text = text_data.strip()
-                                if not cleaned_text or cleaned_text in ['[]', '[\n]', '[\n\n]']:
-                                    errors.append(f'{file.filename}: Difyから有効なデータが抽出されませんでした（画像に請求書データが含まれていない可能性があります）')
-                                    continue
-                                
-                                data = json.loads(cleaned_text)
-                            else:
-                                data = text_data
-                            
-                            if isinstance(data, list) and len(data) > 0:
-                                all_data.extend(data)
-                                processed_count += 1
-                                print(f"DEBUG: Successfully processed {file.filename}, added {len(data)} records")
-                            else:
-                                errors.append(f'{file.filename}: Difyから有効なデータが抽出されませんでした（空の配列が返されました）')
-                        except json.JSONDecodeError as e:
-                            errors.append(f'{file.filename}: JSON解析エラー: {str(e)}')
-                    else:
-                        errors.append(f'{file.filename}: テキストデータが見つかりません')
-                else:
-                    errors.append(f'{file.filename}: ワークフロー結果の取得に失敗')
-                    
-            except Exception as e:
-                errors.append(f'{file.filename}: {str(e)}')
+                for i, future in futures.items():
+                    outcomes[i] = future.result()
+        
+        for outcome in outcomes:
+            if outcome is None:
+                continue
+            data, error = outcome
+            if error:
+                errors.append(error)
+            else:
+                all_data.extend(data)
+                processed_count += 1
         
         if processed_count == 0:
             return jsonify({'error': f'すべてのファイルの処理に失敗しました。エラー: {"; ".join(errors)}'}), 500
@@ -409,6 +200,9 @@ def fetch_data_from_dify_multiple():
             'total_count': len(files),
             'errors': errors
         }
+        if preprocess.files:
+            result['preprocess'] = preprocess.as_dict()
+            logger.info('Dify batch images pre-processed', extra=result['preprocess'])
         
         return jsonify(result)
         
@@ -419,100 +213,151 @@ def fetch_data_from_dify_multiple():
     except Exception as e:
         return jsonify({'error': f'複数ファイル処理中にエラーが発生しました: {str(e)}'}), 500
 
-@app.route('/basic_info')
+@bp.route('/api/import_jobs', methods=['POST'])
+@upload_spool.scan_upload
+def create_import_job():
+    """Queue uploaded images for background Dify processing and return the job id"""
+    try:
+        if 'files' not in request.files:
+            return jsonify({'error': 'ファイルが選択されていません'}), 400
+        
+        files = request.files.getlist('files')
+        if not files or all(file.filename == '' for file in files):
+            return jsonify({'error': 'ファイルが選択されていません'}), 400
+        
+        # 取込画面ごとのIDで担当者を区別し、同時に取り込む人の間で順番に処理する
+        owner = request.form.get('client_id') or request.remote_addr or ''
+        job_id = import_jobs.create_job(files, use_cache=_use_dify_cache(), owner=owner[:64])
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('.get_import_job', job_id=job_id),
+            'events_url': url_for('.import_job_events', job_id=job_id),
+            'total_count': len(files)
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': f'取込ジョブの作成に失敗しました: {str(e)}'}), 500
+
+@bp.route('/api/import_jobs/<job_id>')
+def get_import_job(job_id):
+    job = import_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': '取込ジョブが見つかりません'}), 404
+    return jsonify(job)
+
+@bp.route('/api/import_jobs/<job_id>/events')
+def import_job_events(job_id):
+    """Server-sent events for each file of the job as it finishes"""
+    if not import_jobs.job_exists(job_id):
+        return jsonify({'error': '取込ジョブが見つかりません'}), 404
+    
+    # EventSource の自動再接続は Last-Event-ID ヘッダー、画面の再読込後はクエリで続きから送る
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '')
+    last_seq = int(last_event_id) if last_event_id.isdigit() else 0
+    
+    response = Response(import_jobs.job_events(job_id, last_seq), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/dify/cache', methods=['GET'])
+def dify_cache_stats():
+    return jsonify(dify_cache.stats())
+
+@bp.route('/api/dify/cache', methods=['DELETE'])
+def clear_dify_cache():
+    try:
+        dify_cache.clear()
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/basic_info')
 def basic_info():
     return render_template('basic_info.html')
 
-@app.route('/parts_info/<int:basic_id>')
+@bp.route('/parts_info/<int:basic_id>')
 def parts_info(basic_id):
     return render_template('parts_info.html', basic_id=basic_id)
 
-@app.route('/parts_info/pending')
+@bp.route('/parts_info/pending')
 def parts_info_pending():
     return render_template('parts_info_pending.html')
 
-@app.route('/purchase_list')
+@bp.route('/purchase_list')
 def purchase_list():
     return render_template('purchase_list.html')
 
-@app.route('/api/save_data', methods=['POST'])
+@bp.route('/api/save_data', methods=['POST'])
 def save_data():
     try:
         data = request.json
-        conn = sqlite3.connect('purchases.db')
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+        if len(idempotency_key) > save_requests.MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Keyは{save_requests.MAX_KEY_LENGTH}文字以内で指定してください'}), 400
+        
+        prepared, errors = purchase_records.prepare_records(data)
+        if errors:
+            return jsonify({
+                'error': f'{len(errors)}件のレコードに不正なデータがあります。保存は行われていません',
+                'errors': errors
+            }), 400
+        
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        # 同じキーでの再送には最初の保存結果をそのまま返す
+        if idempotency_key:
+            digest = save_requests.payload_hash(data)
+            stored = save_requests.find(cursor, idempotency_key)
+            if stored:
+                conn.rollback()
+                stored_digest, response = stored
+                if stored_digest != digest:
+                    return jsonify({'error': 'このIdempotency-Keyは別の内容の保存で使用済みです'}), 409
+                return jsonify(dict(response, replayed=True))
         
         session_id = str(uuid.uuid4())
+        result = purchase_records.save_records(conn, prepared, session_id)
+        metrics.BATCH_SIZE.observe(len(prepared), kind='save_data_records')
+        
+        response = {
+            'success': True,
+            'session_id': session_id,
+            'saved_count': len(result['ids']),
+            'inserted_count': result['inserted'],
+            'updated_count': result['updated'],
+            'unchanged_count': result['unchanged'],
+            'parts_count': result['parts']
+        }
+        if idempotency_key:
+            save_requests.record(cursor, idempotency_key, digest, response)
         
-        for record in data:
-            cursor.execute('''
-                INSERT INTO basic_info 
-                (page, shipment_date, order_number, delivery_number, person_in_charge, shipping_cost, total_amount, import_session_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                record.get('ページ', ''),
-                record['出荷日'],
-                record['受注番号'],
-                record['納入先番号'],
-                record['担当者'],
-                int(record['運賃']),
-                int(record['税抜合計']),
-                session_id
-            ))
-            
-            basic_id = cursor.lastrowid
-            
-            parts_count = len(record['部品番号'])
-            for i in range(parts_count):
-                cursor.execute('''
-                    INSERT INTO parts_info 
-                    (basic_info_id, part_number, part_name, quantity, unit_price, sales_amount)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    basic_id,
-                    record['部品番号'][i],
-                    record['部品名'][i],
-                    int(record['数量'][i]),
-                    int(record['売上単価'][i]),
-                    int(record['売上金額'][i])
-                ))
-        
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
-        return jsonify({'success': True, 'session_id': session_id})
+        return jsonify(response)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/basic_info')
+@bp.route('/api/basic_info')
+@response_cache.cached_json
 def api_basic_info():
-    conn = sqlite3.connect('purchases.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT import_session_id 
-        FROM basic_info 
-        ORDER BY created_at DESC 
-        LIMIT 1
-    ''')
-    
-    latest_session = cursor.fetchone()
-    if not latest_session:
-        conn.close()
+    latest_session_id = import_sessions.latest_session_id(cursor)
+    if latest_session_id is None:
         return jsonify([])
     
-    latest_session_id = latest_session[0]
-    
     cursor.execute('''
-        SELECT b.id, b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge, 
-               b.shipping_cost, b.total_amount, b.created_at,
-               COALESCE(SUM(p.sales_amount), 0) as parts_total
-        FROM basic_info b
-        LEFT JOIN parts_info p ON b.id = p.basic_info_id
-        WHERE b.import_session_id = ?
-        GROUP BY b.id, b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge, 
-                 b.shipping_cost, b.total_amount, b.created_at
-        ORDER BY b.shipment_date DESC
+        SELECT id, page, shipment_date, order_number, delivery_number, person_in_charge, 
+               shipping_cost, total_amount, created_at, parts_total
+        FROM basic_info
+        WHERE import_session_id = ?
+        ORDER BY shipment_date_iso DESC
     ''', (latest_session_id,))
     
     records = []
@@ -532,41 +377,71 @@ def api_basic_info():
             'created_at': row[8]
         })
     
-    conn.close()
     return jsonify(records)
 
-@app.route('/api/purchase_list')
+@bp.route('/api/purchase_list')
+@response_cache.cached_json
 def api_purchase_list():
-    conn = sqlite3.connect('purchases.db')
-    cursor = conn.cursor()
+    try:
+        options = purchase_queries.parse_list_args(request.args)
+    except purchase_queries.QueryError as e:
+        return jsonify({'error': str(e)}), 400
     
-    cursor.execute('''
-        SELECT id, page, shipment_date, order_number, delivery_number, person_in_charge, 
-               shipping_cost, total_amount, created_at
-        FROM basic_info 
-        ORDER BY shipment_date DESC
-    ''')
+    result = purchase_queries.list_purchases(get_db(), **options)
+    return jsonify({'success': True, 'data': result})
+
+@bp.route('/api/purchase_list/export')
+def export_purchase_list():
+    try:
+        filters = purchase_queries.parse_filter_args(request.args)
+    except purchase_queries.QueryError as e:
+        return jsonify({'error': str(e)}), 400
     
-    records = []
-    for row in cursor.fetchall():
-        records.append({
-            'id': row[0],
-            'ページ': row[1],
-            'shipment_date': row[2],
-            'order_number': row[3],
-            'delivery_number': row[4],
-            'person_in_charge': row[5],
-            'shipping_cost': row[6],
-            'total_amount': row[7],
-            'created_at': row[8]
-        })
+    filename = f'purchases_{datetime.now():%Y%m%d_%H%M%S}.csv'
+    response = Response(purchase_export.stream_csv(**filters), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.cache_control.no_store = True
+    return response
+
+@bp.route('/api/summary/<dimension>')
+@response_cache.cached_json
+def api_summary(dimension):
+    try:
+        options = rollups.parse_summary_args(dimension, request.args)
+    except purchase_queries.QueryError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn.close()
-    return jsonify(records)
+    rows = rollups.summary(get_db().cursor(), **options)
+    return jsonify({'success': True, 'data': rows})
+
+@bp.route('/api/parts_info/search')
+@response_cache.cached_json
+def api_parts_search():
+    try:
+        options = parts_search.parse_search_args(request.args)
+    except purchase_queries.QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result = parts_search.search_parts(get_db(), **options)
+    return jsonify({'success': True, 'data': result})
+
+@bp.route('/api/parts/price_history')
+@response_cache.cached_json
+def api_part_price_history():
+    try:
+        options = part_catalog.parse_history_args(request.args)
+    except purchase_queries.QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result = part_catalog.price_history(get_db().cursor(), **options)
+    if result is None:
+        return jsonify({'error': '部品が見つかりません'}), 404
+    return jsonify({'success': True, 'data': result})
 
-@app.route('/api/parts_info/<int:basic_id>')
+@bp.route('/api/parts_info/<int:basic_id>')
+@response_cache.cached_json
 def api_parts_info(basic_id):
-    conn = sqlite3.connect('purchases.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -586,24 +461,24 @@ def api_parts_info(basic_id):
             'sales_amount': row[5]
         })
     
-    conn.close()
     return jsonify(parts)
 
-@app.route('/api/basic_info/<int:record_id>', methods=['PUT'])
+@bp.route('/api/basic_info/<int:record_id>', methods=['PUT'])
 def update_basic_info(record_id):
     try:
         data = request.json
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
             UPDATE basic_info 
-            SET page = ?, shipment_date = ?, order_number = ?, delivery_number = ?, 
+            SET page = ?, shipment_date = ?, shipment_date_iso = ?, order_number = ?, delivery_number = ?, 
                 person_in_charge = ?, shipping_cost = ?, total_amount = ?
             WHERE id = ?
         ''', (
             data.get('page', ''),
             data['shipment_date'],
+            purchase_records.normalize_shipment_date(data['shipment_date']),
             data['order_number'],
             data['delivery_number'],
             data['person_in_charge'],
@@ -613,65 +488,66 @@ def update_basic_info(record_id):
         ))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': 'レコードが見つかりません'}), 404
         
+        import_sessions.refresh_session(cursor, import_sessions.session_of_record(cursor, record_id))
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     
+    except sqlite3.IntegrityError:
+        return jsonify({'error': '同じ受注番号・ページ・出荷日のデータが既に登録されています'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/basic_info/<int:record_id>', methods=['DELETE'])
+@bp.route('/api/basic_info/<int:record_id>', methods=['DELETE'])
 def delete_basic_info(record_id):
     try:
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM parts_info WHERE basic_info_id = ?', (record_id,))
-        
-        cursor.execute('DELETE FROM basic_info WHERE id = ?', (record_id,))
-        
-        if cursor.rowcount == 0:
-            conn.close()
+        session_id = import_sessions.session_of_record(cursor, record_id)
+        if not purchase_batch.delete_records(cursor, [record_id]):
             return jsonify({'error': 'レコードが見つかりません'}), 404
         
+        import_sessions.refresh_session(cursor, session_id)
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/basic_info/delete/<int:record_id>', methods=['GET'])
+@bp.route('/basic_info/delete/<int:record_id>', methods=['GET'])
 def delete_basic_info_page(record_id):
     try:
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM parts_info WHERE basic_info_id = ?', (record_id,))
-        cursor.execute('DELETE FROM basic_info WHERE id = ?', (record_id,))
+        session_id = import_sessions.session_of_record(cursor, record_id)
+        purchase_batch.delete_records(cursor, [record_id])
+        if session_id is not None:
+            import_sessions.refresh_session(cursor, session_id)
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
-        return redirect(url_for('basic_info'))
+        return redirect(url_for('.basic_info'))
     except Exception as e:
-        return redirect(url_for('basic_info'))
+        return redirect(url_for('.basic_info'))
 
-@app.route('/api/parts_info/<int:part_id>', methods=['PUT'])
+@bp.route('/api/parts_info/<int:part_id>', methods=['PUT'])
 def update_parts_info(part_id):
     try:
         data = request.json
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
         
+        label = (data['part_number'], data['part_name'])
         cursor.execute('''
-            UPDATE parts_info 
-            SET part_number = ?, part_name = ?, quantity = ?, 
+            UPDATE part_lines 
+            SET label_id = ?, quantity = ?, 
                 unit_price = ?, sales_amount = ?
             WHERE id = ?
         ''', (
-            data['part_number'],
-            data['part_name'],
+            part_catalog.intern(cursor, [label]).get(label),
             int(data['quantity']),
             int(data['unit_price']),
             int(data['sales_amount']),
@@ -679,44 +555,76 @@ def update_parts_info(part_id):
         ))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': '部品情報が見つかりません'}), 404
         
+        import_sessions.refresh_record(cursor, import_sessions.record_of_part(cursor, part_id))
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/parts_info/<int:part_id>', methods=['DELETE'])
+@bp.route('/api/parts_info/<int:part_id>', methods=['DELETE'])
 def delete_parts_info(part_id):
     try:
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM parts_info WHERE id = ?', (part_id,))
+        basic_info_id = import_sessions.record_of_part(cursor, part_id)
+        cursor.execute('DELETE FROM part_lines WHERE id = ?', (part_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': '部品情報が見つかりません'}), 404
         
+        import_sessions.refresh_record(cursor, basic_info_id)
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/delete_all_data', methods=['POST'])
+@bp.route('/api/batch', methods=['POST'])
+def batch_update():
+    try:
+        operations, errors = purchase_batch.prepare_operations(request.json)
+        if errors:
+            return jsonify({
+                'error': f'{len(errors)}件の操作に不正な内容があります。変更は行われていません',
+                'errors': errors
+            }), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        results = purchase_batch.apply_operations(cursor, operations)
+        metrics.BATCH_SIZE.observe(len(operations), kind='batch_operations')
+        
+        applied = sum(1 for result in results if result['status'] in ('updated', 'deleted'))
+        if applied:
+            response_cache.bump(cursor)
+        conn.commit()
+        return jsonify({
+            'success': True,
+            'applied_count': applied,
+            'failed_count': len(results) - applied,
+            'results': results
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/delete_all_data', methods=['POST'])
 def delete_all_data():
     try:
-        conn = sqlite3.connect('purchases.db')
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM parts_info')
+        cursor.execute('DELETE FROM part_lines')
         cursor.execute('DELETE FROM basic_info')
+        cursor.execute('DELETE FROM import_sessions')
+        response_cache.bump(cursor)
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -724,4 +632,5 @@ def delete_all_data():
 
 if __name__ == '__main__':
     init_db()
-    app.run(debug=True, host='0.0.0.0', port=8001)
+    import_jobs.resume_jobs()
+    create_app().run(host=ServerConfig.HOST, port=ServerConfig.PORT, debug=ServerConfig.DEBUG, threaded=True)
@@ -0,0 +1,90 @@
+"""/api/basic_info latency as the import history grows.
+
+Fills a scratch database with N saved sessions (``--session-size`` records of
+``--parts`` parts each) and times, for each history size, the previous
+latest-session scan + LEFT JOIN/GROUP BY against the endpoint reading
+``import_sessions`` and the stored ``parts_total``.
+
+    python benchmarks/bench_basic_info.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+import db
+import purchase_records
+from benchmarks.bench_save_data import make_payload
+
+
+def legacy_basic_info(conn):
+    """The two queries /api/basic_info ran before import_sessions existed."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT import_session_id FROM basic_info ORDER BY created_at DESC LIMIT 1')
+    session_id = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT b.id, b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge,
+               b.shipping_cost, b.total_amount, b.created_at,
+               COALESCE(SUM(p.sales_amount), 0) as parts_total
+        FROM basic_info b
+        LEFT JOIN part_lines p ON b.id = p.basic_info_id
+        WHERE b.import_session_id = ?
+        GROUP BY b.id, b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge,
+                 b.shipping_cost, b.total_amount, b.created_at
+        ORDER BY b.shipment_date DESC
+    ''', (session_id,))
+    return cursor.fetchall()
+
+
+def grow_history(conn, target, session_size, parts):
+    cursor = conn.cursor()
+    cursor.execute("SELECT row_count FROM row_counts WHERE table_name = 'basic_info'")
+    current = cursor.fetchone()[0]
+    while current < target:
+        # Distinct order numbers per session, since saves upsert on the natural key.
+        prepared, errors = purchase_records.prepare_records(
+            make_payload(session_size, parts, first_order=1000000 + current))
+        assert not errors, errors
+        purchase_records.save_records(conn, prepared, str(uuid.uuid4()))
+        conn.commit()
+        current += session_size
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--session-size', type=int, default=20)
+    parser.add_argument('--parts', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'history.db')
+        app_module.init_db()
+        conn = db.connect()
+        client = app_module.create_app().test_client()
+
+        for size in sorted(args.sizes):
+            grow_history(conn, size, args.session_size, args.parts)
+            legacy_ms = timed(lambda: legacy_basic_info(conn), args.repeat)
+            endpoint_ms = timed(lambda: client.get('/api/basic_info'), args.repeat)
+            print(f'records={size:<8} legacy queries={legacy_ms:8.2f}ms  endpoint={endpoint_ms:6.2f}ms')
+
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""N single-row calls vs one ``POST /api/batch``.
+
+Saves ``--records`` records of ``--parts`` part lines, then edits the sales
+amount of ``--rows`` part lines and deletes ``--rows`` records, once with one
+``PUT`` / ``DELETE`` request per row and once with a single batch request per
+step, and prints the time of each.
+
+    python benchmarks/bench_batch.py --records 5000 --parts 10 --rows 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+import db
+import purchase_records
+from benchmarks.bench_save_data import make_payload
+
+
+def seed(records, parts):
+    conn = db.connect()
+    prepared, errors = purchase_records.prepare_records(make_payload(records, parts))
+    assert not errors, errors
+    purchase_records.save_records(conn, prepared, str(uuid.uuid4()))
+    conn.commit()
+    record_ids = [row[0] for row in conn.execute('SELECT id FROM basic_info ORDER BY id')]
+    part_ids = [row[0] for row in conn.execute('SELECT MIN(id) FROM parts_info GROUP BY basic_info_id ORDER BY 1')]
+    conn.close()
+    return record_ids, part_ids
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--parts', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=500)
+    args = parser.parse_args()
+
+    for mode in ('single', 'batch'):
+        with tempfile.TemporaryDirectory() as tmp:
+            DatabaseConfig.PATH = os.path.join(tmp, 'batch.db')
+            app_module.init_db()
+            record_ids, part_ids = seed(args.records, args.parts)
+            client = app_module.create_app().test_client()
+            # Edit parts of the first records and delete the last ones so the steps do not overlap.
+            edits = part_ids[:args.rows]
+            deletes = record_ids[-args.rows:]
+            part = {'part_number': 'P-1', 'part_name': '部品', 'quantity': 2, 'unit_price': 150, 'sales_amount': 300}
+
+            if mode == 'single':
+                update_ms = timed(lambda: [client.put(f'/api/parts_info/{part_id}', json=part) for part_id in edits])
+                delete_ms = timed(lambda: [client.delete(f'/api/basic_info/{record_id}') for record_id in deletes])
+            else:
+                update_ms = timed(lambda: client.post('/api/batch', json={'operations': [
+                    {'op': 'update', 'table': 'parts_info', 'id': part_id, 'data': part} for part_id in edits
+                ]}))
+                delete_ms = timed(lambda: client.post('/api/batch', json={'operations': [
+                    {'op': 'delete', 'table': 'basic_info', 'id': record_id} for record_id in deletes
+                ]}))
+            print(f'{mode:<6} update {len(edits)} parts={update_ms:9.1f}ms  delete {len(deletes)} records={delete_ms:9.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
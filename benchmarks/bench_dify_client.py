@@ -0,0 +1,85 @@
+"""Compare per-file Dify latency with bare requests.post vs the pooled client.
+
+Each "file" is one upload followed by one workflow run, issued sequentially
+the way a batch worker does. The stub charges --connect-latency once per TCP
+connection to stand in for the TCP+TLS handshake of the real API, which the
+pooled keep-alive client pays only once per pooled connection.
+
+    python benchmarks/bench_dify_client.py --files 30 --connect-latency 0.05
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dify_stub import DifyStub
+from config import DifyConfig
+from dify_client import DifyClient
+
+
+def bare_requests(filename, stream):
+    upload = requests.post(
+        f"{DifyConfig.DIFY_API_BASE_URL}/v1/files/upload",
+        headers={'Authorization': f'Bearer {DifyConfig.DIFY_API_KEY}'},
+        files={'file': (filename, stream, 'image/png')},
+        data={'user': 'purchases-maintenance-app'},
+        timeout=30
+    )
+    requests.post(
+        DifyConfig.get_workflow_run_url(),
+        headers=DifyConfig.get_headers(),
+        json={'inputs': {'upload_file_id': upload.json()['id']}, 'response_mode': 'blocking'},
+        timeout=60
+    )
+
+
+def pooled_client(client):
+    def run(filename, stream):
+        upload = client.upload_file(filename, stream, 'image/png')
+        client.run_workflow({'inputs': {'upload_file_id': upload.json()['id']}, 'response_mode': 'blocking'})
+    return run
+
+
+def measure(label, run, stub, file_count, payload):
+    connections_before = stub.connection_count
+    started = time.perf_counter()
+    for i in range(file_count):
+        run(f'page_{i:03d}.png', io.BytesIO(payload))
+    elapsed = time.perf_counter() - started
+    per_file = elapsed / file_count * 1000
+    print(f'{label:<14} files={file_count:<4} elapsed={elapsed:.2f}s per_file={per_file:.1f}ms '
+          f'connections={stub.connection_count - connections_before}')
+    return per_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=30)
+    parser.add_argument('--connect-latency', type=float, default=0.03)
+    parser.add_argument('--upload-latency', type=float, default=0.0)
+    parser.add_argument('--workflow-latency', type=float, default=0.0)
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.file_size)
+
+    with DifyStub(args.upload_latency, args.workflow_latency, args.connect_latency) as stub:
+        DifyConfig.DIFY_API_BASE_URL = stub.base_url
+        DifyConfig.RATE_LIMIT_PER_MINUTE = 0  # the stub has no rate limit to stay under
+        client = DifyClient()
+        try:
+            bare = measure('requests.post', bare_requests, stub, args.files, payload)
+            pooled = measure('DifyClient', pooled_client(client), stub, args.files, payload)
+        finally:
+            client.close()
+
+    print(f'saved per file: {bare - pooled:.1f}ms ({(1 - pooled / bare) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure /api/dify/fetch-data-multiple against a local Dify stub.
+
+Runs the same batch with the concurrency limit set to 1 (the old sequential
+behaviour) and to the configured value, and prints the wall time of each.
+Every file gets its own random bytes and the batch is posted with
+``no_cache=1``, so each one goes to the stub rather than the result cache.
+
+    python benchmarks/bench_dify_fanout.py --files 40 --concurrency 8
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dify_stub import DifyStub
+from config import DatabaseConfig, DifyConfig, ImagePreprocessConfig
+import app as app_module
+
+
+def run_batch(client, file_count, file_size):
+    data = {
+        'files': [(io.BytesIO(os.urandom(file_size)), f'page_{i:03d}.png', 'image/png') for i in range(file_count)]
+    }
+    started = time.perf_counter()
+    response = client.post('/api/dify/fetch-data-multiple?no_cache=1', data=data, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - started
+    result = response.get_json()
+    assert response.status_code == 200, result
+    assert result['processed_count'] == file_count, result
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=DifyConfig.MAX_CONCURRENT_REQUESTS)
+    parser.add_argument('--upload-latency', type=float, default=0.05)
+    parser.add_argument('--workflow-latency', type=float, default=0.3)
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, DifyStub(args.upload_latency, args.workflow_latency) as stub:
+        DatabaseConfig.PATH = os.path.join(tmp, 'bench.db')
+        app_module.init_db()
+        client = app_module.create_app().test_client()
+        DifyConfig.DIFY_API_BASE_URL = stub.base_url
+        DifyConfig.RATE_LIMIT_PER_MINUTE = 0  # the stub has no rate limit to stay under
+        ImagePreprocessConfig.ENABLED = False  # random bytes, not images
+        results = {}
+        for concurrency in (1, args.concurrency):
+            DifyConfig.MAX_CONCURRENT_REQUESTS = concurrency
+            results[concurrency] = run_batch(client, args.files, args.file_size)
+            print(f'concurrency={concurrency:<3} files={args.files:<4} elapsed={results[concurrency]:.2f}s '
+                  f'per_file={results[concurrency] / args.files * 1000:.0f}ms')
+
+    print(f'speedup: {results[1] / results[args.concurrency]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
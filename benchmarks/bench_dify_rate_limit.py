@@ -0,0 +1,131 @@
+"""Several worker processes importing at once against a rate-limited Dify stub.
+
+The stub answers 429 (``Retry-After: 1``) beyond ``--dify-limit`` requests
+per second. ``--workers`` forked processes, each running
+``--concurrency`` threads, extract ``--files`` images between them, first
+with the shared rate limit off and then with it set just under the stub's
+limit. Prints the 429s Dify sent, the files that failed and the wall time.
+
+Then checks fair scheduling: one operator queues a long import job, a
+second operator queues a short one right after, and the time until the
+short job finishes is compared with both jobs under the same owner (plain
+arrival order).
+
+    python benchmarks/bench_dify_rate_limit.py --workers 3 --files 60 --dify-limit 10
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dify_stub import DifyStub
+from config import DatabaseConfig, DifyConfig, ImportJobConfig
+import app as app_module
+import dify_client
+import dify_service
+import import_jobs
+
+
+def extract(files, concurrency, size, failures):
+    def one(i):
+        records, error = dify_service.process_dify_file(f'page_{i:03d}.png', io.BytesIO(os.urandom(size)),
+                                                        'image/png', use_cache=False)
+        return error is not None
+
+    dify_client.reset_client()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        failed = sum(pool.map(one, range(files)))
+    with failures.get_lock():
+        failures.value += failed
+
+
+def run_workers(stub, args, per_minute):
+    DifyConfig.RATE_LIMIT_PER_MINUTE = per_minute
+    stub.throttled_count = 0
+    context = multiprocessing.get_context('fork')
+    failures = context.Value('i', 0)
+    per_worker = args.files // args.workers
+    started = time.perf_counter()
+    workers = [context.Process(target=extract, args=(per_worker, args.concurrency, args.file_size, failures))
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    label = f'{per_minute}/min' if per_minute else 'off'
+    print(f'rate_limit={label:<9} files={per_worker * args.workers:<4} dify_429s={stub.throttled_count:<5} '
+          f'failed={failures.value:<4} elapsed={elapsed:.2f}s')
+
+
+class Upload(io.BytesIO):
+    """The parts of werkzeug's FileStorage that ``import_jobs.create_job`` uses."""
+
+    def __init__(self, filename, size):
+        super().__init__(os.urandom(size))
+        self.filename = filename
+        self.content_type = 'image/png'
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.getvalue())
+
+
+def short_job_wait(args, long_owner, short_owner):
+    long_files = [Upload(f'long_{i:03d}.png', 1024) for i in range(args.long_job)]
+    short_files = [Upload(f'short_{i:03d}.png', 1024) for i in range(args.short_job)]
+    started = time.perf_counter()
+    import_jobs.create_job(long_files, use_cache=False, owner=long_owner)
+    short_id = import_jobs.create_job(short_files, use_cache=False, owner=short_owner)
+    while import_jobs.get_job(short_id)['status'] == 'running':
+        time.sleep(0.05)
+    waited = time.perf_counter() - started
+    import_jobs.shutdown(wait=True)
+    return waited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--files', type=int, default=60)
+    parser.add_argument('--dify-limit', type=float, default=10, help='requests per second the stub accepts')
+    parser.add_argument('--workflow-latency', type=float, default=0.2)
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    parser.add_argument('--long-job', type=int, default=24)
+    parser.add_argument('--short-job', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'bench.db')
+        ImportJobConfig.STORAGE_DIR = os.path.join(tmp, 'jobs')
+        app_module.init_db()
+
+        with DifyStub(upload_latency=0.02, workflow_latency=args.workflow_latency,
+                      rate_limit=args.dify_limit) as stub:
+            DifyConfig.DIFY_API_BASE_URL = stub.base_url
+            DifyConfig.RESPONSE_MODE = 'blocking'
+            DifyConfig.RETRY_BACKOFF_BASE = 0.1
+            run_workers(stub, args, 0)
+            time.sleep(1)
+            run_workers(stub, args, int(args.dify_limit * 60 * 0.9))
+
+        print()
+        with DifyStub(upload_latency=0.02, workflow_latency=args.workflow_latency) as stub:
+            DifyConfig.DIFY_API_BASE_URL = stub.base_url
+            DifyConfig.RATE_LIMIT_PER_MINUTE = 0
+            dify_client.reset_client()
+            for label, owners in (('arrival order', ('a', 'a')), ('fair', ('a', 'b'))):
+                waited = short_job_wait(args, *owners)
+                print(f'scheduling={label:<14} long_job={args.long_job:<3} short_job={args.short_job:<3} '
+                      f'short_job_done={waited:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Memory and time of the CSV export as the result grows.
+
+Seeds ``--records`` records of ``--parts`` part lines each, then drains
+``purchase_export.stream_csv`` and reports rows/sec, time to the first chunk
+and the Python peak allocation (``tracemalloc``), which should not grow with
+the row count. A last run stops after the first chunk, as a disconnecting
+client does, and reports how long closing the generator took.
+
+    python benchmarks/bench_export.py --records 20000 --parts 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+import db
+import purchase_export
+from benchmarks.bench_parts_search import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--parts', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'export.db')
+        app_module.init_db()
+        conn = db.connect()
+        seed(conn, args.records * args.parts, args.parts)
+        conn.close()
+
+        for date_to in ('2025-01-31', '2025-06-30', None):
+            tracemalloc.start()
+            started = time.perf_counter()
+            chunks = purchase_export.stream_csv(date_to=date_to)
+            first = None
+            size = 0
+            for chunk in chunks:
+                if first is None:
+                    first = time.perf_counter() - started
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'date_to={str(date_to):<11} bytes={size:>11,} elapsed={elapsed:6.2f}s '
+                  f'first_chunk={first * 1000:6.1f}ms peak={peak / 1024:8.0f}KiB')
+
+        started = time.perf_counter()
+        chunks = purchase_export.stream_csv()
+        next(chunks)
+        chunks.close()
+        print(f'abandoned after first chunk: {(time.perf_counter() - started) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
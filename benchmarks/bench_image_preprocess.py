@@ -0,0 +1,125 @@
+"""Upload size and time of a Dify batch with and without image pre-processing.
+
+Generates ``--scans`` 600dpi A4 scans (PNG) and ``--photos`` phone photos
+(JPEG with an EXIF orientation) of a delivery note, and sends them through
+``/api/dify/fetch-data-multiple`` to a local Dify stub whose uploads run at
+``--bandwidth`` bytes per second. Prints the bytes Dify received, the wall
+time and the per-stage pre-processing report; ``--grayscale`` also converts
+to grayscale (off by default, as in the app). Needs Pillow.
+
+    python benchmarks/bench_image_preprocess.py --scans 4 --photos 4 --bandwidth 2500000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dify_stub import DifyStub
+from config import DatabaseConfig, DifyConfig, ImagePreprocessConfig
+import app as app_module
+import image_preprocess
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    sys.exit('Pillow is required: pip install Pillow')
+
+
+def delivery_note(size, background):
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(size[0])
+    line = size[1] // 60
+    for y in range(line * 4, size[1] - line * 4, line):
+        x = size[0] // 12
+        while x < size[0] * 11 // 12:
+            width = rng.randint(line // 2, line * 4)
+            draw.rectangle((x, y, x + width, y + line // 2), fill=(20, 20, 30))
+            x += width + line // 2
+        draw.line((size[0] // 12, y + line * 3 // 4, size[0] * 11 // 12, y + line * 3 // 4), fill=(90, 90, 200))
+    return image
+
+
+def scan():
+    image = delivery_note((4960, 7016), (250, 250, 245))
+    # A little scanner noise on the paper: a clean synthetic page compresses far better than a real one.
+    noise = Image.effect_noise(image.size, 6).convert('RGB')
+    image = Image.blend(image, noise, 0.04)
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def photo():
+    image = delivery_note((4032, 3024), (214, 206, 190))
+    # Sensor noise, which is what makes phone photos large.
+    noise = Image.effect_noise(image.size, 24).convert('RGB')
+    image = Image.blend(image, noise, 0.12)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW to display
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=92, exif=exif)
+    return output.getvalue()
+
+
+def run_batch(client, images):
+    data = {'files': [(io.BytesIO(content), name, content_type) for name, content, content_type in images]}
+    started = time.perf_counter()
+    response = client.post('/api/dify/fetch-data-multiple?no_cache=1', data=data, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - started
+    result = response.get_json()
+    assert response.status_code == 200 and not result['errors'], result
+    return elapsed, result.get('preprocess')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scans', type=int, default=4)
+    parser.add_argument('--photos', type=int, default=4)
+    parser.add_argument('--bandwidth', type=float, default=2.5e6, help='upload bytes per second')
+    parser.add_argument('--workflow-latency', type=float, default=0.5)
+    parser.add_argument('--grayscale', action='store_true')
+    args = parser.parse_args()
+    ImagePreprocessConfig.GRAYSCALE = args.grayscale
+
+    scan_bytes, photo_bytes = scan(), photo()
+    print(f'scan={len(scan_bytes) / 1e6:.1f}MB photo={len(photo_bytes) / 1e6:.1f}MB')
+    images = ([(f'scan_{i:02d}.png', scan_bytes, 'image/png') for i in range(args.scans)]
+              + [(f'photo_{i:02d}.jpg', photo_bytes, 'image/jpeg') for i in range(args.photos)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'bench.db')
+        app_module.init_db()
+        run(args, images)
+
+    image_preprocess.shutdown()
+
+
+def run(args, images):
+    client = app_module.create_app().test_client()
+    with DifyStub(upload_latency=0.02, workflow_latency=args.workflow_latency,
+                  upload_bandwidth=args.bandwidth) as stub:
+        DifyConfig.DIFY_API_BASE_URL = stub.base_url
+        DifyConfig.RATE_LIMIT_PER_MINUTE = 0  # the stub has no rate limit to stay under
+
+        for enabled in (False, True):
+            ImagePreprocessConfig.ENABLED = enabled
+            if enabled:
+                run_batch(client, images[:1])  # start the pool processes outside the timing
+            stub.bytes_received = 0
+            elapsed, report = run_batch(client, images)
+            print(f'preprocess={"on" if enabled else "off":<4} files={len(images):<3} '
+                  f'uploaded={stub.bytes_received / 1e6:6.1f}MB elapsed={elapsed:.2f}s')
+            if report:
+                stages = ' '.join(f'{stage}={report["seconds"][stage]:.2f}s' for stage in image_preprocess.STAGES)
+                print(f'  saved={report["bytes_saved"] / 1e6:.1f}MB '
+                      f'({report["bytes_saved"] / report["bytes_in"]:.0%}) {stages}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Time to the first extracted record on the import screen, three ways.
+
+Against a local Dify stub (streaming response mode), submits ``--files``
+images and measures when the browser would first have records:
+
+* ``blocking``: ``/api/dify/fetch-data-multiple``, which answers once the
+  whole batch is done;
+* ``polling``: an import job polled every ``--poll-interval`` seconds, as the
+  import screen used to;
+* ``events``: an import job followed on ``/api/import_jobs/<id>/events``.
+
+The events run then drops the connection after a few files and reconnects
+with ``Last-Event-ID`` to check that every file arrives exactly once.
+
+    python benchmarks/bench_import_events.py --files 30 --workflow-latency 1
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dify_stub import DifyStub
+from config import DatabaseConfig, DifyConfig, ImportJobConfig
+import app as app_module
+
+
+def upload(files, size):
+    # Distinct bytes per file and run so nothing is served from the result cache.
+    return {'files': [(io.BytesIO(os.urandom(size)), f'page_{i:03d}.png', 'image/png') for i in range(files)]}
+
+
+def create_job(client, files, size):
+    response = client.post('/api/import_jobs', data=upload(files, size), content_type='multipart/form-data')
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()
+
+
+def blocking(client, args):
+    started = time.perf_counter()
+    response = client.post('/api/dify/fetch-data-multiple', data=upload(args.files, args.file_size),
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+def polling(client, args):
+    started = time.perf_counter()
+    job_id = create_job(client, args.files, args.file_size)['job_id']
+    first = None
+    while True:
+        job = client.get(f'/api/import_jobs/{job_id}').get_json()
+        if first is None and job['data']:
+            first = time.perf_counter() - started
+        if job['status'] != 'running':
+            return first, time.perf_counter() - started
+        time.sleep(args.poll_interval)
+
+
+def read_events(response, stop_after=None):
+    """Parse (id, event, data) tuples off a streamed response."""
+    buffer = b''
+    received = 0
+    for chunk in response.response:
+        buffer += chunk
+        while b'\n\n' in buffer:
+            block, buffer = buffer.split(b'\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.decode('utf-8').split('\n') if ': ' in line)
+            if 'event' not in fields:
+                continue
+            yield fields.get('id'), fields['event'], json.loads(fields['data'])
+            received += 1
+            if stop_after is not None and received >= stop_after:
+                return
+
+
+def events(client, args):
+    started = time.perf_counter()
+    job = create_job(client, args.files, args.file_size)
+    first = None
+    seen = []
+    last_id = None
+
+    # Drop the first connection after a few files, then resume like EventSource does.
+    response = client.get(job['events_url'], buffered=False)
+    for event_id, name, data in read_events(response, stop_after=min(3, args.files)):
+        if first is None and data['records']:
+            first = time.perf_counter() - started
+        seen.append(data['index'])
+        last_id = event_id
+    response.close()
+
+    response = client.get(job['events_url'], headers={'Last-Event-ID': last_id}, buffered=False)
+    for event_id, name, data in read_events(response):
+        if name == 'done':
+            break
+        seen.append(data['index'])
+    response.close()
+
+    assert sorted(seen) == list(range(args.files)), seen
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=30)
+    parser.add_argument('--upload-latency', type=float, default=0.05)
+    parser.add_argument('--workflow-latency', type=float, default=1.0)
+    parser.add_argument('--poll-interval', type=float, default=1.5)
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, DifyStub(args.upload_latency, args.workflow_latency,
+                                                         ping_interval=0.25) as stub:
+        DatabaseConfig.PATH = os.path.join(tmp, 'events.db')
+        ImportJobConfig.STORAGE_DIR = os.path.join(tmp, 'jobs')
+        DifyConfig.DIFY_API_BASE_URL = stub.base_url
+        DifyConfig.RATE_LIMIT_PER_MINUTE = 0  # the stub has no rate limit to stay under
+        DifyConfig.RESPONSE_MODE = 'streaming'
+        app_module.init_db()
+        client = app_module.create_app().test_client()
+
+        for name, run in (('blocking', blocking), ('polling', polling), ('events', events)):
+            first, total = run(client, args)
+            print(f'{name:<9} files={args.files:<4} first_record={first:6.2f}s  all_files={total:6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
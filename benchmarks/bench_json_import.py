@@ -0,0 +1,110 @@
+"""Peak memory of /upload JSON parsing as the export grows.
+
+Writes Dify-format exports (``{"text": [...]}`` with ``明細`` detail lists) of
+each requested size, then parses every file in a fresh subprocess with the
+previous read + ``json.loads`` + transform + ``jsonify`` path and with
+``json_import`` (parse, spool, stream the response), and reports each
+process's peak RSS.
+
+    python benchmarks/bench_json_import.py --sizes-mb 10 50 200
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def write_export(path, size_mb, details=20):
+    item = {
+        'ページ': '1', '出荷日': '25/08/01', '受注番号': '1234567', '納入先番号': '00000000',
+        '担当者': '田中', '運賃': 0, '税抜合計': 6000,
+        '明細': [{'部品番号': f'12345-{i:05d}', '部品名': 'パッキン', '数量': 3, '売上単価': 100, '売上金額': 300}
+                 for i in range(details)]
+    }
+    encoded = json.dumps(item, ensure_ascii=False).encode('utf-8')
+    count = size_mb * 1024 * 1024 // (len(encoded) + 2)
+    with open(path, 'wb') as f:
+        f.write(b'{"text": [')
+        for i in range(count):
+            if i:
+                f.write(b', ')
+            f.write(encoded)
+        f.write(b']}')
+    return count
+
+
+def run_legacy(path):
+    """The handler body before streaming, with the response serialized as jsonify would."""
+    import re
+    with open(path, 'rb') as f:
+        content = f.read().decode('utf-8')
+    data = json.loads(content)
+    extracted_data = []
+    for item in data['text']:
+        if isinstance(item, dict):
+            transformed_item = {key: item.get(key, '') for key in ('ページ', '出荷日', '受注番号', '納入先番号', '担当者')}
+            transformed_item.update({'運賃': item.get('運賃', 0), '税抜合計': item.get('税抜合計', 0)})
+            if '明細' in item and isinstance(item['明細'], list):
+                transformed_item['部品番号'] = [d.get('部品番号', '') for d in item['明細']]
+                transformed_item['部品名'] = [d.get('部品名', '') for d in item['明細']]
+                transformed_item['数量'] = [str(d.get('数量', 0)) for d in item['明細']]
+                transformed_item['売上単価'] = [str(d.get('売上単価', 0)) for d in item['明細']]
+                transformed_item['売上金額'] = [str(d.get('売上金額', 0)) for d in item['明細']]
+            extracted_data.append(transformed_item)
+        else:
+            re.findall(r'```json\n(.*?)\n```', str(item), re.DOTALL)
+    body = json.dumps({'success': True, 'data': extracted_data})
+    return len(extracted_data), len(body)
+
+
+def run_streaming(path):
+    import json_import
+    with open(path, 'rb') as f:
+        spool, count = json_import.spool_records(f, max_bytes=2 ** 40)
+    size = sum(len(chunk) for chunk in json_import.stream_response(spool))
+    return count, size
+
+
+def measure(mode, path):
+    started = time.perf_counter()
+    records, body_bytes = run_legacy(path) if mode == 'legacy' else run_streaming(path)
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'records': records, 'body_bytes': body_bytes, 'elapsed': elapsed, 'peak_mb': peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--measure', choices=['legacy', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(tmp, f'export_{size_mb}mb.json')
+            write_export(path, size_mb)
+            for mode in ('legacy', 'streaming'):
+                output = subprocess.run(
+                    [sys.executable, __file__, '--measure', mode, '--file', path],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output)
+                print(f'{size_mb:>5}MB {mode:<9} records={result["records"]:<8} '
+                      f'elapsed={result["elapsed"]:6.2f}s peak_rss={result["peak_mb"]:7.1f}MB')
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
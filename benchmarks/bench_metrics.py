@@ -0,0 +1,86 @@
+"""Overhead of the built-in metrics.
+
+Times a bare ``Histogram.observe``, then the same mix of point lookups on a
+plain ``sqlite3.Connection`` and on the timed connection ``db.connect()``
+returns with metrics enabled, and finally ``/api/basic_info`` through the
+test client with and without the request hooks.
+
+    python benchmarks/bench_metrics.py --records 2000 --repeat 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig, MetricsConfig
+import app as app_module
+import db
+import metrics
+import purchase_records
+from benchmarks.bench_save_data import make_payload
+
+
+def per_call_us(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def query_loop(conn, ids):
+    def run():
+        for record_id in ids:
+            conn.execute('SELECT * FROM basic_info WHERE id = ?', (record_id,)).fetchone()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram('bench_observe_seconds', 'benchmark only', ('route',))
+    print(f'Histogram.observe           {per_call_us(lambda: histogram.observe(0.003, route="/x"), args.repeat * 100):8.2f}us')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'metrics.db')
+        app_module.init_db()
+        conn = db.connect()
+        prepared, errors = purchase_records.prepare_records(make_payload(args.records, 5))
+        assert not errors, errors
+        purchase_records.save_records(conn, prepared, str(uuid.uuid4()))
+        conn.commit()
+        conn.close()
+
+        ids = list(range(1, 101))
+        for label, factory in (('plain connection', sqlite3.Connection), ('timed connection', db.TimedConnection)):
+            conn = sqlite3.connect(DatabaseConfig.PATH, factory=factory)
+            cost = per_call_us(query_loop(conn, ids), args.repeat // 20 or 1) / len(ids)
+            print(f'{label:<27} {cost:8.2f}us per point lookup')
+            conn.close()
+
+        flask_app = app_module.create_app()
+        client = flask_app.test_client()
+        before = flask_app.before_request_funcs.setdefault(None, [])
+        after = flask_app.after_request_funcs.setdefault(None, [])
+        hooked = metrics._start_timer in before
+        for label in ('hooks on', 'hooks off'):
+            if label == 'hooks off' and hooked:
+                before.remove(metrics._start_timer)
+                after.remove(metrics._record_request)
+            elif label == 'hooks on' and not hooked:
+                print('METRICS_ENABLED is off; skipping the hooked run')
+                continue
+            cost = per_call_us(lambda: client.get('/api/basic_info'), args.repeat // 10 or 1)
+            print(f'/api/basic_info {label:<11} {cost / 1000:8.3f}ms')
+        print(f'metrics enabled in config: {MetricsConfig.ENABLED}')
+
+
+if __name__ == '__main__':
+    main()
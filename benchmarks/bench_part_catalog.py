@@ -0,0 +1,163 @@
+"""Database size and per-part price lookups before and after the part catalog.
+
+Builds a database at migration 011 (part number and name text on every line)
+with ``--lines`` part lines drawn from ``--parts`` part numbers, a few of them
+far more common than the rest and some saved in full-width or with another
+dash. A copy is then converted in place by migration 012 (timed), both are
+VACUUMed, and the script prints the file sizes, the bytes of the part tables
+and indexes (when SQLite has ``dbstat``), and the time for the latest unit
+price of the most common part: a scan of ``parts_info`` for the part number
+before, ``part_catalog.price_history`` after, both for the last line only and
+with 12 months of trend and 20 lines. Exits non-zero if the converted database is not smaller.
+
+    python benchmarks/bench_part_catalog.py --lines 1000000 --parts 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import db
+import migrations
+import part_catalog
+from benchmarks.bench_basic_info import timed
+
+NAMES = ['パッキン', 'エレメント', 'ガスケット', 'フィルタ', 'ノズル', 'シール', 'ボルト', 'ワッシャ']
+
+PART_OBJECTS = {
+    'before': ('parts_info', 'idx_parts_info_basic_id'),
+    'after': ('part_lines', 'idx_part_lines_basic_id', 'part_labels', 'sqlite_autoindex_part_labels_1',
+              'parts', 'sqlite_autoindex_parts_1', 'part_price_history'),
+}
+
+OLD_LAST_PRICE = '''
+    SELECT p.unit_price, b.shipment_date_iso
+    FROM parts_info p JOIN basic_info b ON b.id = p.basic_info_id
+    WHERE p.part_number = ?
+    ORDER BY b.shipment_date_iso DESC, p.id DESC
+    LIMIT 1
+'''
+
+
+def spellings(number):
+    full_width = ''.join(chr(ord(c) + 0xFEE0) if '!' <= c <= '~' else c for c in number)
+    return [number, number, number, full_width, number.replace('-', 'ー')]
+
+
+def seed(conn, lines, parts, parts_per_record):
+    rng = random.Random(1)
+    numbers = [f'{rng.randrange(10000, 99999)}-{rng.randrange(10000, 99999)}' for _ in range(parts)]
+    weights = [1 / (rank + 1) for rank in range(parts)]
+    cursor = conn.cursor()
+    records = (lines + parts_per_record - 1) // parts_per_record
+    cursor.executemany('''
+        INSERT INTO basic_info
+        (id, page, shipment_date, shipment_date_iso, order_number, delivery_number, person_in_charge,
+         shipping_cost, total_amount, import_session_id)
+        VALUES (?, '1', ?, ?, ?, '00000001', '田中', 0, 0, 'bench')
+    ''', ((i + 1, f'{23 + i * 3 // records}/{i % 12 + 1:02d}/01',
+           f'20{23 + i * 3 // records}-{i % 12 + 1:02d}-01', f'{i:08d}') for i in range(records)))
+
+    rank = {number: position for position, number in enumerate(numbers)}
+    cursor.executemany('''
+        INSERT INTO parts_info (basic_info_id, part_number, part_name, quantity, unit_price, sales_amount)
+        VALUES (?, ?, ?, ?, ?, 0)
+    ''', ((i // parts_per_record + 1, rng.choice(spellings(number)), NAMES[rank[number] % len(NAMES)],
+           rng.randint(1, 10), 100 + rank[number] % 900 + i * 50 // lines)
+          for i, number in enumerate(rng.choices(numbers, weights, k=lines))))
+    conn.commit()
+    return numbers[0]
+
+
+def migrate(path, before_version=None):
+    DatabaseConfig.PATH = path
+    conn = db.connect()
+    db.configure_database(conn)
+    shipped = migrations.MIGRATIONS
+    if before_version:
+        migrations.MIGRATIONS = [m for m in shipped if m[0] < before_version]
+    try:
+        migrations.migrate(conn)
+    finally:
+        migrations.MIGRATIONS = shipped
+    return conn
+
+
+def vacuum(path):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = DELETE')
+    conn.execute('VACUUM')
+    conn.close()
+    return os.path.getsize(path)
+
+
+def object_bytes(path, names):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(f'''
+            SELECT SUM(pgsize) FROM dbstat WHERE name IN ({', '.join('?' * len(names))})
+        ''', names).fetchone()
+        return rows[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--parts', type=int, default=2000)
+    parser.add_argument('--parts-per-record', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = os.path.join(tmp, 'before.db')
+        after = os.path.join(tmp, 'after.db')
+        conn = migrate(before, before_version=12)
+        hot = seed(conn, args.lines, args.parts, args.parts_per_record)
+        conn.close()
+        vacuum(before)
+        shutil.copy(before, after)
+
+        started = time.perf_counter()
+        migrate(after).close()
+        print(f'lines={args.lines} parts={args.parts} migration 012: {time.perf_counter() - started:.2f}s')
+
+        sizes = {'before': vacuum(before), 'after': vacuum(after)}
+        for label, path in (('before', before), ('after', after)):
+            part_bytes = object_bytes(path, PART_OBJECTS[label])
+            detail = f' part tables={part_bytes / 1e6:7.1f}MB' if part_bytes else ''
+            print(f'{label:<6} file={sizes[label] / 1e6:7.1f}MB{detail}')
+
+        conn = sqlite3.connect(before)
+        old_ms = timed(lambda: conn.execute(OLD_LAST_PRICE, (hot,)).fetchall(), args.repeat)
+        old_price = conn.execute(OLD_LAST_PRICE, (hot,)).fetchone()
+        conn.close()
+
+        conn = sqlite3.connect(after)
+        cursor = conn.cursor()
+        last_ms = timed(lambda: part_catalog.price_history(cursor, hot, months=1, limit=1), args.repeat)
+        trend_ms = timed(lambda: part_catalog.price_history(cursor, hot), args.repeat)
+        history = part_catalog.price_history(cursor, hot)
+        conn.close()
+        print(f'{hot}: {sum(month["line_count"] for month in history["trend"])} lines in the last 12 months, '
+              f'{len(history["spellings"])} spellings')
+        print(f'  before: last price scan={old_ms:.2f}ms ({old_price[0]}, this spelling only)')
+        print(f'  after:  last price={last_ms:.2f}ms ({history["last_unit_price"]}) '
+              f'with 12-month trend={trend_ms:.2f}ms')
+
+    if sizes['after'] >= sizes['before']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Part search latency: LIKE '%…%' over parts_info vs the FTS5 trigram index.
+
+Fills a scratch database with ``--lines`` part lines (``--parts`` per record),
+then times the first page of ``/api/parts_info/search`` (response cache off)
+against the equivalent ``LIKE`` query for a rare and a common substring.
+
+    python benchmarks/bench_parts_search.py --lines 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig, ResponseCacheConfig
+import app as app_module
+import db
+import part_catalog
+from benchmarks.bench_basic_info import timed
+
+NAMES = ['エレメント', 'パッキン', 'ガスケット', 'フィルタ', 'ノズル', 'シール', 'ボルト', 'ワッシャ']
+
+
+def seed(conn, lines, parts_per_record):
+    cursor = conn.cursor()
+    records = (lines + parts_per_record - 1) // parts_per_record
+    cursor.executemany('''
+        INSERT INTO basic_info
+        (id, page, shipment_date, shipment_date_iso, order_number, delivery_number, person_in_charge,
+         shipping_cost, total_amount, import_session_id)
+        VALUES (?, '1', ?, ?, ?, '00000001', '田中', 0, 0, 'bench')
+    ''', ((i + 1, f'25/{i % 12 + 1:02d}/01', f'2025-{i % 12 + 1:02d}-01', f'{i:08d}') for i in range(records)))
+    parts = [(f'{i % 90000 + 10000:05d}-{i % 7919:05d}', f'{NAMES[i % len(NAMES)]}({i % 997})')
+             for i in range(lines)]
+    label_ids = part_catalog.intern(cursor, parts)
+    cursor.executemany('''
+        INSERT INTO part_lines (basic_info_id, label_id, quantity, unit_price, sales_amount)
+        VALUES (?, ?, 1, 100, 100)
+    ''', ((i // parts_per_record + 1, label_ids[part]) for i, part in enumerate(parts)))
+    conn.commit()
+
+
+def like_query(conn, text):
+    return conn.execute('''
+        SELECT p.id FROM parts_info p JOIN basic_info b ON b.id = p.basic_info_id
+        WHERE p.part_number LIKE ? OR p.part_name LIKE ?
+        ORDER BY p.id DESC LIMIT 51
+    ''', (f'%{text}%', f'%{text}%')).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--parts', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    ResponseCacheConfig.ENABLED = False
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'search.db')
+        app_module.init_db()
+        conn = db.connect()
+        seed(conn, args.lines, args.parts)
+        client = app_module.create_app().test_client()
+
+        for label, text in (('rare', '12345-00042'), ('common', 'エレメント(99')):
+            like_ms = timed(lambda: like_query(conn, text), args.repeat)
+            fts_ms = timed(lambda: client.get('/api/parts_info/search', query_string={'q': text}), args.repeat)
+            print(f'lines={args.lines:<9} {label:<7} LIKE={like_ms:9.2f}ms  /api/parts_info/search={fts_ms:7.2f}ms')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
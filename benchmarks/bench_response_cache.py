@@ -0,0 +1,65 @@
+"""Read API latency with and without the response cache.
+
+Saves one session of ``--records`` records, then times each read API with
+the cache disabled, on a cached body, and as a conditional GET answered 304.
+
+    python benchmarks/bench_response_cache.py --records 2000 --parts 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig, ResponseCacheConfig
+import app as app_module
+import db
+import purchase_records
+from benchmarks.bench_save_data import make_payload
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--parts', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'cache.db')
+        app_module.init_db()
+        conn = db.connect()
+        prepared, errors = purchase_records.prepare_records(make_payload(args.records, args.parts))
+        assert not errors, errors
+        result = purchase_records.save_records(conn, prepared, str(uuid.uuid4()))
+        conn.commit()
+        conn.close()
+
+        client = app_module.create_app().test_client()
+        urls = [
+            '/api/basic_info',
+            '/api/purchase_list?limit=100',
+            f'/api/parts_info/{result["ids"][0]}',
+        ]
+        for url in urls:
+            ResponseCacheConfig.ENABLED = False
+            uncached = timed(lambda: client.get(url), args.repeat)
+            ResponseCacheConfig.ENABLED = True
+            etag = client.get(url).headers['ETag']
+            cached = timed(lambda: client.get(url), args.repeat)
+            not_modified = timed(lambda: client.get(url, headers={'If-None-Match': etag}), args.repeat)
+            print(f'{url:<32} uncached={uncached:7.2f}ms  cached={cached:6.2f}ms  304={not_modified:6.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Summary latency as the history grows: GROUP BY over basic_info vs the rollups.
+
+For each history size, times the monthly 担当者 totals computed straight from
+``basic_info`` against ``/api/summary/person_in_charge`` (response cache
+off), which reads only ``rollup_monthly``.
+
+    python benchmarks/bench_rollups.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig, ResponseCacheConfig
+import app as app_module
+import db
+from benchmarks.bench_basic_info import grow_history, timed
+
+
+def direct_group_by(conn):
+    return conn.execute('''
+        SELECT substr(shipment_date_iso, 1, 7), person_in_charge, COUNT(*),
+               SUM(shipping_cost), SUM(total_amount), SUM(parts_total)
+        FROM basic_info
+        GROUP BY 1, 2
+        ORDER BY 1 DESC, 5 DESC
+    ''').fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--session-size', type=int, default=100)
+    parser.add_argument('--parts', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    ResponseCacheConfig.ENABLED = False
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'rollups.db')
+        app_module.init_db()
+        conn = db.connect()
+        client = app_module.create_app().test_client()
+
+        for size in sorted(args.sizes):
+            grow_history(conn, size, args.session_size, args.parts)
+            group_by_ms = timed(lambda: direct_group_by(conn), args.repeat)
+            endpoint_ms = timed(lambda: client.get('/api/summary/person_in_charge?limit=1000'), args.repeat)
+            print(f'records={size:<8} GROUP BY basic_info={group_by_ms:8.2f}ms  /api/summary={endpoint_ms:6.2f}ms')
+
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Rows/sec for /api/save_data with large payloads.
+
+Saves the same generated payload (by default 500 records x 20 parts = 10k
+part lines) on fresh databases with the previous per-row INSERT + lastrowid
+loop, with the bulk validate-then-executemany path, and through the endpoint.
+
+    python benchmarks/bench_save_data.py --records 500 --parts 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+import db
+import part_catalog
+import purchase_records
+
+
+def make_payload(record_count, parts_per_record, first_order=1000000):
+    payload = []
+    for i in range(record_count):
+        payload.append({
+            'ページ': str(i % 4 + 1),
+            '出荷日': f'25/{i % 12 + 1:02d}/{i % 28 + 1:02d}',
+            '受注番号': f'{first_order + i}',
+            '納入先番号': f'{i % 50:08d}',
+            '担当者': ['田中', '山田', '山本'][i % 3],
+            '運賃': '500',
+            '税抜合計': str(parts_per_record * 300 + 500),
+            '部品番号': [f'12345-{j:05d}' for j in range(parts_per_record)],
+            '部品名': ['パッキン'] * parts_per_record,
+            '数量': ['3'] * parts_per_record,
+            '売上単価': ['100'] * parts_per_record,
+            '売上金額': ['300'] * parts_per_record,
+        })
+    return payload
+
+
+def legacy_save(conn, data):
+    """The per-row loop /api/save_data used before the bulk path (part text interned row by row)."""
+    cursor = conn.cursor()
+    session_id = str(uuid.uuid4())
+    for record in data:
+        cursor.execute('''
+            INSERT INTO basic_info
+            (page, shipment_date, order_number, delivery_number, person_in_charge, shipping_cost, total_amount, import_session_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (record.get('ページ', ''), record['出荷日'], record['受注番号'], record['納入先番号'],
+              record['担当者'], int(record['運賃']), int(record['税抜合計']), session_id))
+        basic_id = cursor.lastrowid
+        for i in range(len(record['部品番号'])):
+            label = (record['部品番号'][i], record['部品名'][i])
+            cursor.execute('''
+                INSERT INTO part_lines
+                (basic_info_id, label_id, quantity, unit_price, sales_amount)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (basic_id, part_catalog.intern(cursor, [label])[label], int(record['数量'][i]),
+                  int(record['売上単価'][i]), int(record['売上金額'][i])))
+    conn.commit()
+
+
+def fresh_database(tmp, name):
+    DatabaseConfig.PATH = os.path.join(tmp, name)
+    app_module.init_db()
+
+
+def report(label, elapsed, rows):
+    print(f'{label:<8} rows={rows:<7} elapsed={elapsed:.3f}s rows/sec={rows / elapsed:,.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--parts', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_payload(args.records, args.parts)
+    rows = args.records * (args.parts + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh_database(tmp, 'legacy.db')
+        conn = db.connect()
+        started = time.perf_counter()
+        legacy_save(conn, payload)
+        report('legacy', time.perf_counter() - started, rows)
+        conn.close()
+
+        fresh_database(tmp, 'bulk.db')
+        conn = db.connect()
+        started = time.perf_counter()
+        prepared, errors = purchase_records.prepare_records(payload)
+        assert not errors, errors
+        purchase_records.save_records(conn, prepared, str(uuid.uuid4()))
+        conn.commit()
+        report('bulk', time.perf_counter() - started, rows)
+        conn.close()
+
+        # The endpoint figure also includes request JSON parsing and Flask.
+        fresh_database(tmp, 'endpoint.db')
+        client = app_module.create_app().test_client()
+        started = time.perf_counter()
+        response = client.post('/api/save_data', json=payload)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.get_json()
+        report('endpoint', elapsed, rows)
+
+
+if __name__ == '__main__':
+    main()
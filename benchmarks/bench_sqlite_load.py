@@ -0,0 +1,170 @@
+"""Concurrent read/write load test for the SQLite connection layer.
+
+Runs the same mix of readers (the purchase list query) and writers (one
+basic_info record with parts per transaction) twice against a scratch
+database:
+
+* legacy - a fresh ``sqlite3.connect`` per operation in rollback-journal mode,
+  the way the routes used to work
+* db.py  - ``db.connect()`` with WAL, busy timeout and the tuned pragmas
+
+and reports throughput, read latency percentiles and "database is locked"
+failures for each.
+
+    python benchmarks/bench_sqlite_load.py --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from config import DatabaseConfig
+
+SCHEMA = '''
+    CREATE TABLE basic_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        page TEXT,
+        shipment_date TEXT NOT NULL,
+        order_number TEXT NOT NULL,
+        delivery_number TEXT NOT NULL,
+        person_in_charge TEXT NOT NULL,
+        shipping_cost INTEGER NOT NULL,
+        total_amount INTEGER NOT NULL,
+        import_session_id TEXT NOT NULL DEFAULT 'legacy',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE parts_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        basic_info_id INTEGER NOT NULL,
+        part_number TEXT NOT NULL,
+        part_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price INTEGER NOT NULL,
+        sales_amount INTEGER NOT NULL
+    );
+'''
+
+
+def seed(path, records):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    for i in range(records):
+        cursor = conn.execute(
+            'INSERT INTO basic_info (page, shipment_date, order_number, delivery_number, person_in_charge, '
+            'shipping_cost, total_amount) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ('1', f'25/{i % 12 + 1:02d}/01', f'{i:07d}', '00000000', '田中', 0, 100)
+        )
+        conn.execute(
+            'INSERT INTO parts_info (basic_info_id, part_number, part_name, quantity, unit_price, sales_amount) '
+            'VALUES (?, ?, ?, ?, ?, ?)', (cursor.lastrowid, '12345-67890', 'パッキン', 1, 100, 100)
+        )
+    conn.commit()
+    conn.close()
+
+
+def read_once(conn):
+    conn.execute('''
+        SELECT id, page, shipment_date, order_number, delivery_number, person_in_charge,
+               shipping_cost, total_amount, created_at
+        FROM basic_info
+        ORDER BY shipment_date DESC
+        LIMIT 200
+    ''').fetchall()
+
+
+def write_once(conn, n):
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO basic_info (page, shipment_date, order_number, delivery_number, person_in_charge, '
+        'shipping_cost, total_amount) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        ('1', '25/08/01', f'w{n:07d}', '00000000', '山田', 0, 500)
+    )
+    basic_id = cursor.lastrowid
+    for _ in range(20):
+        cursor.execute(
+            'INSERT INTO parts_info (basic_info_id, part_number, part_name, quantity, unit_price, sales_amount) '
+            'VALUES (?, ?, ?, ?, ?, ?)', (basic_id, '98760-54321', 'エレメント', 1, 25, 25)
+        )
+    conn.commit()
+
+
+def run(label, connect, readers, writers, seconds):
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'read_latencies': []}
+
+    def worker(kind):
+        n = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn = connect()
+            try:
+                if kind == 'read':
+                    read_once(conn)
+                else:
+                    write_once(conn, n)
+                    n += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                with lock:
+                    stats['locked'] += 1
+                continue
+            finally:
+                conn.close()
+            elapsed = time.perf_counter() - started
+            with lock:
+                if kind == 'read':
+                    stats['reads'] += 1
+                    stats['read_latencies'].append(elapsed)
+                else:
+                    stats['writes'] += 1
+
+    threads = [threading.Thread(target=worker, args=('read',)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=('write',)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(stats['read_latencies']) or [0.0]
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f'{label:<7} reads/s={stats["reads"] / seconds:>8.0f} writes/s={stats["writes"] / seconds:>6.0f} '
+          f'read p50={p50:6.2f}ms p99={p99:7.2f}ms locked_errors={stats["locked"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--legacy-timeout', type=float, default=0.1,
+                        help='sqlite3.connect timeout for the legacy layer (Python default is 5s)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        seed(legacy_path, args.records)
+        run('legacy', lambda: sqlite3.connect(legacy_path, timeout=args.legacy_timeout),
+            args.readers, args.writers, args.seconds)
+
+        DatabaseConfig.PATH = os.path.join(tmp, 'wal.db')
+        seed(DatabaseConfig.PATH, args.records)
+        conn = db.connect()
+        db.configure_database(conn)
+        conn.close()
+        run('db.py', db.connect, args.readers, args.writers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Peak memory of the app while scan batches pass through it to Dify.
+
+Serves the app from a forked process with ``tracemalloc`` on, posts
+batches of ``--file-size`` random images to ``/api/dify/fetch-data-multiple``
+(streamed to a local Dify stub) and prints the server's peak Python
+allocation and peak RSS for each batch size. The server is ``wsgiref``:
+werkzeug's development server drains what is left of each request body
+into a 10MB buffer of its own.
+
+With uploads spooled to disk and streamed to Dify the peak should stay flat
+as the batch grows once every pool thread is busy; the script exits
+non-zero if the largest batch peaks above ``--max-growth`` times the
+smallest batch of at least ``DIFY_MAX_CONCURRENT_REQUESTS`` files.
+
+    python benchmarks/bench_upload_memory.py --batches 1 4 16 --file-size 8000000
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from benchmarks.dify_stub import DifyStub
+from config import DatabaseConfig, DifyConfig, ImagePreprocessConfig, UploadConfig
+import app as app_module
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(conn):
+    tracemalloc.start()
+    server = make_server('127.0.0.1', 0, app_module.create_app(), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send(server.server_port)
+    while conn.recv() == 'peak':
+        conn.send((tracemalloc.get_traced_memory()[1], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+        tracemalloc.reset_peak()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--file-size', type=int, default=8 * 1000 * 1000)
+    parser.add_argument('--max-growth', type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, DifyStub(upload_latency=0.01, workflow_latency=0.05) as stub:
+        DatabaseConfig.PATH = os.path.join(tmp, 'bench.db')
+        UploadConfig.SPOOL_DIR = os.path.join(tmp, 'uploads')
+        DifyConfig.DIFY_API_BASE_URL = stub.base_url
+        DifyConfig.RATE_LIMIT_PER_MINUTE = 0  # the stub has no rate limit to stay under
+        ImagePreprocessConfig.ENABLED = False  # random bytes, not images
+        app_module.init_db()
+
+        conn, child_conn = multiprocessing.Pipe()
+        server = multiprocessing.get_context('fork').Process(target=serve, args=(child_conn,))
+        server.start()
+        url = f'http://127.0.0.1:{conn.recv()}/api/dify/fetch-data-multiple?no_cache=1'
+
+        peaks = {}
+        for count in args.batches:
+            conn.send('peak')
+            conn.recv()
+            files = [('files', (f'page_{i:03d}.png', io.BytesIO(os.urandom(args.file_size)), 'image/png'))
+                     for i in range(count)]
+            response = requests.post(url, files=files)
+            assert response.status_code == 200, response.text
+            conn.send('peak')
+            peaks[count], max_rss = conn.recv()
+            print(f'files={count:<4} batch={count * args.file_size / 1e6:7.1f}MB '
+                  f'peak_traced={peaks[count] / 1e6:6.2f}MB peak_rss={max_rss / 1024:6.1f}MB')
+
+        conn.send('stop')
+        server.join()
+
+    full = [count for count in args.batches if count >= DifyConfig.MAX_CONCURRENT_REQUESTS]
+    reference = min(full or args.batches)
+    growth = peaks[max(args.batches)] / peaks[reference]
+    print(f'peak growth from {reference} to {max(args.batches)} files: {growth:.2f}x')
+    if growth > args.max_growth:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
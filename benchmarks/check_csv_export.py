@@ -0,0 +1,72 @@
+"""Formula escaping check for the CSV export.
+
+Saves a record whose text fields start with each character spreadsheet
+applications run as a formula (``=``, ``+``, ``-``, ``@``, tab, CR),
+exports it through ``/api/purchase_list/export`` and checks that every such
+cell is prefixed with ``'`` while ordinary text and negative amounts are
+written as they are. Exits non-zero on any mismatch.
+
+    python benchmarks/check_csv_export.py
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+
+# part name saved -> cell expected in the CSV
+PART_NAMES = {
+    "-2+3+cmd|' /C calc'!A0": "'-2+3+cmd|' /C calc'!A0",
+    '=HYPERLINK("http://example.com")': '\'=HYPERLINK("http://example.com")',
+    '+1+1': "'+1+1",
+    '@SUM(A1:A2)': "'@SUM(A1:A2)",
+    '\t=1': "'\t=1",
+    '\r=1': "'\r=1",
+    'パッキン-大': 'パッキン-大',
+    'ガスケット': 'ガスケット',
+}
+
+
+def record():
+    names = list(PART_NAMES)
+    return {
+        'ページ': '1', '出荷日': '25/08/01', '受注番号': '-1234567', '納入先番号': '00000001', '担当者': '田中',
+        '運賃': 0, '税抜合計': -1500,
+        '部品番号': [f'12345-{i:05d}' for i in range(len(names))], '部品名': names,
+        '数量': [1] * len(names), '売上単価': [-100] * len(names), '売上金額': [-100] * len(names),
+    }
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'export.db')
+        app_module.init_db()
+        client = app_module.create_app().test_client()
+        response = client.post('/api/save_data', json=[record()])
+        assert response.status_code == 200, response.get_json()
+        response = client.get('/api/purchase_list/export')
+        assert response.status_code == 200, response.status_code
+        rows = list(csv.DictReader(io.StringIO(response.data.decode('utf-8-sig'), newline='')))
+
+    # The order number is text and gets the prefix too; amounts are numbers and keep their sign.
+    cells = {row['部品番号']: row for row in rows}
+    for i, (name, expected) in enumerate(PART_NAMES.items()):
+        row = cells.get(f'12345-{i:05d}', {})
+        checks = {'部品名': expected, '受注番号': "'-1234567", '税抜合計': '-1500', '売上単価': '-100'}
+        wrong = {column: row.get(column) for column, value in checks.items() if row.get(column) != value}
+        failures += [(name, wrong)] if wrong else []
+        print(f'{"FAILED" if wrong else "ok":<7} {name!r}{f" {wrong}" if wrong else ""}')
+
+    if failures:
+        print(f'{len(failures)} rows not escaped as expected')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""EXPLAIN QUERY PLAN check for the hot queries.
+
+Builds a scratch database through ``init_db`` (so every migration runs),
+seeds it, and prints the plan of each query the screens issue most. Exits
+non-zero if any of them falls back to a full table scan.
+
+    python benchmarks/check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DatabaseConfig
+import app as app_module
+import db
+import part_catalog
+import parts_search
+import purchase_export
+import purchase_queries
+import purchase_records
+import rollups
+
+# "SCAN t" without "USING ... INDEX" reads every row of the table.
+FULL_SCAN = re.compile(r'^SCAN \w+$')
+
+
+def seed(conn, records):
+    cursor = conn.cursor()
+    labels = [(f'12345-{n:05d}', ['パッキン', 'エレメント', 'ボルト'][n % 3]) for n in range(300)]
+    label_ids = part_catalog.intern(cursor, labels)
+    for i in range(records):
+        cursor.execute('''
+            INSERT INTO basic_info
+            (page, shipment_date, shipment_date_iso, order_number, delivery_number, person_in_charge,
+             shipping_cost, total_amount, import_session_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ('1', f'25/{i % 12 + 1:02d}/01', f'2025-{i % 12 + 1:02d}-01', f'{i:07d}', f'{i % 50:08d}',
+              ['田中', '山田', '山本'][i % 3], 0, 100, f'session-{i // 100}'))
+        cursor.execute('''
+            INSERT INTO part_lines (basic_info_id, label_id, quantity, unit_price, sales_amount)
+            VALUES (?, ?, 1, 100, 100)
+        ''', (cursor.lastrowid, label_ids[labels[i % len(labels)]]))
+    conn.execute('ANALYZE')
+    conn.commit()
+
+
+def list_query(limit=50, search='', person_in_charge='', date_from=None, date_to=None, **paging):
+    clauses, params = purchase_queries.build_filters(search, person_in_charge, date_from, date_to)
+    return purchase_queries.page_query(clauses, params, limit, **paging)
+
+
+def hot_queries():
+    cursor = purchase_queries.encode_cursor('2025-06-01', 2500)
+    return [
+        ('purchase list, first page', *list_query()),
+        ('purchase list, next page', *list_query(cursor=cursor)),
+        ('purchase list, date range', *list_query(date_from='2025-03-01', date_to='2025-05-31')),
+        ('purchase list, person + date', *list_query(person_in_charge='田中', date_from='2025-03-01')),
+        ('purchase list, search', *list_query(search='00001')),
+        ('purchase list, by order number', *list_query(sort='order_number', order='asc')),
+        ('latest import session', '''
+            SELECT id FROM import_sessions ORDER BY created_at DESC, rowid DESC LIMIT 1
+        ''', ()),
+        ('basic_info for a session', '''
+            SELECT id, parts_total FROM basic_info
+            WHERE import_session_id = ?
+            ORDER BY shipment_date_iso DESC
+        ''', ('session-3',)),
+        ('save_data natural key lookup', f'''
+            SELECT id FROM basic_info WHERE {purchase_records.NATURAL_KEY_MATCH}
+        ''', ('0000042', '1', '2025-07-01')),
+        ('parts of a record', 'SELECT * FROM parts_info WHERE basic_info_id = ?', (42,)),
+        ('delete parts of a record', 'DELETE FROM part_lines WHERE basic_info_id = ?', (42,)),
+        ('part price history', '''
+            SELECT line_id, shipment_day, unit_price, quantity FROM part_price_history
+            WHERE part_id = ? ORDER BY shipment_day DESC, line_id DESC LIMIT 20
+        ''', (1,)),
+        ('part catalog lookup', 'SELECT id FROM parts WHERE part_key = ?', ('12345-00042',)),
+        ('summary by month', *rollups.summary_query('month', month_from='2025-01', month_to='2025-06')[:2]),
+        ('summary by person, totals', *rollups.summary_query(
+            'person_in_charge', 'total', month_from='2025-01', month_to='2025-06')[:2]),
+        ('summary of one delivery number', *rollups.summary_query(
+            'delivery_number', key='00000042', month_from='2025-01')[:2]),
+        ('summary by part', *rollups.summary_query('part_number', month_from='2025-04', month_to='2025-06')[:2]),
+        ('csv export, date range', *purchase_export.export_query(*purchase_queries.build_filters(
+            date_from='2025-03-01', date_to='2025-05-31'))),
+        ('part search', *parts_search.search_query('エレメント')),
+        ('part search, next page', *parts_search.search_query(
+            '12345-', 'part_number', cursor=purchase_queries.encode_cursor('', 2500))),
+    ]
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseConfig.PATH = os.path.join(tmp, 'plans.db')
+        app_module.init_db()
+        conn = db.connect()
+        seed(conn, 5000)
+
+        for label, sql, params in hot_queries():
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            failures += bool(scans)
+            print(f'{"FULL SCAN" if scans else "ok":<9} {label}')
+            for step in plan:
+                print(f'          {step}')
+        conn.close()
+
+    if failures:
+        print(f'{failures} queries scan a whole table')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Local stand-in for the Dify file upload / workflow endpoints.
+
+Used by the benchmark scripts so they can measure the app against a server
+with controlled latency instead of the real Dify API. Workflow runs answer in
+the requested ``response_mode``: one JSON body, or chunked server-sent events
+(``workflow_started``, pings while the run takes its time, then
+``workflow_finished``) as Dify streams them. With ``rate_limit`` set, requests
+beyond that many per second (over all clients) get a 429 as Dify's API
+limit does. ``upload_bandwidth`` (bytes per second) makes uploads take as long
+as their bodies would on one shared link of that speed.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SAMPLE_RECORD = {
+    "ページ": "1",
+    "出荷日": "25/08/01",
+    "受注番号": "1234567",
+    "納入先番号": "00000000",
+    "担当者": "田中",
+    "運賃": "0",
+    "税抜合計": "100",
+    "部品番号": ["123456-7890"],
+    "部品名": ["パッキン"],
+    "数量": ["1"],
+    "売上単価": ["100"],
+    "売上金額": ["100"],
+}
+
+
+class DifyStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # Called once per TCP connection: stands in for the TCP+TLS handshake
+        # cost that keep-alive connections avoid.
+        super().setup()
+        self.server.stub.record_connection()
+        time.sleep(self.server.stub.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events, latency):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(text):
+            data = text.encode('utf-8')
+            self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+        chunk(events[0])
+        deadline = time.monotonic() + latency
+        while time.monotonic() < deadline:
+            time.sleep(min(self.server.stub.ping_interval, max(0, deadline - time.monotonic())))
+            if time.monotonic() < deadline:
+                chunk('event: ping\n\n')
+        for event in events[1:]:
+            chunk(event)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_POST(self):
+        body = self._read_body()
+        stub = self.server.stub
+        stub.record_request(self.path, len(body))
+
+        throttled, retry_after = stub.take_failure(), '0'
+        if not throttled and stub.take_rate_limit():
+            throttled, retry_after = 429, '1'
+        if throttled:
+            self.send_response(throttled)
+            self.send_header('Retry-After', retry_after)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path == '/v1/files/upload':
+            time.sleep(stub.upload_latency + stub.transfer_time(len(body)))
+            self._send_json(201, {'id': str(uuid.uuid4())})
+        elif self.path == '/v1/workflows/run':
+            data = {
+                'status': 'succeeded',
+                'outputs': {'text': json.dumps([SAMPLE_RECORD], ensure_ascii=False)},
+            }
+            if json.loads(body or b'{}').get('response_mode') == 'streaming':
+                run_id = str(uuid.uuid4())
+                self._send_events([
+                    'data: ' + json.dumps({'event': 'workflow_started', 'workflow_run_id': run_id}) + '\n\n',
+                    'data: ' + json.dumps({'event': 'workflow_finished', 'workflow_run_id': run_id,
+                                           'data': data}, ensure_ascii=False) + '\n\n',
+                ], stub.workflow_latency)
+            else:
+                time.sleep(stub.workflow_latency)
+                self._send_json(200, {'data': data})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+
+class DifyStub:
+    """Runs a DifyStubHandler server on a background thread."""
+
+    def __init__(self, upload_latency=0.05, workflow_latency=0.2, connect_latency=0.0,
+                 host='127.0.0.1', port=0, ping_interval=10.0, rate_limit=None,
+                 upload_bandwidth=None):
+        self.upload_latency = upload_latency
+        self.workflow_latency = workflow_latency
+        self.ping_interval = ping_interval
+        self.upload_bandwidth = upload_bandwidth
+        self.bytes_received = 0
+        self._link_free_at = 0.0
+        self.rate_limit = rate_limit
+        self.throttled_count = 0
+        self._tokens = rate_limit or 0
+        self._refilled = time.monotonic()
+        self.connect_latency = connect_latency
+        self.request_counts = {}
+        self.connection_count = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), DifyStubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record_request(self, path, size=0):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            self.bytes_received += size
+
+    def record_connection(self):
+        with self._lock:
+            self.connection_count += 1
+
+    def transfer_time(self, size):
+        """Seconds until ``size`` bytes are through the shared upload link, queued behind earlier uploads."""
+        if not self.upload_bandwidth:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._link_free_at = max(now, self._link_free_at) + size / self.upload_bandwidth
+            return self._link_free_at - now
+
+    def fail_next(self, count, status=429):
+        """Answer the next ``count`` requests with ``status`` instead of a result."""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def take_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def take_rate_limit(self):
+        """True when the per-second budget is spent (a bucket of one second's requests)."""
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            self.throttled_count += 1
+            return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
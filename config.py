@@ -4,7 +4,7 @@ from typing import Dict, Any
 class DifyConfig:
     """Configuration for Dify API integration"""
     
-    DIFY_API_BASE_URL = "https://api.dify.ai"
+    DIFY_API_BASE_URL = os.environ.get("DIFY_API_BASE_URL", "https://api.dify.ai")
     
     # 「YES部品納品書(PNG)_複数」アプリ
     DIFY_API_KEY = "app-rn8gqMRYlEYkDH0rAntmbDJV"
@@ -12,6 +12,35 @@ class DifyConfig:
 
     WORKFLOW_RUN_ENDPOINT = "/v1/workflows/run"
     WORKFLOW_DETAIL_ENDPOINT = "/v1/workflows/run/{workflow_run_id}"
+
+    # ワークフローの応答モード: streaming（既定。進行中もイベントが届くので読み取りタイムアウトは
+    # 無通信時間に対して効く）または blocking（完了まで応答なし）
+    RESPONSE_MODE = os.environ.get("DIFY_RESPONSE_MODE", "streaming")
+    
+    # 複数ファイル取込時に同時実行するアップロード+ワークフローの上限
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get("DIFY_MAX_CONCURRENT_REQUESTS", "4"))
+    
+    # 共有HTTPセッションの接続プール（同時実行数以上にしておく）
+    HTTP_POOL_SIZE = int(os.environ.get("DIFY_HTTP_POOL_SIZE", "10"))
+    
+    # タイムアウト（秒）: 接続と読み取りを別々に指定する
+    CONNECT_TIMEOUT = float(os.environ.get("DIFY_CONNECT_TIMEOUT", "5"))
+    UPLOAD_READ_TIMEOUT = float(os.environ.get("DIFY_UPLOAD_READ_TIMEOUT", "30"))
+    WORKFLOW_READ_TIMEOUT = float(os.environ.get("DIFY_WORKFLOW_READ_TIMEOUT", "60"))
+    
+    # 全ワーカープロセス共通のDify呼び出し上限（アップロードとワークフロー実行の合計、1分あたり）。
+    # 既定の 0 は無制限。Difyのプランの上限に合わせて設定する（例: 60 で1秒に1回）。
+    # BURST は空いているときに続けて送れる件数。429 の共有（全プロセスで送信を控える）は上限を設定したときだけ有効
+    RATE_LIMIT_PER_MINUTE = float(os.environ.get("DIFY_RATE_LIMIT_PER_MINUTE", "0"))
+    RATE_LIMIT_BURST = int(os.environ.get("DIFY_RATE_LIMIT_BURST", "4"))
+    
+    # リトライしても429が続いたファイルを取込ジョブのキューに戻す回数の上限
+    THROTTLE_REQUEUE_LIMIT = int(os.environ.get("DIFY_THROTTLE_REQUEUE_LIMIT", "5"))
+    
+    # 429/5xx 応答時のリトライ（指数バックオフ+ジッター）
+    MAX_RETRIES = int(os.environ.get("DIFY_MAX_RETRIES", "3"))
+    RETRY_BACKOFF_BASE = float(os.environ.get("DIFY_RETRY_BACKOFF_BASE", "0.5"))
+    RETRY_BACKOFF_MAX = float(os.environ.get("DIFY_RETRY_BACKOFF_MAX", "8"))
     
     @classmethod
     def get_headers(cls) -> Dict[str, str]:
@@ -30,3 +59,166 @@ class DifyConfig:
     def get_workflow_detail_url(cls, workflow_run_id: str) -> str:
         """Get URL for workflow run detail"""
         return f"{cls.DIFY_API_BASE_URL}{cls.WORKFLOW_DETAIL_ENDPOINT.format(workflow_run_id=workflow_run_id)}"
+
+
+class DifyCacheConfig:
+    """Configuration for the Dify extraction result cache"""
+    
+    ENABLED = os.environ.get("DIFY_CACHE_ENABLED", "1") != "0"
+    
+    # 件数と合計サイズのどちらかを超えたら最近使われていないものから削除する
+    MAX_ENTRIES = int(os.environ.get("DIFY_CACHE_MAX_ENTRIES", "5000"))
+    MAX_BYTES = int(os.environ.get("DIFY_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+class ImportJobConfig:
+    """Configuration for background Dify import jobs"""
+    
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    
+    # アップロード画像をワークフロー完了まで保存しておくディレクトリ
+    STORAGE_DIR = os.environ.get("IMPORT_JOB_STORAGE_DIR", os.path.join(BASE_DIR, "instance", "import_jobs"))
+    
+    # 処理中のファイルは HEARTBEAT_SECONDS ごとに更新時刻を書き込む。
+    # STALE_SECONDS 以上更新のないもの（処理していたプロセスが落ちた）は起動時と定期確認で再キューする
+    HEARTBEAT_SECONDS = float(os.environ.get("IMPORT_JOB_HEARTBEAT_SECONDS", "30"))
+    STALE_SECONDS = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", "300"))
+    
+    # 完了したジョブを保持する日数
+    RETENTION_DAYS = int(os.environ.get("IMPORT_JOB_RETENTION_DAYS", "7"))
+    
+    # 進捗イベント（SSE）: 他プロセスで完了したファイルを確認する間隔、無通信を避けるコメントの間隔、
+    # 1接続の最長時間（超えたらブラウザが Last-Event-ID 付きで自動的に再接続する）
+    EVENTS_POLL_SECONDS = float(os.environ.get("IMPORT_JOB_EVENTS_POLL_SECONDS", "0.5"))
+    EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("IMPORT_JOB_EVENTS_HEARTBEAT_SECONDS", "15"))
+    EVENTS_MAX_SECONDS = float(os.environ.get("IMPORT_JOB_EVENTS_MAX_SECONDS", "300"))
+
+
+class UploadConfig:
+    """Configuration for scan uploads on the Dify and import job routes"""
+
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    # アップロード画像を一時保存するディレクトリ（取込ジョブの保存先と同じファイルシステムならコピーせずに移せる）
+    SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR", os.path.join(BASE_DIR, "instance", "uploads"))
+
+    # 1リクエスト全体と1ファイルの上限（リクエストは Content-Length で読み込む前に判定する）
+    MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+    MAX_FILE_BYTES = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", str(30 * 1024 * 1024)))
+
+    # Difyへ送るときに1回に読み込むバイト数
+    CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+
+class ImagePreprocessConfig:
+    """Configuration for shrinking images before they are uploaded to Dify (needs Pillow)"""
+
+    # 1 で有効（既定は無効。Difyに送る画像が変わるため、OCRの結果を確かめてから有効にする）。
+    # Pillow が入っていない場合は有効でも元の画像をそのまま送る
+    ENABLED = os.environ.get("IMAGE_PREPROCESS_ENABLED", "0") == "1"
+
+    # 長辺をこのピクセル数まで縮小する（0 で縮小しない）
+    MAX_EDGE = int(os.environ.get("IMAGE_PREPROCESS_MAX_EDGE", "2000"))
+
+    # 1 でグレースケールに変換する（既定は無効。色付きの印影や赤字が読みにくくなることがある）
+    GRAYSCALE = os.environ.get("IMAGE_PREPROCESS_GRAYSCALE", "0") == "1"
+
+    # 再エンコードの形式（JPEG / PNG）と JPEG の品質
+    FORMAT = os.environ.get("IMAGE_PREPROCESS_FORMAT", "JPEG").upper()
+    JPEG_QUALITY = int(os.environ.get("IMAGE_PREPROCESS_JPEG_QUALITY", "85"))
+
+    # これより小さい画像は処理せずにそのまま送る
+    MIN_BYTES = int(os.environ.get("IMAGE_PREPROCESS_MIN_BYTES", str(512 * 1024)))
+
+    # 変換を行うプロセス数（Webワーカーのスレッドを止めないよう別プロセスで実行する）
+    WORKERS = int(os.environ.get("IMAGE_PREPROCESS_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+
+class JsonImportConfig:
+    """Configuration for JSON file imports on /upload"""
+    
+    # これを超えるJSONファイルは読み込みを打ち切って413を返す
+    MAX_BYTES = int(os.environ.get("JSON_IMPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+    
+    # 1回に読み込むバイト数（大きな要素の途中で足りなければ倍々で読み足す）
+    CHUNK_SIZE = int(os.environ.get("JSON_IMPORT_CHUNK_SIZE", str(64 * 1024)))
+
+
+class SaveDataConfig:
+    """Configuration for /api/save_data"""
+    
+    # Idempotency-Key ヘッダーの保存結果を再送に返す時間（時間単位）
+    IDEMPOTENCY_TTL_HOURS = int(os.environ.get("SAVE_IDEMPOTENCY_TTL_HOURS", "24"))
+
+
+class DatabaseConfig:
+    """Configuration for the SQLite database"""
+    
+    PATH = os.environ.get("DATABASE_PATH", "purchases.db")
+    
+    # WALにすると読み取りが書き込みを待たない（設定はDBファイルに保存される）
+    JOURNAL_MODE = os.environ.get("DATABASE_JOURNAL_MODE", "WAL")
+    
+    # ロック中に待つ時間（ミリ秒）。超えると "database is locked" になる
+    BUSY_TIMEOUT_MS = int(os.environ.get("DATABASE_BUSY_TIMEOUT_MS", "5000"))
+    
+    # WALではNORMALでもコミット済みデータは壊れない
+    SYNCHRONOUS = os.environ.get("DATABASE_SYNCHRONOUS", "NORMAL")
+    
+    # 負の値はKiB単位（-20000 = 約20MB）
+    CACHE_SIZE = int(os.environ.get("DATABASE_CACHE_SIZE", "-20000"))
+    MMAP_SIZE = int(os.environ.get("DATABASE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class MetricsConfig:
+    """Configuration for the /metrics endpoint and request/SQL/Dify timings"""
+    
+    # 0にするとメトリクスの記録と /metrics を無効にする
+    ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+
+class LoggingConfig:
+    """Configuration for application logging"""
+    
+    # DEBUG / INFO / WARNING / ERROR
+    LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+    
+    # text: "時刻 レベル ロガー メッセージ key=value ..." / json: 1行1オブジェクト
+    FORMAT = os.environ.get("LOG_FORMAT", "text")
+
+
+class ResponseCacheConfig:
+    """Configuration for ETags and the read API response cache"""
+    
+    ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") != "0"
+    
+    # プロセスごとに保持するレスポンス数と合計サイズの上限（古いものから削除）
+    MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+    MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class ServerConfig:
+    """Configuration for serving the app (python app.py / gunicorn -c gunicorn.conf.py)"""
+    
+    HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+    PORT = int(os.environ.get("SERVER_PORT", "8001"))
+    
+    # 1にすると python app.py をデバッグモード（自動リロード）で起動する
+    DEBUG = os.environ.get("FLASK_DEBUG", "0") == "1"
+    
+    # gunicorn のワーカープロセス数とプロセスごとのスレッド数
+    WORKERS = int(os.environ.get("SERVER_WORKERS", str(min(4, os.cpu_count() or 1))))
+    THREADS = int(os.environ.get("SERVER_THREADS", "8"))
+    
+    # 1リクエストの上限秒数（複数画像のDify取込を同期で待つため長め）
+    TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", "600"))
+    
+    # 停止時に処理中のリクエストとDify取込ジョブの完了を待つ秒数
+    GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", "180"))
+
+
+class StaticConfig:
+    """Configuration for static asset caching"""
+    
+    # 内容ハッシュ付きURL（?v=...）で配信したファイルのキャッシュ秒数
+    MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 3600)))
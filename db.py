@@ -0,0 +1,88 @@
+"""SQLite connection management.
+
+Routes share one connection per request through ``get_db()``; it is closed
+(and any uncommitted transaction rolled back) by the app teardown hook even
+when the handler raises. Background workers use ``connect()`` directly.
+Every connection gets the same busy timeout and cache pragmas, and
+``configure_database()`` switches the file to WAL once at startup so readers
+never wait on a writer. With metrics enabled every ``execute`` /
+``executemany`` is timed into ``sqlite_query_duration_seconds``.
+"""
+import logging
+import sqlite3
+import time
+
+from flask import g
+
+import metrics
+from config import DatabaseConfig, MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """A connection whose cursors (including ``conn.execute``) time each statement."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect():
+    """Open a new connection with the per-connection pragmas applied."""
+    conn = sqlite3.connect(
+        DatabaseConfig.PATH,
+        timeout=DatabaseConfig.BUSY_TIMEOUT_MS / 1000,
+        factory=TimedConnection if MetricsConfig.ENABLED else sqlite3.Connection
+    )
+    conn.execute(f'PRAGMA busy_timeout = {int(DatabaseConfig.BUSY_TIMEOUT_MS)}')
+    conn.execute(f'PRAGMA synchronous = {DatabaseConfig.SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size = {int(DatabaseConfig.CACHE_SIZE)}')
+    conn.execute(f'PRAGMA mmap_size = {int(DatabaseConfig.MMAP_SIZE)}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+def configure_database(conn):
+    """Apply the database-wide settings that persist in the file itself."""
+    mode = conn.execute(f'PRAGMA journal_mode = {DatabaseConfig.JOURNAL_MODE}').fetchone()[0]
+    if mode.lower() != DatabaseConfig.JOURNAL_MODE.lower():
+        logger.warning('Unexpected journal_mode', extra={'journal_mode': mode, 'expected': DatabaseConfig.JOURNAL_MODE})
+
+
+def get_db():
+    """Return the connection bound to the current request."""
+    if 'db' not in g:
+        g.db = connect()
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
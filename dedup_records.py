@@ -0,0 +1,100 @@
+"""Find and remove duplicate purchase records.
+
+A record is identified by its natural key: order number, page and shipment
+date (the ISO date when the text could be parsed, the text otherwise).
+Saves are upserts on that key, enforced by ``idx_basic_info_natural_key``;
+databases filled before that index existed are cleaned up once by the
+migration that adds it, which keeps the newest row of each key.
+
+Run directly to see (``--dry-run``) or remove duplicates in a database the
+app has already migrated (migration 007 or later):
+
+    python dedup_records.py --dry-run
+    python dedup_records.py --database backup.db
+"""
+import argparse
+
+import import_sessions
+import purchase_records
+import response_cache
+
+
+def find_duplicates(cursor):
+    """Return ``[(order_number, page, shipment_date, ids)]`` for keys stored more than once."""
+    cursor.execute(f'''
+        SELECT order_number, COALESCE(page, ''), COALESCE(NULLIF(shipment_date_iso, ''), shipment_date),
+               GROUP_CONCAT(id)
+        FROM basic_info
+        GROUP BY {purchase_records.NATURAL_KEY_SQL}
+        HAVING COUNT(*) > 1
+        ORDER BY MIN(id)
+    ''')
+    return [
+        (order_number, page, shipment_date, sorted(int(i) for i in ids.split(',')))
+        for order_number, page, shipment_date, ids in cursor.fetchall()
+    ]
+
+
+def remove_duplicates(cursor):
+    """Delete every row that has a newer row with the same key; returns the number deleted.
+
+    Parts of the deleted rows go with them and the cached totals of every
+    affected import session are recomputed (empty sessions are dropped).
+    """
+    cursor.execute('DROP TABLE IF EXISTS temp.duplicate_records')
+    cursor.execute(f'''
+        CREATE TEMP TABLE duplicate_records AS
+        SELECT id, import_session_id FROM basic_info
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM basic_info GROUP BY {purchase_records.NATURAL_KEY_SQL}
+        )
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM temp.duplicate_records')
+    removed = cursor.fetchone()[0]
+
+    if removed:
+        cursor.execute('DELETE FROM parts_info WHERE basic_info_id IN (SELECT id FROM temp.duplicate_records)')
+        cursor.execute('DELETE FROM basic_info WHERE id IN (SELECT id FROM temp.duplicate_records)')
+        cursor.execute('SELECT DISTINCT import_session_id FROM temp.duplicate_records')
+        for (session_id,) in cursor.fetchall():
+            import_sessions.refresh_session(cursor, session_id)
+
+    cursor.execute('DROP TABLE temp.duplicate_records')
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重複した仕入データ（受注番号・ページ・出荷日が同じもの）を削除します。各キーで最新の1件を残します。')
+    parser.add_argument('--database', help='対象のDBファイル（省略時は DATABASE_PATH）')
+    parser.add_argument('--dry-run', action='store_true', help='削除せずに重複を表示するだけ')
+    args = parser.parse_args()
+
+    if args.database:
+        from config import DatabaseConfig
+        DatabaseConfig.PATH = args.database
+    import db
+
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        duplicates = find_duplicates(cursor)
+        for order_number, page, shipment_date, ids in duplicates:
+            print(f'受注番号={order_number} ページ={page} 出荷日={shipment_date}: id {ids} -> 残す id {ids[-1]}')
+
+        if args.dry_run:
+            conn.rollback()
+            print(f'{len(duplicates)}件のキーに重複があります（--dry-run のため削除していません）')
+            return
+
+        removed = remove_duplicates(cursor)
+        if removed:
+            response_cache.bump(cursor)
+        conn.commit()
+        print(f'{len(duplicates)}件のキーから重複{removed}件を削除しました')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
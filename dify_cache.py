@@ -0,0 +1,153 @@
+"""Persistent cache of Dify extraction results keyed by image content.
+
+Entries are keyed by the SHA-256 of the image bytes together with
+``DifyConfig.DIFY_WORKFLOW_ID``, so re-uploading the same scan skips the
+upload and workflow run while a changed workflow never serves stale output.
+The table is bounded by entry count and total size with least-recently-used
+eviction.
+"""
+import hashlib
+import json
+import threading
+
+import db
+from config import DifyCacheConfig, DifyConfig
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dify_result_cache (
+            image_sha256 TEXT NOT NULL,
+            workflow_id TEXT NOT NULL,
+            records TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            hit_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (image_sha256, workflow_id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_dify_result_cache_last_used
+        ON dify_result_cache(last_used_at)
+    ''')
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def hash_stream(stream, chunk_size=64 * 1024):
+    """SHA-256 of a seekable stream; the stream is rewound afterwards."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def get(image_sha256):
+    """Return the cached records for an image hash, or None on a miss."""
+    if not DifyCacheConfig.ENABLED:
+        return None
+
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT records FROM dify_result_cache
+            WHERE image_sha256 = ? AND workflow_id = ?
+        ''', (image_sha256, DifyConfig.DIFY_WORKFLOW_ID))
+        row = cursor.fetchone()
+        if row is None:
+            _count('misses')
+            return None
+
+        cursor.execute('''
+            UPDATE dify_result_cache
+            SET hit_count = hit_count + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE image_sha256 = ? AND workflow_id = ?
+        ''', (image_sha256, DifyConfig.DIFY_WORKFLOW_ID))
+        conn.commit()
+    finally:
+        conn.close()
+
+    _count('hits')
+    return json.loads(row[0])
+
+
+def put(image_sha256, records):
+    """Store the parsed ``text`` output for an image and evict old entries."""
+    if not DifyCacheConfig.ENABLED:
+        return
+
+    payload = json.dumps(records, ensure_ascii=False)
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO dify_result_cache
+            (image_sha256, workflow_id, records, size_bytes)
+            VALUES (?, ?, ?, ?)
+        ''', (image_sha256, DifyConfig.DIFY_WORKFLOW_ID, payload, len(payload.encode('utf-8'))))
+
+        # Keep the most recently used entries that fit inside both limits.
+        cursor.execute('''
+            DELETE FROM dify_result_cache
+            WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid,
+                           ROW_NUMBER() OVER recent AS position,
+                           SUM(size_bytes) OVER recent AS running_bytes
+                    FROM dify_result_cache
+                    WINDOW recent AS (ORDER BY last_used_at DESC, created_at DESC, rowid DESC)
+                )
+                WHERE position > ? OR running_bytes > ?
+            )
+        ''', (DifyCacheConfig.MAX_ENTRIES, DifyCacheConfig.MAX_BYTES))
+        evicted = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    _count('stores')
+    if evicted > 0:
+        _count('evictions', evicted)
+
+
+def clear():
+    conn = db.connect()
+    try:
+        conn.execute('DELETE FROM dify_result_cache')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def stats():
+    """Hit/miss counters for this process plus the current table size."""
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM dify_result_cache')
+        entries, size_bytes = cursor.fetchone()
+    finally:
+        conn.close()
+
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters['hits'] + counters['misses']
+    counters.update({
+        'entries': entries,
+        'size_bytes': size_bytes,
+        'hit_rate': counters['hits'] / lookups if lookups else 0.0,
+        'max_entries': DifyCacheConfig.MAX_ENTRIES,
+        'max_bytes': DifyCacheConfig.MAX_BYTES
+    })
+    return counters
@@ -0,0 +1,259 @@
+"""Shared HTTP client for all Dify API traffic.
+
+One ``requests.Session`` with a sized connection pool is reused by every
+route and background job, so uploads and workflow runs ride on kept-alive
+connections instead of paying a new TCP/TLS handshake per call. Requests that
+come back 429/5xx, or fail to connect, are retried with exponential backoff
+and full jitter, honouring ``Retry-After`` when Dify sends it. Every attempt
+first takes a slot from the rate limit shared by all worker processes
+(``dify_rate_limit``), and a 429 holds that limit for everyone, so several
+operators importing at once stay under Dify's ceiling instead of bursting
+into it. Every attempt is timed into ``dify_request_duration_seconds`` by
+operation and status.
+
+Uploads are sent as a ``MultipartFileBody`` that reads the image from its
+(spooled) file in ``UPLOAD_CHUNK_SIZE`` pieces while the request is going
+out, instead of letting ``requests`` read it into one bytes object and build
+the whole multipart body in memory.
+
+Workflow runs use ``DifyConfig.RESPONSE_MODE``. In ``streaming`` mode Dify
+answers at once and sends the run's progress as server-sent events (with a
+ping every few seconds), so the read timeout bounds silence rather than the
+whole run, and ``read_workflow_result`` picks the outcome out of the
+``workflow_finished`` event. ``blocking`` mode returns it as one JSON body.
+"""
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.fields import RequestField
+
+import dify_rate_limit
+import metrics
+from config import DifyConfig, UploadConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER = 'purchases-maintenance-app'
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class DifyThrottled(Exception):
+    """Dify still answered 429 after every retry."""
+
+
+class MultipartFileBody:
+    """A ``multipart/form-data`` body of form fields and one file, read as it is sent.
+
+    The length is known up front, so the request carries a Content-Length
+    and the file is read from its current contents in chunks. The file is
+    rewound first, so a retry can build a new body from the same stream.
+    """
+
+    def __init__(self, fields, name, filename, stream, content_type):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+
+        parts = []
+        for field, value in fields.items():
+            part = RequestField(name=field, data=value)
+            part.make_multipart()
+            parts.append(f'--{boundary}\r\n{part.render_headers()}{value}\r\n')
+        part = RequestField(name=name, data=b'', filename=filename)
+        part.make_multipart(content_type=content_type)
+        parts.append(f'--{boundary}\r\n{part.render_headers()}')
+        head = ''.join(parts).encode('utf-8')
+        tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        self.length = len(head) + size + len(tail)
+        self._pieces = [io.BytesIO(head), stream, io.BytesIO(tail)]
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = UploadConfig.CHUNK_SIZE
+        while self._pieces:
+            chunk = self._pieces[0].read(size)
+            if chunk:
+                return chunk
+            self._pieces.pop(0)
+        return b''
+
+    def __iter__(self):
+        return iter(lambda: self.read(UploadConfig.CHUNK_SIZE), b'')
+
+
+class DifyClient:
+    """Pooled, retrying client built from ``DifyConfig``."""
+
+    def __init__(self, config=DifyConfig):
+        self.config = config
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f'Bearer {config.DIFY_API_KEY}'})
+
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config.HTTP_POOL_SIZE,
+            pool_block=False
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def upload_file(self, filename, stream, content_type, user=DEFAULT_USER):
+        """POST an image to ``/v1/files/upload``, streamed from ``stream`` again on every attempt."""
+        def send():
+            body = MultipartFileBody({'user': user}, 'file', filename, stream, content_type)
+            return self.session.post(
+                f"{self.config.DIFY_API_BASE_URL}/v1/files/upload",
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=(self.config.CONNECT_TIMEOUT, self.config.UPLOAD_READ_TIMEOUT)
+            )
+
+        return self._with_retry('upload', send)
+
+    def run_workflow(self, payload):
+        """POST a workflow run payload to ``/v1/workflows/run``.
+
+        A streaming run's body is left unread; pass the response to
+        ``read_workflow_result``, which consumes and closes it.
+        """
+        def send():
+            return self.session.post(
+                self.config.get_workflow_run_url(),
+                json=payload,
+                timeout=(self.config.CONNECT_TIMEOUT, self.config.WORKFLOW_READ_TIMEOUT),
+                stream=payload.get('response_mode') == 'streaming'
+            )
+
+        return self._with_retry('workflow', send)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.config.RETRY_BACKOFF_MAX)
+            except ValueError:
+                pass
+        ceiling = min(self.config.RETRY_BACKOFF_MAX, self.config.RETRY_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _with_retry(self, operation, send):
+        attempt = 0
+        while True:
+            dify_rate_limit.acquire(operation)
+            started = time.perf_counter()
+            try:
+                response = send()
+            except requests.exceptions.RequestException as e:
+                metrics.DIFY_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                                     operation=operation, status=type(e).__name__)
+                if not isinstance(e, requests.exceptions.ConnectionError) or attempt >= self.config.MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt)
+                metrics.DIFY_RETRIES.inc(operation=operation, reason='connection')
+                logger.warning('Dify connection failed, retrying', extra={
+                    'operation': operation, 'error': type(e).__name__, 'delay': round(delay, 2),
+                    'attempt': attempt + 1, 'max_retries': self.config.MAX_RETRIES
+                })
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            metrics.DIFY_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                                 operation=operation, status=str(response.status_code))
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.config.MAX_RETRIES:
+                return response
+
+            delay = self._backoff(attempt, response)
+            if response.status_code == 429:
+                dify_rate_limit.block(delay)
+            metrics.DIFY_RETRIES.inc(operation=operation, reason=str(response.status_code))
+            logger.warning('Dify returned a retryable status, retrying', extra={
+                'operation': operation, 'status': response.status_code, 'delay': round(delay, 2),
+                'attempt': attempt + 1, 'max_retries': self.config.MAX_RETRIES
+            })
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+def workflow_payload(file_id, filename, user=DEFAULT_USER):
+    """Run payload for the OCR workflow on one uploaded file."""
+    file_extension = filename.lower().split('.')[-1] if filename else ''
+    return {
+        "inputs": {
+            "input_file": [{
+                "type": "image" if file_extension in ['png', 'jpg', 'jpeg'] else "file",
+                "transfer_method": "local_file",
+                "upload_file_id": file_id
+            }]
+        },
+        "response_mode": DifyConfig.RESPONSE_MODE,
+        "user": user
+    }
+
+
+def read_workflow_result(response):
+    """Return the run's ``data`` (``status``, ``outputs``, ``error``) from a 200 response.
+
+    Works for both response modes. A streaming body is read event by event
+    until ``workflow_finished``; an ``error`` event becomes a failed run and a
+    stream that ends without either returns None.
+    """
+    if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+        return response.json().get('data')
+
+    try:
+        # Dify sends UTF-8 without a charset parameter, so decode the bytes ourselves.
+        for line in response.iter_lines(chunk_size=None):
+            if not line.startswith(b'data:'):
+                continue
+            event = json.loads(line[5:].decode('utf-8'))
+            kind = event.get('event')
+            if kind == 'workflow_finished':
+                return event.get('data')
+            if kind == 'error':
+                return {'status': 'failed', 'error': event.get('message') or 'Unknown workflow error'}
+            if kind == 'workflow_started':
+                logger.debug('Dify workflow started', extra={'workflow_run_id': event.get('workflow_run_id')})
+    finally:
+        response.close()
+    return None
+
+
+def get_client():
+    """Return the process-wide DifyClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DifyClient()
+        return _client
+
+
+def reset_client():
+    """Drop the shared client, e.g. after changing DifyConfig at runtime."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -0,0 +1,112 @@
+"""Rate limit for Dify API calls shared by every worker process.
+
+The limit is a token bucket kept as one row in SQLite, so all threads of all
+gunicorn workers draw from the same budget (``DIFY_RATE_LIMIT_PER_MINUTE``
+with bursts of ``DIFY_RATE_LIMIT_BURST``). It is stored in GCRA form: the row
+holds the time the next call may start, and ``acquire`` reserves the next
+free slot in one short write transaction and then sleeps until it comes.
+Callers are served in arrival order at a steady rate, with no herd of
+sleepers waking to race for the same token.
+
+A 429 from Dify calls ``block``: no new call starts until ``Retry-After``
+(or the backoff) has passed, in any process. Callers sleep through a block
+before reserving a slot, and calls that already hold one re-check before
+going out and, if a block started meanwhile, reserve again once it is over.
+
+If the row cannot be read or written the call goes out unthrottled (and the
+failure is logged), as a result cache failure counts as a miss.
+"""
+import logging
+import sqlite3
+import time
+
+import db
+import metrics
+from config import DifyConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _interval():
+    return 60.0 / DifyConfig.RATE_LIMIT_PER_MINUTE
+
+
+def _reserve(conn):
+    """Take the next free slot; returns the wall-clock time it starts."""
+    interval = _interval()
+    # A caller may start up to BURST - 1 intervals ahead of the steady rate.
+    allowance = max(0, DifyConfig.RATE_LIMIT_BURST - 1) * interval
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT next_slot, blocked_until FROM dify_rate_limit WHERE id = 1')
+        next_slot, blocked_until = cursor.fetchone()
+        now = time.time()
+        start = max(now, next_slot - allowance, blocked_until)
+        cursor.execute('UPDATE dify_rate_limit SET next_slot = ? WHERE id = 1',
+                       (max(next_slot, start) + interval,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return start
+
+
+def acquire(operation):
+    """Block until this process may send one Dify request; returns the seconds waited."""
+    if DifyConfig.RATE_LIMIT_PER_MINUTE <= 0:
+        return 0.0
+
+    started = time.time()
+    try:
+        _wait_for_slot()
+    except sqlite3.Error:
+        logger.exception('Dify rate limit unavailable, not throttling', extra={'operation': operation})
+        return 0.0
+
+    waited = time.time() - started
+    metrics.DIFY_RATE_LIMIT_WAIT_SECONDS.observe(waited, operation=operation)
+    return waited
+
+
+def _sleep_until_unblocked(conn):
+    while True:
+        blocked_until = conn.execute('SELECT blocked_until FROM dify_rate_limit WHERE id = 1').fetchone()[0]
+        delay = blocked_until - time.time()
+        if delay <= 0:
+            return
+        time.sleep(delay)
+
+
+def _wait_for_slot():
+    # A slot is reserved only once any block is over: reserving during one
+    # would push the next free slot back for everyone with slots nobody uses.
+    conn = db.connect()
+    try:
+        while True:
+            _sleep_until_unblocked(conn)
+            delay = _reserve(conn) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            blocked_until = conn.execute('SELECT blocked_until FROM dify_rate_limit WHERE id = 1').fetchone()[0]
+            # Dify throttled someone while this call was waiting: take a new slot after the block.
+            if blocked_until <= time.time():
+                break
+    finally:
+        conn.close()
+
+
+def block(seconds):
+    """Hold every process's next Dify call for ``seconds`` after a 429."""
+    if DifyConfig.RATE_LIMIT_PER_MINUTE <= 0 or seconds <= 0:
+        return
+    conn = db.connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('UPDATE dify_rate_limit SET blocked_until = MAX(blocked_until, ?) WHERE id = 1',
+                     (time.time() + seconds,))
+        conn.commit()
+    except sqlite3.Error:
+        logger.exception('Dify rate limit unavailable, 429 not shared')
+    finally:
+        conn.close()
@@ -0,0 +1,169 @@
+"""Per-file Dify OCR pipeline shared by the import routes and background jobs."""
+import json
+import logging
+
+import dify_cache
+import image_preprocess
+import metrics
+from config import DifyConfig
+from dify_client import DifyThrottled, get_client, read_workflow_result, workflow_payload
+
+logger = logging.getLogger(__name__)
+
+
+def process_dify_file(filename, stream, content_type, index=0, total=1, use_cache=True,
+                      raise_throttled=False, preprocess_report=None, image_hash=None):
+    """Extract records from one image, serving repeats from the result cache.
+
+    Returns a ``(records, error)`` tuple where exactly one side is set. With
+    ``use_cache=False`` the lookup is skipped but a fresh result still
+    replaces the cached entry; ``image_hash`` saves hashing the image again
+    when the caller already has it. A file that is not cached is shrunk by
+    ``image_preprocess`` before upload, adding to ``preprocess_report`` if
+    given; the cache stays keyed by the original image. A file Dify keeps
+    throttling (after the client's own retries) is tried again, once the
+    shared rate limit lets it, up to ``THROTTLE_REQUEUE_LIMIT`` times, or
+    raises ``DifyThrottled`` with ``raise_throttled=True`` so an import job
+    can put it back in its queue instead. A throttled workflow run reuses the
+    file already uploaded.
+    """
+    try:
+        if image_hash is None:
+            image_hash = dify_cache.hash_stream(stream)
+    except Exception as e:
+        return None, f'{filename}: {str(e)}'
+
+    if use_cache:
+        records = lookup_cached(image_hash)
+        if records is not None:
+            logger.debug('Dify cache hit', extra={'image': filename, 'records': len(records)})
+            return records, None
+
+    upload_name, upload_stream, upload_type = image_preprocess.prepare(filename, stream, content_type,
+                                                                       preprocess_report)
+    log_fields = {'image': filename, 'position': f'{index + 1}/{total}'}
+    throttled = 0
+    file_id = None
+    while True:
+        try:
+            if file_id is None:
+                file_id, error = _upload(filename, upload_name, upload_stream, upload_type, log_fields)
+                if error:
+                    return None, error
+            records, error = _run_workflow(filename, upload_name, file_id, log_fields)
+            break
+        except DifyThrottled:
+            if raise_throttled:
+                raise
+            throttled += 1
+            if throttled > DifyConfig.THROTTLE_REQUEUE_LIMIT:
+                return None, throttled_error(filename)
+            metrics.DIFY_REQUEUES.inc(reason='inline')
+            logger.warning('Dify throttled the file, trying again', extra={'image': filename, 'times': throttled})
+    if records is not None:
+        store_cached(image_hash, records)
+    return records, error
+
+
+def throttled_error(filename):
+    return f'{filename}: Difyの利用上限により処理できませんでした。時間をおいて再度取り込んでください'
+
+
+def lookup_cached(image_hash):
+    """Cache lookup that treats a cache failure as a miss."""
+    try:
+        records = dify_cache.get(image_hash)
+    except Exception:
+        metrics.DIFY_CACHE_LOOKUPS.inc(result='error')
+        logger.exception('Dify cache lookup failed')
+        return None
+    metrics.DIFY_CACHE_LOOKUPS.inc(result='miss' if records is None else 'hit')
+    return records
+
+
+def store_cached(image_hash, records):
+    try:
+        dify_cache.put(image_hash, records)
+    except Exception:
+        logger.exception('Dify cache store failed')
+
+
+def _throttled(response, filename):
+    # The client already retried; release the pooled connection before giving up on this attempt.
+    response.close()
+    return DifyThrottled(filename)
+
+
+def _upload(filename, upload_name, stream, content_type, log_fields):
+    """Upload one image to Dify (as ``upload_name``); returns ``(file_id, error)``."""
+    try:
+        upload_response = get_client().upload_file(upload_name, stream, content_type)
+
+        if upload_response.status_code == 429:
+            raise _throttled(upload_response, filename)
+        if upload_response.status_code != 201:
+            logger.warning('Dify upload failed', extra=dict(log_fields, status=upload_response.status_code))
+            return None, f'{filename}: アップロードエラー ({upload_response.status_code})'
+
+        file_id = upload_response.json().get('id')
+        if not file_id:
+            return None, f'{filename}: ファイルIDの取得に失敗'
+        return file_id, None
+
+    except DifyThrottled:
+        raise
+    except Exception as e:
+        logger.exception('Dify extraction failed', extra={'image': filename})
+        return None, f'{filename}: {str(e)}'
+
+
+def _run_workflow(filename, upload_name, file_id, log_fields):
+    """Run the workflow on an uploaded image; returns ``(records, error)``."""
+    try:
+        workflow_response = get_client().run_workflow(workflow_payload(file_id, upload_name))
+        
+        if workflow_response.status_code == 429:
+            raise _throttled(workflow_response, filename)
+        if workflow_response.status_code != 200:
+            error_detail = workflow_response.text if workflow_response.text else "Unknown error"
+            logger.warning('Dify workflow request failed', extra=dict(log_fields, status=workflow_response.status_code))
+            return None, f'{filename}: ワークフロー実行エラー ({workflow_response.status_code}): {error_detail}'
+        
+        workflow_data = read_workflow_result(workflow_response)
+        if workflow_data and workflow_data.get('status') == 'failed':
+            error_msg = workflow_data.get('error') or 'Unknown workflow error'
+            logger.warning('Dify workflow run failed', extra=log_fields)
+            if 'Provided image is not valid' in error_msg:
+                return None, f'{filename}: 画像が無効です（画像形式またはファイルが破損している可能性があります）'
+            return None, f'{filename}: Difyワークフロー実行失敗: {error_msg}'
+        
+        if not workflow_data or 'outputs' not in workflow_data:
+            return None, f'{filename}: ワークフロー結果の取得に失敗'
+        
+        outputs = workflow_data['outputs']
+        if 'text' not in outputs:
+            return None, f'{filename}: テキストデータが見つかりません'
+        
+        text_data = outputs['text']
+        try:
+            if isinstance(text_data, str):
+                cleaned_text = text_data.strip()
+                if not cleaned_text or cleaned_text in ['[]', '[\n]', '[\n\n]']:
+                    return None, f'{filename}: Difyから有効なデータが抽出されませんでした（画像に請求書データが含まれていない可能性があります）'
+                
+                data = json.loads(cleaned_text)
+            else:
+                data = text_data
+        except json.JSONDecodeError as e:
+            return None, f'{filename}: JSON解析エラー: {str(e)}'
+        
+        if isinstance(data, list) and len(data) > 0:
+            logger.info('Dify extraction finished', extra=dict(log_fields, records=len(data)))
+            return data, None
+        return None, f'{filename}: Difyから有効なデータが抽出されませんでした（空の配列が返されました）'
+    
+    except DifyThrottled:
+        raise
+    except Exception as e:
+        logger.exception('Dify extraction failed', extra={'image': filename})
+        return None, f'{filename}: {str(e)}'
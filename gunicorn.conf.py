@@ -0,0 +1,28 @@
+"""gunicorn settings, read from ``ServerConfig`` (``SERVER_*`` environment variables).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import image_preprocess
+import import_jobs
+from config import ServerConfig
+
+bind = f'{ServerConfig.HOST}:{ServerConfig.PORT}'
+workers = ServerConfig.WORKERS
+worker_class = 'gthread'
+threads = ServerConfig.THREADS
+timeout = ServerConfig.TIMEOUT
+graceful_timeout = ServerConfig.GRACEFUL_TIMEOUT
+
+# Import wsgi (and run init_db) once in the master instead of in every worker.
+preload_app = True
+
+
+def post_worker_init(worker):
+    # Every worker starts tasks for the same queued files; the claim in
+    # import_jobs._claim_next hands each file to only one of them.
+    import_jobs.resume_jobs()
+
+
+def worker_exit(server, worker):
+    import_jobs.shutdown(wait=True)
+    image_preprocess.shutdown()
@@ -0,0 +1,207 @@
+"""Shrink images before they are uploaded to Dify (opt-in).
+
+Phone photos and 600dpi scans of delivery notes are often 5-15MB, most of
+which is spent on upload bandwidth and decoding at Dify. ``prepare`` applies
+the EXIF orientation, optionally converts to grayscale, downscales so the long edge is
+at most ``IMAGE_PREPROCESS_MAX_EDGE`` and re-encodes (JPEG by default)
+without the EXIF and other metadata. Large JPEGs are decoded at a reduced
+scale to begin with (Pillow's draft mode), so the full-size bitmap is never
+built.
+
+The work runs in a small process pool (``IMAGE_PREPROCESS_WORKERS``) so
+decoding and resampling do not hold the GIL of the web worker's threads.
+Images under ``IMAGE_PREPROCESS_MIN_BYTES``, images that would not get
+smaller and images Pillow cannot read are sent as they are. Results stay
+cached by the hash of the original image.
+
+It is off unless ``IMAGE_PREPROCESS_ENABLED=1`` (grayscale needs
+``IMAGE_PREPROCESS_GRAYSCALE=1`` as well), since it changes what Dify's OCR
+sees. Pillow is optional: without it every image goes to Dify unchanged. Each stage's time goes into
+``image_preprocess_duration_seconds`` and the bytes before and after into
+``image_preprocess_bytes_total``; ``BatchReport`` adds them up for one batch.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import upload_spool
+from config import ImagePreprocessConfig
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+# Order of the stages in reports; ``queue`` is the time spent getting the
+# image to a pool process and back.
+STAGES = ('queue', 'decode', 'grayscale', 'resize', 'encode')
+
+_pool = None
+_pool_lock = threading.Lock()
+_missing_logged = False
+
+
+def shrink(source, max_edge, grayscale, image_format, quality):
+    """Run in a pool process: return the re-encoded image and the seconds per stage.
+
+    ``source`` is the image's bytes, or the path of a file holding them.
+    """
+    seconds = {}
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    if max_edge and max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        # JPEG only: decode at the smallest 1/2^n scale still at least this size.
+        image.draft('L' if grayscale else 'RGB', (round(image.width * scale), round(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    seconds['decode'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if grayscale:
+        image = image.convert('L')
+    elif image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    seconds['grayscale'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    seconds['resize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    output = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, 'JPEG', quality=quality, optimize=True)
+    else:
+        image.save(output, 'PNG', optimize=True)
+    seconds['encode'] = time.perf_counter() - started
+
+    return output.getvalue(), seconds
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs request threads can copy held locks.
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, ImagePreprocessConfig.WORKERS),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def shutdown(wait=True):
+    """Stop the pool processes; the next ``prepare`` starts new ones."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _enabled():
+    global _missing_logged
+    if not ImagePreprocessConfig.ENABLED or ImagePreprocessConfig.FORMAT not in CONTENT_TYPES:
+        return False
+    if Image is None:
+        if not _missing_logged:
+            _missing_logged = True
+            logger.info('Pillow is not installed, images are sent to Dify unchanged')
+        return False
+    return True
+
+
+def prepare(filename, stream, content_type, report=None):
+    """Return the ``(filename, stream, content_type)`` to upload in place of the original.
+
+    The original is returned unchanged when pre-processing is off, skipped
+    or fails. ``report`` (a ``BatchReport``) collects the sizes and timings.
+    """
+    if not _enabled():
+        return filename, stream, content_type
+
+    # A file on disk is opened by path in the pool process rather than read and pickled here.
+    source = upload_spool.file_path(stream)
+    if source:
+        size = os.path.getsize(source)
+    else:
+        stream.seek(0)
+        source = stream.read()
+        stream.seek(0)
+        size = len(source)
+    if size < ImagePreprocessConfig.MIN_BYTES:
+        return filename, stream, content_type
+
+    started = time.perf_counter()
+    try:
+        output, seconds = _get_pool().submit(
+            shrink, source, ImagePreprocessConfig.MAX_EDGE, ImagePreprocessConfig.GRAYSCALE,
+            ImagePreprocessConfig.FORMAT, ImagePreprocessConfig.JPEG_QUALITY
+        ).result()
+    except BrokenProcessPool:
+        logger.exception('Image pre-processing pool failed, sending the original', extra={'image': filename})
+        shutdown(wait=False)
+        return filename, stream, content_type
+    except Exception as e:
+        logger.warning('Image pre-processing failed, sending the original',
+                       extra={'image': filename, 'error': f'{type(e).__name__}: {e}'})
+        return filename, stream, content_type
+    seconds['queue'] = max(0.0, time.perf_counter() - started - sum(seconds.values()))
+
+    smaller = len(output) < size
+    bytes_out = len(output) if smaller else size
+    for stage, value in seconds.items():
+        metrics.IMAGE_PREPROCESS_SECONDS.observe(value, stage=stage)
+    metrics.IMAGE_PREPROCESS_BYTES.inc(size, direction='in')
+    metrics.IMAGE_PREPROCESS_BYTES.inc(bytes_out, direction='out')
+    if report is not None:
+        report.add(size, bytes_out, seconds)
+    logger.debug('Image pre-processed', extra={'image': filename, 'bytes_in': size, 'bytes_out': bytes_out})
+
+    if not smaller:
+        return filename, stream, content_type
+    name = os.path.splitext(filename)[0] + EXTENSIONS[ImagePreprocessConfig.FORMAT]
+    return name, io.BytesIO(output), CONTENT_TYPES[ImagePreprocessConfig.FORMAT]
+
+
+class BatchReport:
+    """Bytes saved and seconds per stage over the images of one batch (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    def add(self, bytes_in, bytes_out, seconds):
+        with self._lock:
+            self.files += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            for stage, value in seconds.items():
+                self.seconds[stage] += value
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'files': self.files,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'bytes_saved': self.bytes_in - self.bytes_out,
+                'seconds': {stage: round(value, 3) for stage, value in self.seconds.items()},
+            }
@@ -0,0 +1,531 @@
+"""Background Dify import jobs persisted in SQLite.
+
+Submitting a batch spools each image to disk and creates one
+``import_job_files`` row per file. The files are then processed on a shared
+thread pool while the browser follows the job. Each pool task claims
+whichever queued file is fairest to run next, across every job and worker
+process: a file of the operator (``owner``) with the fewest files running,
+oldest first, so a short batch is not stuck behind another operator's long
+one. A file Dify keeps throttling goes back to the queue rather than into
+the errors, up to ``DIFY_THROTTLE_REQUEUE_LIMIT`` times. Every row keeps its own
+state, extracted records and error, so partial results are visible as soon as
+a page finishes and a page that is already ``done`` is never sent to Dify
+again, even after the worker restarts.
+
+While a file runs, a heartbeat thread in its process refreshes the row's
+``updated_at`` every ``IMPORT_JOB_HEARTBEAT_SECONDS``, and the same thread
+requeues files nobody has touched for ``IMPORT_JOB_STALE_SECONDS`` (their
+process died). A file is therefore never taken from a live worker, and the
+files of a crashed one run again without waiting for a restart. Each claim
+bumps ``attempts``, and a task only records its result while the row still
+carries its claim, so a file requeued from a stalled task is not finished
+twice.
+
+Finished files are also numbered per job in completion order
+(``finish_seq``), and ``job_events`` relays them to the browser as
+server-sent events whose ids are those numbers: a dropped connection resumes
+from ``Last-Event-ID`` without resending or skipping a page, whichever worker
+process ran it.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import dify_cache
+import metrics
+import upload_spool
+from config import DifyConfig, ImportJobConfig
+from dify_client import DifyThrottled
+from dify_service import lookup_cached, process_dify_file, throttled_error
+
+logger = logging.getLogger(__name__)
+
+FILE_QUEUED = 'queued'
+FILE_RUNNING = 'running'
+FILE_DONE = 'done'
+FILE_ERROR = 'error'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Row ids of the files this process is running, kept fresh by the heartbeat thread.
+_running = set()
+_heartbeat_stop = None
+
+# Wakes event streams in this process as soon as a file finishes; streams
+# also re-check on a short interval for files finished by other processes.
+_file_finished = threading.Condition()
+
+# Next finish_seq of the job, taken inside the UPDATE that finishes the file.
+NEXT_FINISH_SEQ = '(SELECT COALESCE(MAX(finish_seq), 0) + 1 FROM import_job_files WHERE job_id = ?)'
+
+# The row still carries this task's claim (id, status, attempts).
+CLAIMED = 'id = ? AND status = ? AND attempts = ?'
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            total_count INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_job_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            file_index INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            stored_path TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            records TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (job_id) REFERENCES import_jobs (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_import_job_files_job
+        ON import_job_files(job_id, file_index)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_import_job_files_status
+        ON import_job_files(status)
+    ''')
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, DifyConfig.MAX_CONCURRENT_REQUESTS),
+                thread_name_prefix='import-job'
+            )
+            _start_heartbeat()
+        return _executor
+
+
+def _start_heartbeat():
+    global _heartbeat_stop
+    _heartbeat_stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(_heartbeat_stop,), name='import-job-heartbeat', daemon=True).start()
+
+
+def _heartbeat(stop):
+    while not stop.wait(ImportJobConfig.HEARTBEAT_SECONDS):
+        with _executor_lock:
+            running = list(_running)
+        conn = db.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('UPDATE import_job_files SET updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?',
+                               [(row_id, FILE_RUNNING) for row_id in running])
+            requeued = _requeue_stale(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception('Import job heartbeat failed')
+            continue
+        finally:
+            conn.close()
+        if requeued:
+            logger.warning('Stale import job files requeued', extra={'files': requeued})
+            _submit(requeued)
+
+
+def _requeue_stale(cursor):
+    """Put ``running`` files without a heartbeat for ``STALE_SECONDS`` back in the queue; returns how many."""
+    cursor.execute('''
+        UPDATE import_job_files
+        SET status = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE status = ? AND updated_at < datetime('now', ?)
+    ''', (FILE_QUEUED, FILE_RUNNING, f'-{ImportJobConfig.STALE_SECONDS} seconds'))
+    return cursor.rowcount
+
+
+def shutdown(wait=True):
+    """Stop the worker pool, letting files already sent to Dify finish.
+
+    Files that have not started yet stay ``queued`` in the database and are
+    picked up by ``resume_jobs()`` on the next start.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+        stop = _heartbeat_stop
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+        stop.set()
+
+
+def _job_dir(job_id):
+    return os.path.join(ImportJobConfig.STORAGE_DIR, job_id)
+
+
+def create_job(files, use_cache=True, owner=''):
+    """Spool the uploaded files and queue them. Returns the new job id.
+
+    Images already in the result cache are completed immediately; with
+    ``use_cache=False`` every image is sent to Dify again. ``owner``
+    identifies the operator for fair scheduling between concurrent jobs.
+    """
+    metrics.BATCH_SIZE.observe(len(files), kind='import_job_files')
+    job_id = str(uuid.uuid4())
+    job_dir = _job_dir(job_id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    rows = []
+    finished = 0
+    for i, file in enumerate(files):
+        if file.filename == '':
+            continue
+
+        if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            finished += 1
+            rows.append((job_id, i, file.filename, file.content_type, None, FILE_ERROR,
+                         f'{file.filename}: PNG、JPG、またはJPEGファイルではありません', None, finished))
+            continue
+
+        stored_path = os.path.join(job_dir, f'{i:04d}')
+        upload_spool.save(file, stored_path)
+
+        if use_cache:
+            with open(stored_path, 'rb') as stream:
+                cached = lookup_cached(dify_cache.hash_stream(stream))
+            if cached is not None:
+                os.remove(stored_path)
+                finished += 1
+                rows.append((job_id, i, file.filename, file.content_type, None, FILE_DONE, None,
+                             json.dumps(cached, ensure_ascii=False), finished))
+                continue
+
+        rows.append((job_id, i, file.filename, file.content_type, stored_path, FILE_QUEUED, None, None, None))
+
+    try:
+        os.rmdir(job_dir)
+    except OSError:
+        pass
+
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO import_jobs (id, total_count, owner) VALUES (?, ?, ?)',
+                       (job_id, len(files), owner))
+        cursor.executemany('''
+            INSERT INTO import_job_files
+            (job_id, file_index, filename, content_type, stored_path, status, error, records, finish_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    _submit(sum(1 for row in rows if row[5] == FILE_QUEUED))
+    return job_id
+
+
+def _submit(count):
+    # Tasks are not tied to a file: each one claims the next fair file when it starts.
+    for _ in range(count):
+        _get_executor().submit(_run_next)
+
+
+def _claim_next(cursor):
+    """Mark the next file to run as ``running``; returns its row id or None.
+
+    The choice and the claim share one write transaction, so concurrent
+    tasks in any process never claim the same file.
+    """
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            WITH running AS (
+                SELECT j.owner, COUNT(*) AS files
+                FROM import_job_files f
+                JOIN import_jobs j ON j.id = f.job_id
+                WHERE f.status = ?
+                GROUP BY j.owner
+            )
+            SELECT f.id
+            FROM import_job_files f
+            JOIN import_jobs j ON j.id = f.job_id
+            LEFT JOIN running r ON r.owner = j.owner
+            WHERE f.status = ?
+            ORDER BY COALESCE(r.files, 0), f.id
+            LIMIT 1
+        ''', (FILE_RUNNING, FILE_QUEUED))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('''
+                UPDATE import_job_files
+                SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (FILE_RUNNING, row[0]))
+        cursor.connection.commit()
+    except Exception:
+        cursor.connection.rollback()
+        raise
+    return row[0] if row else None
+
+
+def _run_next():
+    conn = db.connect()
+    file_row_id = None
+    try:
+        cursor = conn.cursor()
+        file_row_id = _claim_next(cursor)
+        if file_row_id is None:
+            return
+
+        cursor.execute('''
+            SELECT f.job_id, f.file_index, f.filename, f.content_type, f.stored_path, f.attempts, j.total_count
+            FROM import_job_files f
+            JOIN import_jobs j ON j.id = f.job_id
+            WHERE f.id = ?
+        ''', (file_row_id,))
+        job_id, file_index, filename, content_type, stored_path, attempts, total = cursor.fetchone()
+        with _executor_lock:
+            _running.add(file_row_id)
+
+        try:
+            with open(stored_path, 'rb') as stream:
+                # The cache was already consulted when the job was created.
+                records, error = process_dify_file(filename, stream, content_type, file_index, total,
+                                                   use_cache=False, raise_throttled=True)
+        except OSError as e:
+            records, error = None, f'{filename}: {str(e)}'
+        except DifyThrottled:
+            if attempts <= DifyConfig.THROTTLE_REQUEUE_LIMIT:
+                # Back of the queue; the shared rate limit holds the next call until Dify recovers.
+                cursor.execute(f'''
+                    UPDATE import_job_files
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE {CLAIMED}
+                ''', (FILE_QUEUED, file_row_id, FILE_RUNNING, attempts))
+                conn.commit()
+                metrics.DIFY_REQUEUES.inc(reason='job')
+                logger.warning('Dify throttled an import job file, requeued', extra={
+                    'image': filename, 'job_id': job_id, 'attempts': attempts
+                })
+                _submit(1)
+                return
+            records, error = None, throttled_error(filename)
+
+        if error:
+            cursor.execute(f'''
+                UPDATE import_job_files
+                SET status = ?, error = ?, finish_seq = {NEXT_FINISH_SEQ}, updated_at = CURRENT_TIMESTAMP
+                WHERE {CLAIMED}
+            ''', (FILE_ERROR, error, job_id, file_row_id, FILE_RUNNING, attempts))
+        else:
+            cursor.execute(f'''
+                UPDATE import_job_files
+                SET status = ?, records = ?, error = NULL, finish_seq = {NEXT_FINISH_SEQ},
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE {CLAIMED}
+            ''', (FILE_DONE, json.dumps(records, ensure_ascii=False), job_id, file_row_id, FILE_RUNNING, attempts))
+        if not cursor.rowcount:
+            # Requeued as stale meanwhile; the task that claimed it again records the result.
+            conn.commit()
+            logger.warning('Import job file was requeued while running, result dropped', extra={
+                'image': filename, 'job_id': job_id
+            })
+            return
+        conn.commit()
+        with _file_finished:
+            _file_finished.notify_all()
+
+        if stored_path and os.path.exists(stored_path):
+            os.remove(stored_path)
+            try:
+                os.rmdir(os.path.dirname(stored_path))
+            except OSError:
+                pass
+    except Exception:
+        logger.exception('Import job file failed', extra={'file_row_id': file_row_id})
+    finally:
+        with _executor_lock:
+            _running.discard(file_row_id)
+        conn.close()
+
+
+def get_job(job_id):
+    """Return the job status payload, or None if the job does not exist."""
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, total_count, created_at FROM import_jobs WHERE id = ?', (job_id,))
+        job = cursor.fetchone()
+        if not job:
+            return None
+
+        cursor.execute('''
+            SELECT file_index, filename, status, records, error
+            FROM import_job_files
+            WHERE job_id = ?
+            ORDER BY file_index
+        ''', (job_id,))
+        file_rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    files = []
+    data = []
+    errors = []
+    processed_count = 0
+    finished_count = 0
+    for file_index, filename, status, records, error in file_rows:
+        files.append({
+            'index': file_index,
+            'filename': filename,
+            'status': status,
+            'error': error
+        })
+        if status == FILE_DONE:
+            data.extend(json.loads(records))
+            processed_count += 1
+        elif status == FILE_ERROR:
+            errors.append(error)
+        if status in (FILE_DONE, FILE_ERROR):
+            finished_count += 1
+
+    if finished_count < len(file_rows):
+        status = 'running'
+    elif processed_count == 0:
+        status = 'failed'
+    else:
+        status = 'completed'
+
+    return {
+        'success': True,
+        'job_id': job[0],
+        'status': status,
+        'created_at': job[2],
+        'total_count': job[1],
+        'finished_count': finished_count,
+        'processed_count': processed_count,
+        'files': files,
+        'data': data,
+        'errors': errors
+    }
+
+
+def _event(name, payload, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(payload, ensure_ascii=False)}')
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def job_events(job_id, last_seq=0):
+    """Yield a job's finished files as server-sent events, starting after ``last_seq``.
+
+    Each ``file`` event carries one file's outcome and records, with its
+    ``finish_seq`` as the event id. A ``done`` event with the job summary
+    ends the stream; so does ``ImportJobConfig.EVENTS_MAX_SECONDS``, after
+    which the browser reconnects and resumes. Comment lines are sent while
+    nothing finishes so proxies keep the connection open.
+    """
+    started = time.monotonic()
+    last_sent = started
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM import_job_files WHERE job_id = ?', (job_id,))
+        file_count = cursor.fetchone()[0]
+        yield f'retry: {int(ImportJobConfig.EVENTS_POLL_SECONDS * 4000)}\n\n'.encode('utf-8')
+
+        while True:
+            cursor.execute('''
+                SELECT finish_seq, file_index, filename, status, records, error
+                FROM import_job_files
+                WHERE job_id = ? AND finish_seq > ?
+                ORDER BY finish_seq
+            ''', (job_id, last_seq))
+            for finish_seq, file_index, filename, status, records, error in cursor.fetchall():
+                last_seq = finish_seq
+                last_sent = time.monotonic()
+                yield _event('file', {
+                    'index': file_index,
+                    'filename': filename,
+                    'status': status,
+                    'error': error,
+                    'records': json.loads(records) if records else [],
+                    'finished_count': finish_seq,
+                    'file_count': file_count
+                }, finish_seq)
+
+            if last_seq >= file_count:
+                job = get_job(job_id)
+                yield _event('done', {key: job[key] for key in (
+                    'status', 'total_count', 'finished_count', 'processed_count', 'errors'
+                )})
+                return
+
+            now = time.monotonic()
+            if now - started >= ImportJobConfig.EVENTS_MAX_SECONDS:
+                return
+            if now - last_sent >= ImportJobConfig.EVENTS_HEARTBEAT_SECONDS:
+                last_sent = now
+                yield b': keepalive\n\n'
+            with _file_finished:
+                _file_finished.wait(ImportJobConfig.EVENTS_POLL_SECONDS)
+    finally:
+        conn.close()
+
+
+def job_exists(job_id):
+    conn = db.connect()
+    try:
+        return conn.execute('SELECT 1 FROM import_jobs WHERE id = ?', (job_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def resume_jobs():
+    """Requeue unfinished files after a restart and purge expired jobs.
+
+    Files left ``running`` by a worker that died are requeued once their
+    heartbeat is older than ``ImportJobConfig.STALE_SECONDS`` (here, or later
+    by the heartbeat thread); ``done`` files keep their stored records and are
+    not processed again.
+    """
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT id FROM import_jobs
+            WHERE created_at < datetime('now', ?)
+        ''', (f'-{ImportJobConfig.RETENTION_DAYS} days',))
+        expired = [row[0] for row in cursor.fetchall()]
+        for job_id in expired:
+            cursor.execute('DELETE FROM import_job_files WHERE job_id = ?', (job_id,))
+            cursor.execute('DELETE FROM import_jobs WHERE id = ?', (job_id,))
+            shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+        _requeue_stale(cursor)
+        conn.commit()
+
+        cursor.execute('SELECT COUNT(*) FROM import_job_files WHERE status = ?', (FILE_QUEUED,))
+        queued = cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+    _submit(queued)
+
+    if queued:
+        logger.info('Import jobs resumed', extra={'queued_files': queued})
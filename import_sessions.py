@@ -0,0 +1,84 @@
+"""Import sessions: one row per ``/api/save_data`` call.
+
+``import_sessions`` records when each batch was saved together with its
+record count and cached totals, and ``basic_info.parts_total`` caches the sum
+of each record's parts. The basic info screen reads the newest session
+through the ``created_at`` index and the stored totals instead of scanning
+``basic_info`` and aggregating ``parts_info`` on every load. Every route that
+changes parts or records refreshes the affected totals in its own
+transaction.
+"""
+import json
+
+
+def create_session(cursor, session_id):
+    """Start a session; its counts are filled in by ``refresh_session`` once its records are written."""
+    cursor.execute('INSERT INTO import_sessions (id, record_count) VALUES (?, 0)', (session_id,))
+
+
+def latest_session_id(cursor):
+    cursor.execute('''
+        SELECT id FROM import_sessions
+        ORDER BY created_at DESC, rowid DESC
+        LIMIT 1
+    ''')
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def refresh_session(cursor, session_id):
+    """Recompute a session's cached totals; a session with no records left is dropped."""
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(shipping_cost), 0), COALESCE(SUM(parts_total), 0)
+        FROM basic_info
+        WHERE import_session_id = ?
+    ''', (session_id,))
+    record_count, shipping_total, parts_total = cursor.fetchone()
+
+    if record_count == 0:
+        cursor.execute('DELETE FROM import_sessions WHERE id = ?', (session_id,))
+        return
+
+    cursor.execute('''
+        UPDATE import_sessions
+        SET record_count = ?, shipping_total = ?, parts_total = ?
+        WHERE id = ?
+    ''', (record_count, shipping_total, parts_total, session_id))
+
+
+def refresh_record(cursor, basic_info_id):
+    """Recompute one record's ``parts_total`` and its session's totals."""
+    cursor.execute('''
+        UPDATE basic_info
+        SET parts_total = (
+            SELECT COALESCE(SUM(sales_amount), 0) FROM part_lines WHERE basic_info_id = ?
+        )
+        WHERE id = ?
+    ''', (basic_info_id, basic_info_id))
+
+    session_id = session_of_record(cursor, basic_info_id)
+    if session_id is not None:
+        refresh_session(cursor, session_id)
+
+
+def refresh_records(cursor, basic_info_ids):
+    """Recompute ``parts_total`` for several records in one statement; sessions are left to the caller."""
+    cursor.execute('''
+        UPDATE basic_info
+        SET parts_total = (
+            SELECT COALESCE(SUM(sales_amount), 0) FROM part_lines WHERE basic_info_id = basic_info.id
+        )
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(sorted(basic_info_ids)),))
+
+
+def session_of_record(cursor, basic_info_id):
+    cursor.execute('SELECT import_session_id FROM basic_info WHERE id = ?', (basic_info_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def record_of_part(cursor, part_id):
+    cursor.execute('SELECT basic_info_id FROM part_lines WHERE id = ?', (part_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,225 @@
+"""Streaming reader for JSON imports on ``/upload``.
+
+Accepts the same two shapes the upload screen always has: a top-level array
+of records, or a Dify export ``{"text": [...]}`` whose items are either
+record objects (optionally with a ``明細`` detail list) or markdown strings
+containing fenced ```` ```json ```` blocks. Instead of reading and
+``json.loads``-ing the whole file, the array is decoded one element at a
+time with ``json.JSONDecoder.raw_decode`` over a sliding UTF-8 buffer, so
+memory is bounded by the largest single element rather than the file.
+Normalized records are spooled to a temporary file and streamed back out as
+the response body.
+"""
+import codecs
+import json
+import re
+import tempfile
+
+from config import JsonImportConfig
+
+MARKDOWN_JSON_PATTERN = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+RECORD_FIELDS = (
+    ('ページ', ''), ('出荷日', ''), ('受注番号', ''), ('納入先番号', ''), ('担当者', ''),
+    ('運賃', 0), ('税抜合計', 0)
+)
+PART_FIELDS = ('部品番号', '部品名', '数量', '売上単価', '売上金額')
+
+# A decode error this close to the end of the buffer may just be a value cut
+# off mid-chunk; read more before treating it as malformed.
+_TRUNCATION_MARGIN = 16
+
+_decoder = json.JSONDecoder()
+
+
+class ImportFormatError(ValueError):
+    """The file is not in a supported shape; the message is shown to the user."""
+
+
+class ImportTooLarge(ValueError):
+    """The file exceeds ``JsonImportConfig.MAX_BYTES``."""
+
+
+class _StreamReader:
+    """UTF-8 text buffer over a binary stream that only keeps unread input."""
+
+    def __init__(self, stream, max_bytes, chunk_size):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def fill(self, min_chars=1):
+        """Append at least ``min_chars`` more characters unless the stream ends."""
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        target = len(self.buffer) + min_chars
+        while not self.eof and len(self.buffer) < target:
+            chunk = self.stream.read(self.chunk_size)
+            self.bytes_read += len(chunk)
+            if self.bytes_read > self.max_bytes:
+                raise ImportTooLarge(self.max_bytes)
+            if not chunk:
+                self.buffer += self.decoder.decode(b'', final=True)
+                self.eof = True
+            else:
+                self.buffer += self.decoder.decode(chunk)
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at end of input)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ImportFormatError('JSONデータの形式が正しくありません')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                truncated = e.pos >= len(self.buffer) - _TRUNCATION_MARGIN or e.msg.startswith('Unterminated')
+                if self.eof or not truncated:
+                    raise
+            else:
+                # A number near the end of the buffer may continue in the next
+                # chunk ("3." decodes as 3, "1e+" as 1).
+                is_number = isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                if self.eof or (len(self.buffer) - end > 2 if is_number else end <= len(self.buffer)):
+                    self.pos = end
+                    return obj
+            # Grow geometrically so a large element is re-scanned only O(log n) times.
+            self.fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def array_items(self):
+        """Yield the elements of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ImportFormatError('JSONデータの形式が正しくありません')
+
+
+def normalize_item(item):
+    """Records contained in one item of a Dify ``text`` list."""
+    if not isinstance(item, dict):
+        records = []
+        for block in MARKDOWN_JSON_PATTERN.findall(str(item)):
+            try:
+                parsed = json.loads(block)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(parsed, list):
+                records.extend(parsed)
+            else:
+                records.append(parsed)
+        return records
+
+    record = {field: item.get(field, default) for field, default in RECORD_FIELDS}
+    for field in PART_FIELDS:
+        record[field] = item.get(field, [])
+
+    details = item.get('明細')
+    if isinstance(details, list):
+        record['部品番号'] = [detail.get('部品番号', '') for detail in details]
+        record['部品名'] = [detail.get('部品名', '') for detail in details]
+        record['数量'] = [str(detail.get('数量', 0)) for detail in details]
+        record['売上単価'] = [str(detail.get('売上単価', 0)) for detail in details]
+        record['売上金額'] = [str(detail.get('売上金額', 0)) for detail in details]
+    return [record]
+
+
+def iter_records(stream, max_bytes=None, chunk_size=None):
+    """Yield the import records of a JSON upload one at a time.
+
+    Raises ``ImportFormatError`` for unsupported shapes, ``ImportTooLarge``
+    past the size ceiling and ``json.JSONDecodeError`` for malformed JSON.
+    """
+    reader = _StreamReader(
+        stream,
+        max_bytes or JsonImportConfig.MAX_BYTES,
+        chunk_size or JsonImportConfig.CHUNK_SIZE
+    )
+
+    first = reader.peek()
+    if first == '[':
+        yield from reader.array_items()
+        return
+    if first != '{':
+        raise ImportFormatError('JSONデータは配列形式である必要があります')
+
+    # Dify export: skip keys until "text", then stream its items.
+    reader.expect('{')
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        if key != 'text':
+            reader.value()
+        elif reader.peek() == '[':
+            extracted = 0
+            for item in reader.array_items():
+                for record in normalize_item(item):
+                    extracted += 1
+                    yield record
+            if not extracted:
+                raise ImportFormatError('Dify形式のJSONからデータを抽出できませんでした')
+            return
+        else:
+            records = normalize_item(reader.value())
+            if not records:
+                raise ImportFormatError('Dify形式のJSONからデータを抽出できませんでした')
+            yield from records
+            return
+        if reader.peek() == ',':
+            reader.pos += 1
+    raise ImportFormatError('JSONデータは配列形式である必要があります')
+
+
+def spool_records(stream, max_bytes=None, chunk_size=None):
+    """Parse an upload into a temporary file of comma-separated JSON records.
+
+    The whole file is validated before anything is returned, so errors can
+    still be answered with a 400. Returns ``(spool, count)``; the caller owns
+    the spool file.
+    """
+    spool = tempfile.TemporaryFile()
+    count = 0
+    try:
+        for record in iter_records(stream, max_bytes, chunk_size):
+            if count:
+                spool.write(b',')
+            spool.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+            count += 1
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, count
+
+
+def stream_response(spool, chunk_size=None):
+    """Yield the ``{"success": true, "data": [...]}`` body from a spool, then close it."""
+    with spool:
+        yield b'{"success": true, "data": ['
+        for chunk in iter(lambda: spool.read(chunk_size or JsonImportConfig.CHUNK_SIZE), b''):
+            yield chunk
+        yield b']}'
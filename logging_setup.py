@@ -0,0 +1,63 @@
+"""Structured logging for the app, background jobs and the Dify client.
+
+Modules log through ``logging.getLogger(__name__)`` and pass context as
+``extra`` fields (``logger.info('Dify upload finished', extra={'status':
+201})``). ``configure()`` installs one stderr handler on the root logger that
+writes either ``key=value`` text or one JSON object per line
+(``LoggingConfig.FORMAT``). Response bodies from Dify are never logged: they
+carry the extracted invoice contents.
+"""
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+from config import LoggingConfig
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_configured = False
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = (f'{datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")} '
+                f'{record.levelname} {record.name} {record.getMessage()}')
+        fields = _fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure():
+    """Install the root handler once; later calls are no-ops."""
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if LoggingConfig.FORMAT == 'json' else TextFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(LoggingConfig.LEVEL)
+    _configured = True
@@ -0,0 +1,199 @@
+"""In-process metrics exposed in Prometheus text format on ``/metrics``.
+
+Counters and fixed-bucket histograms are kept in plain dicts keyed by label
+values; an observation is one ``bisect`` and a few additions under a
+per-metric lock, cheap enough to leave on for every request and every SQL
+statement (``benchmarks/bench_metrics.py``). Values are per process: with
+several worker processes each one reports its own series.
+
+Recorded:
+
+- ``http_request_duration_seconds``: every request, by method, URL rule and
+  status (streamed bodies are timed until the response object is returned)
+- ``sqlite_query_duration_seconds``: every ``execute`` / ``executemany`` on a
+  ``db.connect()`` connection, by statement type and first table
+- ``dify_request_duration_seconds`` / ``dify_retries_total``: each Dify HTTP
+  attempt by operation and status code, and the retries taken
+- ``dify_rate_limit_wait_seconds``: time each Dify call waited for its slot
+  in the shared rate limit
+- ``dify_requeues_total``: import job files put back in the queue after Dify
+  kept answering 429
+- ``dify_cache_lookups_total``: result cache hits, misses and failures
+- ``image_preprocess_duration_seconds`` / ``image_preprocess_bytes_total``:
+  time per stage of shrinking an image before upload, and the bytes before
+  and after
+- ``response_cache_lookups_total``: read API answers by 304, cached body or
+  fresh query
+- ``batch_size``: records per save / JSON import, files per Dify batch or job
+"""
+import bisect
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import Response, g, request
+
+from config import MetricsConfig
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000, 50000)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _series_order(item):
+    return tuple(str(value) for value in item[0])
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items(), key=_series_order)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts; the last slot is +Inf.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            series = sorted(((key, (list(counts), total, count))
+                             for key, (counts, total, count) in self._series.items()), key=_series_order)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'route', 'status'))
+SQL_QUERY_SECONDS = Histogram(
+    'sqlite_query_duration_seconds', 'SQLite statement execution time', ('operation', 'table'), QUERY_BUCKETS)
+DIFY_REQUEST_SECONDS = Histogram(
+    'dify_request_duration_seconds', 'Dify API call latency per attempt', ('operation', 'status'))
+DIFY_RETRIES = Counter(
+    'dify_retries_total', 'Dify API calls retried', ('operation', 'reason'))
+DIFY_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'dify_rate_limit_wait_seconds', 'Wait for a Dify rate limit slot', ('operation',))
+DIFY_REQUEUES = Counter(
+    'dify_requeues_total', 'Files sent to Dify again after throttling', ('reason',))
+IMAGE_PREPROCESS_SECONDS = Histogram(
+    'image_preprocess_duration_seconds', 'Image pre-processing time per stage', ('stage',))
+IMAGE_PREPROCESS_BYTES = Counter(
+    'image_preprocess_bytes_total', 'Image bytes before and after pre-processing', ('direction',))
+DIFY_CACHE_LOOKUPS = Counter(
+    'dify_cache_lookups_total', 'Dify result cache lookups', ('result',))
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'response_cache_lookups_total', 'Read API responses by cache outcome', ('endpoint', 'result'))
+BATCH_SIZE = Histogram(
+    'batch_size', 'Items per batch', ('kind',), SIZE_BUCKETS)
+
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+# Only DML gets a table label; schema statements and pragmas are grouped by type.
+_DML = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH'})
+
+
+@lru_cache(maxsize=1024)
+def _statement_labels(sql):
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ''
+    if operation not in _DML:
+        return operation, ''
+    match = _STATEMENT_TABLE.search(sql)
+    return operation, match.group(1).lower() if match else ''
+
+
+def observe_query(sql, seconds):
+    operation, table = _statement_labels(sql)
+    SQL_QUERY_SECONDS.observe(seconds, operation=operation, table=table)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                     method=request.method, route=route, status=response.status_code)
+    return response
+
+
+def metrics_view():
+    return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    if not MetricsConfig.ENABLED:
+        return
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
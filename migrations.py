@@ -0,0 +1,749 @@
+"""Versioned schema migrations for the purchases database.
+
+Each migration runs once, in version order, inside its own ``BEGIN
+IMMEDIATE`` transaction and is recorded in ``schema_migrations``. The version
+is re-checked after the write lock is taken, so several processes starting
+at once apply every migration exactly once. Add new schema changes by
+appending to ``MIGRATIONS``; never edit one that has already shipped.
+
+A migration carries its own SQL, as it shipped, instead of calling the
+modules that use the tables today: a later change to ``rollups`` or
+``part_catalog`` must not change what a new database gets from 008 or 012.
+Schema changes after that belong in a new migration.
+"""
+import json
+import logging
+import re
+import unicodedata
+from datetime import date
+
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS basic_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page TEXT,
+            shipment_date TEXT NOT NULL,
+            order_number TEXT NOT NULL,
+            delivery_number TEXT NOT NULL,
+            person_in_charge TEXT NOT NULL,
+            shipping_cost INTEGER NOT NULL,
+            total_amount INTEGER NOT NULL,
+            import_session_id TEXT NOT NULL DEFAULT 'legacy',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parts_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            basic_info_id INTEGER NOT NULL,
+            part_number TEXT NOT NULL,
+            part_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            sales_amount INTEGER NOT NULL,
+            FOREIGN KEY (basic_info_id) REFERENCES basic_info (id)
+        )
+    ''')
+
+    # Databases created before the page column existed.
+    cursor.execute('PRAGMA table_info(basic_info)')
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'page' not in columns:
+        cursor.execute('ALTER TABLE basic_info ADD COLUMN page TEXT')
+        logger.info('Database migration: added page column to basic_info')
+
+
+def _add_purchase_list_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_basic_info_shipment_date ON basic_info(shipment_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_basic_info_order_number ON basic_info(order_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_basic_info_delivery_number ON basic_info(delivery_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_basic_info_person_date ON basic_info(person_in_charge, shipment_date)')
+
+    # 一覧の総件数をCOUNT(*)の全件走査なしで返すためのカウンタ
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS row_counts (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO row_counts (table_name, row_count)
+        SELECT 'basic_info', COUNT(*) FROM basic_info
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_basic_info_count_insert AFTER INSERT ON basic_info
+        BEGIN
+            UPDATE row_counts SET row_count = row_count + 1 WHERE table_name = 'basic_info';
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_basic_info_count_delete AFTER DELETE ON basic_info
+        BEGIN
+            UPDATE row_counts SET row_count = row_count - 1 WHERE table_name = 'basic_info';
+        END
+    ''')
+
+
+def _add_foreign_key_indexes(cursor):
+    # Every parts lookup, the basic_info join and the cascading deletes filter on it.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_parts_info_basic_id ON parts_info(basic_info_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_basic_info_import_session ON basic_info(import_session_id)')
+
+
+# Migration 004 parses the stored text the way saves did when it shipped.
+_SHIPMENT_DATE = re.compile(r'(\d{2}|\d{4})[-/.](\d{1,2})[-/.](\d{1,2})')
+
+
+def _iso_shipment_date(value):
+    match = _SHIPMENT_DATE.fullmatch(str(value or '').strip())
+    if not match:
+        return ''
+    year, month, day = match.groups()
+    try:
+        return date(int(year) + 2000 if len(year) == 2 else int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return ''
+
+
+def _add_shipment_date_iso(cursor):
+    cursor.execute("ALTER TABLE basic_info ADD COLUMN shipment_date_iso TEXT NOT NULL DEFAULT ''")
+
+    cursor.execute('SELECT id, shipment_date FROM basic_info')
+    cursor.executemany(
+        'UPDATE basic_info SET shipment_date_iso = ? WHERE id = ?',
+        [(_iso_shipment_date(shipment_date), record_id)
+         for record_id, shipment_date in cursor.fetchall()]
+    )
+
+    # Date ordering and ranges move to the ISO column.
+    cursor.execute('DROP INDEX IF EXISTS idx_basic_info_shipment_date')
+    cursor.execute('DROP INDEX IF EXISTS idx_basic_info_person_date')
+    cursor.execute('CREATE INDEX idx_basic_info_shipment_date ON basic_info(shipment_date_iso)')
+    cursor.execute('CREATE INDEX idx_basic_info_date_order ON basic_info(shipment_date_iso, order_number)')
+    cursor.execute('CREATE INDEX idx_basic_info_person_date ON basic_info(person_in_charge, shipment_date_iso)')
+
+
+def _add_import_sessions(cursor):
+    cursor.execute('''
+        CREATE TABLE import_sessions (
+            id TEXT PRIMARY KEY,
+            record_count INTEGER NOT NULL,
+            shipping_total INTEGER NOT NULL DEFAULT 0,
+            parts_total INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_import_sessions_created_at ON import_sessions(created_at)')
+
+    # The basic info screen reads one session ordered by date straight from this index.
+    cursor.execute('DROP INDEX IF EXISTS idx_basic_info_import_session')
+    cursor.execute('CREATE INDEX idx_basic_info_session_date ON basic_info(import_session_id, shipment_date_iso)')
+
+    cursor.execute('ALTER TABLE basic_info ADD COLUMN parts_total INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        UPDATE basic_info
+        SET parts_total = totals.parts_total
+        FROM (
+            SELECT basic_info_id, SUM(sales_amount) AS parts_total
+            FROM parts_info
+            GROUP BY basic_info_id
+        ) AS totals
+        WHERE basic_info.id = totals.basic_info_id
+    ''')
+
+    # A session's time is that of its newest record, which is what the
+    # basic info screen used to sort on.
+    cursor.execute('''
+        INSERT INTO import_sessions (id, record_count, shipping_total, parts_total, created_at)
+        SELECT import_session_id, COUNT(*), SUM(shipping_cost), SUM(parts_total), MAX(created_at)
+        FROM basic_info
+        GROUP BY import_session_id
+        ORDER BY MAX(created_at), MAX(id)
+    ''')
+
+
+
+def _add_natural_key(cursor):
+    # Keep the newest row of every key so the unique index can be built.
+    cursor.execute('''
+        CREATE TEMP TABLE duplicate_records AS
+        SELECT id, import_session_id FROM basic_info
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM basic_info
+            GROUP BY order_number, COALESCE(page, ''), COALESCE(NULLIF(shipment_date_iso, ''), shipment_date)
+        )
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM temp.duplicate_records')
+    removed = cursor.fetchone()[0]
+
+    if removed:
+        cursor.execute('DELETE FROM parts_info WHERE basic_info_id IN (SELECT id FROM temp.duplicate_records)')
+        cursor.execute('DELETE FROM basic_info WHERE id IN (SELECT id FROM temp.duplicate_records)')
+        # Sessions left empty are dropped, the others get their totals recomputed.
+        cursor.execute('''
+            DELETE FROM import_sessions
+            WHERE id IN (SELECT import_session_id FROM temp.duplicate_records)
+              AND id NOT IN (SELECT import_session_id FROM basic_info)
+        ''')
+        cursor.execute('''
+            UPDATE import_sessions
+            SET record_count = totals.record_count,
+                shipping_total = totals.shipping_total,
+                parts_total = totals.parts_total
+            FROM (
+                SELECT import_session_id, COUNT(*) AS record_count,
+                       SUM(shipping_cost) AS shipping_total, SUM(parts_total) AS parts_total
+                FROM basic_info
+                WHERE import_session_id IN (SELECT import_session_id FROM temp.duplicate_records)
+                GROUP BY import_session_id
+            ) AS totals
+            WHERE import_sessions.id = totals.import_session_id
+        ''')
+        logger.info('Database migration: removed duplicate basic_info rows', extra={'removed': removed})
+    cursor.execute('DROP TABLE temp.duplicate_records')
+
+    cursor.execute('''
+        CREATE UNIQUE INDEX idx_basic_info_natural_key
+        ON basic_info(order_number, COALESCE(page, ''), COALESCE(NULLIF(shipment_date_iso, ''), shipment_date))
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE save_requests (
+            idempotency_key TEXT PRIMARY KEY,
+            payload_hash TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_save_requests_created_at ON save_requests(created_at)')
+
+
+def _add_data_version(cursor):
+    cursor.execute('''
+        CREATE TABLE data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO data_version (id, version) VALUES (1, 0)')
+
+
+def _add_rollups(cursor):
+    cursor.execute('''
+        CREATE TABLE rollup_monthly (
+            dimension TEXT NOT NULL,
+            month TEXT NOT NULL,
+            key TEXT NOT NULL,
+            record_count INTEGER NOT NULL,
+            shipping_total INTEGER NOT NULL,
+            amount_total INTEGER NOT NULL,
+            parts_total INTEGER NOT NULL,
+            PRIMARY KEY (dimension, month, key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE rollup_part_monthly (
+            month TEXT NOT NULL,
+            part_number TEXT NOT NULL,
+            line_count INTEGER NOT NULL,
+            quantity_total INTEGER NOT NULL,
+            sales_total INTEGER NOT NULL,
+            PRIMARY KEY (month, part_number)
+        ) WITHOUT ROWID
+    ''')
+
+    # Each basic_info row counts once under its 担当者 and once under its 納入先番号.
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_basic_info_insert AFTER INSERT ON basic_info
+        BEGIN{_rollup_record_add('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_basic_info_delete AFTER DELETE ON basic_info
+        BEGIN{_rollup_record_add('OLD', '-')}{_rollup_record_prune('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_basic_info_update
+        AFTER UPDATE OF shipment_date_iso, person_in_charge, delivery_number, shipping_cost, total_amount, parts_total
+        ON basic_info
+        BEGIN{_rollup_record_add('OLD', '-')}{_rollup_record_add('NEW', '+')}{_rollup_record_prune('OLD')}
+        END
+    ''')
+    # Parts are counted under their record's month, so they follow a date change.
+    cursor.execute('''
+        CREATE TRIGGER trg_rollup_basic_info_month AFTER UPDATE OF shipment_date_iso ON basic_info
+        WHEN COALESCE(substr(OLD.shipment_date_iso, 1, 7), '') IS NOT COALESCE(substr(NEW.shipment_date_iso, 1, 7), '')
+        BEGIN
+            INSERT INTO rollup_part_monthly (month, part_number, line_count, quantity_total, sales_total)
+            SELECT COALESCE(substr(OLD.shipment_date_iso, 1, 7), ''), part_number, -COUNT(*), -SUM(quantity), -SUM(sales_amount)
+            FROM parts_info WHERE basic_info_id = NEW.id
+            GROUP BY part_number
+            ON CONFLICT (month, part_number) DO UPDATE SET
+                line_count = line_count + excluded.line_count,
+                quantity_total = quantity_total + excluded.quantity_total,
+                sales_total = sales_total + excluded.sales_total;
+            INSERT INTO rollup_part_monthly (month, part_number, line_count, quantity_total, sales_total)
+            SELECT COALESCE(substr(NEW.shipment_date_iso, 1, 7), ''), part_number, +COUNT(*), +SUM(quantity), +SUM(sales_amount)
+            FROM parts_info WHERE basic_info_id = NEW.id
+            GROUP BY part_number
+            ON CONFLICT (month, part_number) DO UPDATE SET
+                line_count = line_count + excluded.line_count,
+                quantity_total = quantity_total + excluded.quantity_total,
+                sales_total = sales_total + excluded.sales_total;
+            DELETE FROM rollup_part_monthly WHERE month = COALESCE(substr(OLD.shipment_date_iso, 1, 7), '') AND line_count = 0;
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_parts_info_insert AFTER INSERT ON parts_info
+        BEGIN{_rollup_part_add('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_parts_info_delete AFTER DELETE ON parts_info
+        BEGIN{_rollup_part_add('OLD', '-')}{_rollup_part_prune('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_parts_info_update
+        AFTER UPDATE OF basic_info_id, part_number, quantity, sales_amount ON parts_info
+        BEGIN{_rollup_part_add('OLD', '-')}{_rollup_part_add('NEW', '+')}{_rollup_part_prune('OLD')}
+        END
+    ''')
+
+    cursor.execute('''
+        INSERT INTO rollup_monthly
+        (dimension, month, key, record_count, shipping_total, amount_total, parts_total)
+        SELECT 'person_in_charge', COALESCE(substr(shipment_date_iso, 1, 7), ''), COALESCE(person_in_charge, ''), COUNT(*),
+               SUM(shipping_cost), SUM(total_amount), SUM(COALESCE(parts_total, 0))
+        FROM basic_info
+        GROUP BY 2, 3
+        UNION ALL
+        SELECT 'delivery_number', COALESCE(substr(shipment_date_iso, 1, 7), ''), COALESCE(delivery_number, ''), COUNT(*),
+               SUM(shipping_cost), SUM(total_amount), SUM(COALESCE(parts_total, 0))
+        FROM basic_info
+        GROUP BY 2, 3
+    ''')
+    cursor.execute('''
+        INSERT INTO rollup_part_monthly (month, part_number, line_count, quantity_total, sales_total)
+        SELECT COALESCE(substr(b.shipment_date_iso, 1, 7), ''), p.part_number, COUNT(*), SUM(p.quantity), SUM(p.sales_amount)
+        FROM parts_info p
+        LEFT JOIN basic_info b ON b.id = p.basic_info_id
+        GROUP BY 1, 2
+    ''')
+
+
+# Statements of the migration 008 and 012 triggers; ``row`` is NEW or OLD
+# and ``sign`` adds or subtracts it.
+def _rollup_record_add(row, sign):
+    return ''.join(f'''
+            INSERT INTO rollup_monthly
+            (dimension, month, key, record_count, shipping_total, amount_total, parts_total)
+            VALUES ('{column}', COALESCE(substr({row}.shipment_date_iso, 1, 7), ''), COALESCE({row}.{column}, ''), {sign}1,
+                    {sign}{row}.shipping_cost, {sign}{row}.total_amount, {sign}COALESCE({row}.parts_total, 0))
+            ON CONFLICT (dimension, month, key) DO UPDATE SET
+                record_count = record_count + excluded.record_count,
+                shipping_total = shipping_total + excluded.shipping_total,
+                amount_total = amount_total + excluded.amount_total,
+                parts_total = parts_total + excluded.parts_total;''' for column in ('person_in_charge', 'delivery_number'))
+
+
+def _rollup_record_prune(row):
+    return ''.join(f'''
+            DELETE FROM rollup_monthly
+            WHERE dimension = '{column}' AND month = COALESCE(substr({row}.shipment_date_iso, 1, 7), '')
+              AND key = COALESCE({row}.{column}, '') AND record_count = 0;''' for column in ('person_in_charge', 'delivery_number'))
+
+
+def _rollup_part_keys(row, labelled):
+    month = f"COALESCE((SELECT COALESCE(substr(b.shipment_date_iso, 1, 7), '') FROM basic_info b WHERE b.id = {row}.basic_info_id), '')"
+    if labelled:
+        return month, f'(SELECT part_number FROM part_labels WHERE id = {row}.label_id)'
+    return month, f'{row}.part_number'
+
+
+def _rollup_part_add(row, sign, labelled=False):
+    month, part_number = _rollup_part_keys(row, labelled)
+    return f'''
+            INSERT INTO rollup_part_monthly (month, part_number, line_count, quantity_total, sales_total)
+            VALUES ({month}, {part_number}, {sign}1, {sign}{row}.quantity, {sign}{row}.sales_amount)
+            ON CONFLICT (month, part_number) DO UPDATE SET
+                line_count = line_count + excluded.line_count,
+                quantity_total = quantity_total + excluded.quantity_total,
+                sales_total = sales_total + excluded.sales_total;'''
+
+
+def _rollup_part_prune(row, labelled=False):
+    month, part_number = _rollup_part_keys(row, labelled)
+    return f'''
+            DELETE FROM rollup_part_monthly
+            WHERE month = {month} AND part_number = {part_number} AND line_count = 0;'''
+
+
+def _add_parts_search(cursor):
+    cursor.execute('''
+        CREATE VIRTUAL TABLE parts_search USING fts5(
+            part_number, part_name,
+            content='parts_info', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_insert AFTER INSERT ON parts_info
+        BEGIN
+            INSERT INTO parts_search (rowid, part_number, part_name)
+            VALUES (NEW.id, NEW.part_number, NEW.part_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_delete AFTER DELETE ON parts_info
+        BEGIN
+            INSERT INTO parts_search (parts_search, rowid, part_number, part_name)
+            VALUES ('delete', OLD.id, OLD.part_number, OLD.part_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_update AFTER UPDATE OF part_number, part_name ON parts_info
+        BEGIN
+            INSERT INTO parts_search (parts_search, rowid, part_number, part_name)
+            VALUES ('delete', OLD.id, OLD.part_number, OLD.part_name);
+            INSERT INTO parts_search (rowid, part_number, part_name)
+            VALUES (NEW.id, NEW.part_number, NEW.part_name);
+        END
+    ''')
+    cursor.execute("INSERT INTO parts_search (parts_search) VALUES ('rebuild')")
+
+
+def _add_import_job_finish_sequence(cursor):
+    # The job tables were created outside migrations (init_db) before this one.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            total_count INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_job_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            file_index INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            stored_path TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            records TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (job_id) REFERENCES import_jobs (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_import_job_files_job
+        ON import_job_files(job_id, file_index)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_import_job_files_status
+        ON import_job_files(status)
+    ''')
+
+    # Files already finished are numbered in file order.
+    cursor.execute('ALTER TABLE import_job_files ADD COLUMN finish_seq INTEGER')
+    cursor.execute('''
+        UPDATE import_job_files
+        SET finish_seq = (
+            SELECT COUNT(*) FROM import_job_files f
+            WHERE f.job_id = import_job_files.job_id
+              AND f.status IN ('done', 'error')
+              AND f.file_index <= import_job_files.file_index
+        )
+        WHERE status IN ('done', 'error')
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX idx_import_job_files_finish_seq
+        ON import_job_files(job_id, finish_seq)
+    ''')
+
+
+def _add_dify_scheduling(cursor):
+    cursor.execute('''
+        CREATE TABLE dify_rate_limit (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_slot REAL NOT NULL,
+            blocked_until REAL NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO dify_rate_limit (id, next_slot, blocked_until) VALUES (1, 0, 0)')
+    cursor.execute("ALTER TABLE import_jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+
+
+# Migration 012's catalog key: NFKC, upper case, no spaces, one kind of dash.
+_PART_DASHES = re.compile('[‐-―−ーｰ]')
+_PART_SPACES = re.compile(r'\s+')
+
+
+def _part_key(part_number):
+    key = unicodedata.normalize('NFKC', str(part_number)).upper()
+    return _PART_SPACES.sub('', _PART_DASHES.sub('-', key))
+
+
+def _price_day(row):
+    """``shipment_date_iso`` as the YYYYMMDD integer of ``part_price_history``."""
+    return f"CAST(replace({row}.shipment_date_iso, '-', '') AS INTEGER)"
+
+
+def _price_history_insert(row):
+    return f'''
+            INSERT INTO part_price_history (part_id, shipment_day, line_id, unit_price, quantity)
+            SELECT part_id, COALESCE((SELECT {_price_day('b')} FROM basic_info b WHERE b.id = {row}.basic_info_id), 0), {row}.id, {row}.unit_price, {row}.quantity
+            FROM part_labels WHERE id = {row}.label_id;'''
+
+
+def _price_history_delete(row):
+    return f'''
+            DELETE FROM part_price_history
+            WHERE part_id = (SELECT part_id FROM part_labels WHERE id = {row}.label_id)
+              AND shipment_day = COALESCE((SELECT {_price_day('b')} FROM basic_info b WHERE b.id = {row}.basic_info_id), 0) AND line_id = {row}.id;'''
+
+
+def _add_part_catalog(cursor):
+    cursor.execute('''
+        CREATE TABLE parts (
+            id INTEGER PRIMARY KEY,
+            part_key TEXT NOT NULL UNIQUE,
+            part_number TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE part_labels (
+            id INTEGER PRIMARY KEY,
+            part_id INTEGER NOT NULL REFERENCES parts (id),
+            part_number TEXT NOT NULL,
+            part_name TEXT NOT NULL,
+            UNIQUE (part_number, part_name)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE part_price_history (
+            part_id INTEGER NOT NULL,
+            shipment_day INTEGER NOT NULL,
+            line_id INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (part_id, shipment_day, line_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Every distinct spelling becomes a label; the first spelling of a part
+    # (in sorted order) becomes its catalog part_number.
+    cursor.execute('SELECT DISTINCT part_number, part_name FROM parts_info')
+    rows = json.dumps(sorted((number, name, _part_key(number)) for number, name in cursor.fetchall()),
+                      ensure_ascii=False)
+    cursor.execute('''
+        INSERT OR IGNORE INTO parts (part_key, part_number)
+        SELECT json_extract(value, '$[2]'), json_extract(value, '$[0]') FROM json_each(?)
+    ''', (rows,))
+    cursor.execute('''
+        INSERT OR IGNORE INTO part_labels (part_id, part_number, part_name)
+        SELECT p.id, json_extract(j.value, '$[0]'), json_extract(j.value, '$[1]')
+        FROM json_each(?) j
+        JOIN parts p ON p.part_key = json_extract(j.value, '$[2]')
+    ''', (rows,))
+
+    cursor.execute('''
+        CREATE TABLE part_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            basic_info_id INTEGER NOT NULL,
+            label_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            sales_amount INTEGER NOT NULL,
+            FOREIGN KEY (basic_info_id) REFERENCES basic_info (id),
+            FOREIGN KEY (label_id) REFERENCES part_labels (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO part_lines (id, basic_info_id, label_id, quantity, unit_price, sales_amount)
+        SELECT p.id, p.basic_info_id, l.id, p.quantity, p.unit_price, p.sales_amount
+        FROM parts_info p
+        JOIN part_labels l ON l.part_number = p.part_number AND l.part_name = p.part_name
+        ORDER BY p.id
+    ''')
+    # Ids of deleted lines are not handed out again, as before.
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'part_lines'")
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'part_lines', seq FROM sqlite_sequence WHERE name = 'parts_info'
+    ''')
+
+    # The rollup and search triggers of migrations 008 and 009 go with the
+    # old table (the copy above ran without them, so both stay exact) and
+    # are recreated on part_lines.
+    for name in ('trg_rollup_parts_info_insert', 'trg_rollup_parts_info_delete', 'trg_rollup_parts_info_update',
+                 'trg_parts_search_insert', 'trg_parts_search_delete', 'trg_parts_search_update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute('DROP TABLE parts_info')
+    cursor.execute('CREATE INDEX idx_part_lines_basic_id ON part_lines(basic_info_id)')
+
+    # parts_info becomes a view with the old columns.
+    cursor.execute('''
+        CREATE VIEW parts_info AS
+        SELECT p.id, p.basic_info_id, l.part_number, l.part_name, p.quantity, p.unit_price, p.sales_amount
+        FROM part_lines p
+        JOIN part_labels l ON l.id = p.label_id
+    ''')
+    # Deletes through the old name keep working (dedup_records, ad-hoc scripts).
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_info_delete INSTEAD OF DELETE ON parts_info
+        BEGIN
+            DELETE FROM part_lines WHERE id = OLD.id;
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER trg_part_prices_insert AFTER INSERT ON part_lines
+        BEGIN{_price_history_insert('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_part_prices_delete AFTER DELETE ON part_lines
+        BEGIN{_price_history_delete('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_part_prices_update
+        AFTER UPDATE OF basic_info_id, label_id, unit_price, quantity ON part_lines
+        BEGIN{_price_history_delete('OLD')}{_price_history_insert('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_part_prices_date AFTER UPDATE OF shipment_date_iso ON basic_info
+        WHEN OLD.shipment_date_iso IS NOT NEW.shipment_date_iso
+        BEGIN
+            UPDATE part_price_history SET shipment_day = {_price_day('NEW')}
+            WHERE (part_id, shipment_day, line_id) IN (
+                SELECT l.part_id, {_price_day('OLD')}, p.id
+                FROM part_lines p JOIN part_labels l ON l.id = p.label_id
+                WHERE p.basic_info_id = NEW.id
+            );
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_part_lines_insert AFTER INSERT ON part_lines
+        BEGIN{_rollup_part_add('NEW', '+', True)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_part_lines_delete AFTER DELETE ON part_lines
+        BEGIN{_rollup_part_add('OLD', '-', True)}{_rollup_part_prune('OLD', True)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_rollup_part_lines_update
+        AFTER UPDATE OF basic_info_id, label_id, quantity, sales_amount ON part_lines
+        BEGIN{_rollup_part_add('OLD', '-', True)}{_rollup_part_add('NEW', '+', True)}{_rollup_part_prune('OLD', True)}
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_lines_insert AFTER INSERT ON part_lines
+        BEGIN
+            INSERT INTO parts_search (rowid, part_number, part_name)
+            SELECT NEW.id, part_number, part_name FROM part_labels WHERE id = NEW.label_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_lines_delete AFTER DELETE ON part_lines
+        BEGIN
+            INSERT INTO parts_search (parts_search, rowid, part_number, part_name)
+            SELECT 'delete', OLD.id, part_number, part_name FROM part_labels WHERE id = OLD.label_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_parts_search_lines_update AFTER UPDATE OF label_id ON part_lines
+        BEGIN
+            INSERT INTO parts_search (parts_search, rowid, part_number, part_name)
+            SELECT 'delete', OLD.id, part_number, part_name FROM part_labels WHERE id = OLD.label_id;
+            INSERT INTO parts_search (rowid, part_number, part_name)
+            SELECT NEW.id, part_number, part_name FROM part_labels WHERE id = NEW.label_id;
+        END
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO part_price_history (part_id, shipment_day, line_id, unit_price, quantity)
+        SELECT l.part_id, COALESCE({_price_day('b')}, 0), p.id, p.unit_price, p.quantity
+        FROM part_lines p
+        JOIN part_labels l ON l.id = p.label_id
+        LEFT JOIN basic_info b ON b.id = p.basic_info_id
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'purchase list indexes and row counter', _add_purchase_list_indexes),
+    (3, 'foreign key and import session indexes', _add_foreign_key_indexes),
+    (4, 'iso shipment date', _add_shipment_date_iso),
+    (5, 'import sessions and stored parts totals', _add_import_sessions),
+    (6, 'natural key and save idempotency keys', _add_natural_key),
+    (7, 'data version counter', _add_data_version),
+    (8, 'reporting rollups', _add_rollups),
+    (9, 'part search index', _add_parts_search),
+    (10, 'import job finish order', _add_import_job_finish_sequence),
+    (11, 'shared dify rate limit and job owners', _add_dify_scheduling),
+    (12, 'part catalog and price history', _add_part_catalog),
+]
+
+
+def applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def migrate(conn):
+    """Apply every pending migration; returns the versions applied now."""
+    applied = applied_versions(conn)
+    newly_applied = []
+
+    for version, name, apply in MIGRATIONS:
+        if version in applied:
+            continue
+
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+            apply(cursor)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        logger.info('Database migration applied', extra={'version': f'{version:03d}', 'migration': name})
+        newly_applied.append(version)
+
+    if newly_applied:
+        # ETags handed out before the schema change must not match any more.
+        cursor = conn.cursor()
+        response_cache.bump(cursor)
+        conn.commit()
+
+    return newly_applied
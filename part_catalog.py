@@ -0,0 +1,184 @@
+"""Part catalog: part numbers and names stored once, referenced by id.
+
+Part lines used to carry the full part number and name text on every row.
+Since migration 012 they live in ``part_lines`` with an integer ``label_id``.
+``part_labels`` holds every distinct (part number, part name) spelling
+exactly as it was saved, and each label points at one row of ``parts``, the
+catalog, keyed by the normalized part number (``part_key``: NFKC, upper
+case, no spaces, one kind of dash), so ``12345-67890`` and ``１２３４５－６７８９０``
+are the same part. ``parts_info`` is a view with the old columns, so every
+read (``/api/parts_info/<id>``, search, export, rollups) returns the same
+rows as before; writes go to ``part_lines`` with ids from ``intern``.
+
+``part_price_history`` indexes every line's unit price by part and
+shipment date. Triggers (migration 012) keep it in step in the writing
+transaction, like the rollups, so a part's latest price and monthly trend are a range read of that
+part's rows (``GET /api/parts/price_history``). Catalog entries and labels
+are kept when their last line goes.
+"""
+import json
+import re
+import unicodedata
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 120
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+# Hyphens, dashes, minus signs and the long vowel mark OCR reads for a dash.
+DASHES = re.compile('[‐-―−ーｰ]')
+SPACES = re.compile(r'\s+')
+
+
+def normalize_part_number(value):
+    """The catalog key of a part number."""
+    key = unicodedata.normalize('NFKC', str(value)).upper()
+    return SPACES.sub('', DASHES.sub('-', key))
+
+
+def _day(row):
+    """``shipment_date_iso`` as a YYYYMMDD integer (0 when unparsed): 4 bytes per history row instead of 10."""
+    return f"CAST(replace({row}.shipment_date_iso, '-', '') AS INTEGER)"
+
+
+def _iso(day):
+    return f'{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}' if day else ''
+
+
+def _iso_month(month):
+    return f'{month // 100:04d}-{month % 100:02d}' if month else ''
+
+
+def _first_day(latest, months):
+    """Lower bound (YYYYMM00) of the ``months`` calendar months ending with the month of ``latest``."""
+    if not latest:
+        return 0
+    index = latest // 10000 * 12 + latest // 100 % 100 - months
+    return index // 12 * 10000 + (index % 12 + 1) * 100
+
+
+_HISTORY_SQL = f'''
+    SELECT l.part_id, COALESCE({_day('b')}, 0), p.id, p.unit_price, p.quantity
+    FROM part_lines p
+    JOIN part_labels l ON l.id = p.label_id
+    LEFT JOIN basic_info b ON b.id = p.basic_info_id
+'''
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def intern(cursor, pairs):
+    """Label ids for ``(part_number, part_name)`` pairs, adding the parts and labels not seen yet.
+
+    Returns a dict keyed by the given pairs. Three statements whatever the
+    number of pairs; the first spelling of a new part becomes its catalog
+    ``part_number``.
+    """
+    texts = {pair: (_text(pair[0]), _text(pair[1])) for pair in pairs}
+    rows = sorted({(number, name, normalize_part_number(number))
+                   for number, name in texts.values() if number is not None and name is not None})
+    if not rows:
+        return {}
+    rows = json.dumps(rows, ensure_ascii=False)
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO parts (part_key, part_number)
+        SELECT json_extract(value, '$[2]'), json_extract(value, '$[0]') FROM json_each(?)
+    ''', (rows,))
+    cursor.execute('''
+        INSERT OR IGNORE INTO part_labels (part_id, part_number, part_name)
+        SELECT p.id, json_extract(j.value, '$[0]'), json_extract(j.value, '$[1]')
+        FROM json_each(?) j
+        JOIN parts p ON p.part_key = json_extract(j.value, '$[2]')
+    ''', (rows,))
+    cursor.execute('''
+        SELECT l.part_number, l.part_name, l.id
+        FROM json_each(?) j
+        JOIN part_labels l ON l.part_number = json_extract(j.value, '$[0]')
+                          AND l.part_name = json_extract(j.value, '$[1]')
+    ''', (rows,))
+    ids = {(number, name): label_id for number, name, label_id in cursor.fetchall()}
+    return {pair: ids[text] for pair, text in texts.items() if text in ids}
+
+
+def differences(cursor):
+    """Rows where ``part_price_history`` disagrees with ``part_lines`` (empty when consistent)."""
+    cursor.execute(f'''
+        SELECT 'missing', * FROM ({_HISTORY_SQL} EXCEPT SELECT * FROM part_price_history)
+        UNION ALL
+        SELECT 'extra', * FROM (SELECT * FROM part_price_history EXCEPT {_HISTORY_SQL})
+    ''')
+    return cursor.fetchall()
+
+
+def parse_history_args(args):
+    """Validate request args into the keyword arguments of ``price_history``."""
+    # Not at the top: purchase_queries imports purchase_records, which imports this module.
+    from purchase_queries import QueryError
+
+    part_number = (args.get('part_number') or '').strip()
+    if not part_number:
+        raise QueryError('部品番号（part_number）を指定してください')
+
+    try:
+        months = int(args.get('months', DEFAULT_MONTHS))
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('monthsとlimitは整数で指定してください')
+
+    return {
+        'part_number': part_number,
+        'months': max(1, min(months, MAX_MONTHS)),
+        'limit': max(1, min(limit, MAX_LIMIT)),
+    }
+
+
+def price_history(cursor, part_number, months=DEFAULT_MONTHS, limit=DEFAULT_LIMIT):
+    """A part's latest lines and its unit prices per month, newest first; None if the part is not in the catalog.
+
+    ``trend`` covers the ``months`` calendar months up to the latest shipment
+    (months without lines are left out).
+    """
+    cursor.execute('SELECT id, part_key, part_number FROM parts WHERE part_key = ?',
+                   (normalize_part_number(part_number),))
+    part = cursor.fetchone()
+    if part is None:
+        return None
+    part_id = part[0]
+
+    cursor.execute('SELECT part_number, part_name FROM part_labels WHERE part_id = ? ORDER BY id', (part_id,))
+    spellings = [{'part_number': row[0], 'part_name': row[1]} for row in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT line_id, shipment_day, unit_price, quantity
+        FROM part_price_history
+        WHERE part_id = ?
+        ORDER BY shipment_day DESC, line_id DESC
+        LIMIT ?
+    ''', (part_id, limit))
+    rows = cursor.fetchall()
+    lines = [{'id': row[0], 'shipment_date': _iso(row[1]), 'unit_price': row[2], 'quantity': row[3]} for row in rows]
+
+    # Only the window's range of the key is read, however long the part's history.
+    cursor.execute('''
+        SELECT shipment_day / 100 AS month, COUNT(*), SUM(quantity),
+               MIN(unit_price), MAX(unit_price), CAST(ROUND(AVG(unit_price)) AS INTEGER)
+        FROM part_price_history
+        WHERE part_id = ? AND shipment_day >= ?
+        GROUP BY month
+        ORDER BY month DESC
+    ''', (part_id, _first_day(rows[0][1] if rows else 0, months)))
+    fields = ('line_count', 'quantity_total', 'min_unit_price', 'max_unit_price', 'avg_unit_price')
+    trend = [{'month': _iso_month(row[0]), **dict(zip(fields, row[1:]))} for row in cursor.fetchall()]
+
+    return {
+        'part_key': part[1],
+        'part_number': part[2],
+        'spellings': spellings,
+        'last_unit_price': lines[0]['unit_price'] if lines else None,
+        'last_shipment_date': lines[0]['shipment_date'] if lines else None,
+        'trend': trend,
+        'lines': lines,
+    }
@@ -0,0 +1,145 @@
+"""Substring search over part numbers and names.
+
+``parts_search`` is an external-content FTS5 table over ``parts_info``
+(``part_number``, ``part_name``; a view over ``part_lines`` and their labels
+since migration 012) with the trigram tokenizer, so any substring of three or
+more characters, Japanese included, is an index lookup instead of a
+``LIKE '%…%'`` scan. Triggers on ``part_lines``, created by the migrations,
+keep it in step with every insert, update and delete in the writing
+transaction.
+
+Results are part lines joined to their record, newest first, paged by a
+keyset cursor on the part id. Queries shorter than three characters cannot
+use trigrams and fall back to ``LIKE`` on ``parts_info``, which stops as soon
+as a page is filled. Needs SQLite 3.34 or later built with FTS5.
+"""
+from purchase_queries import QueryError, decode_cursor, encode_cursor
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MIN_TRIGRAM_LENGTH = 3
+MAX_QUERY_LENGTH = 100
+
+# field parameter -> FTS5 column filter / parts_info columns
+FIELDS = {
+    'all': ('{part_number part_name}', ('part_number', 'part_name')),
+    'part_number': ('part_number', ('part_number',)),
+    'part_name': ('part_name', ('part_name',)),
+}
+
+RESULT_COLUMNS = '''p.id, p.part_number, p.part_name, p.quantity, p.unit_price, p.sales_amount,
+               b.id, b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge'''
+
+
+def rebuild(cursor):
+    """Re-index every part line, read through the ``parts_info`` view (the table's external content)."""
+    cursor.execute("INSERT INTO parts_search (parts_search) VALUES ('rebuild')")
+
+
+def parse_search_args(args):
+    """Validate request args into the keyword arguments of ``search_parts``."""
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise QueryError('検索語（q）を指定してください')
+    if len(query) > MAX_QUERY_LENGTH:
+        raise QueryError(f'検索語は{MAX_QUERY_LENGTH}文字以内で指定してください')
+
+    field = args.get('field', 'all')
+    if field not in FIELDS:
+        raise QueryError(f'fieldは {", ".join(FIELDS)} のいずれかを指定してください')
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('limitは整数で指定してください')
+
+    cursor = args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+
+    return {
+        'query': query,
+        'field': field,
+        'limit': max(1, min(limit, MAX_LIMIT)),
+        'cursor': cursor,
+    }
+
+
+def _match_expression(query, field):
+    # One quoted phrase: the trigram tokenizer matches it as a plain substring.
+    column_filter = FIELDS[field][0]
+    return f'{column_filter} : "{query.replace(chr(34), chr(34) * 2)}"'
+
+
+def _like_pattern(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_query(query, field='all', limit=DEFAULT_LIMIT, cursor=None):
+    """SQL and parameters for one page of matches; fetches ``limit + 1`` rows."""
+    clauses = []
+    params = []
+    if len(query) >= MIN_TRIGRAM_LENGTH:
+        source = 'parts_search s JOIN parts_info p ON p.id = s.rowid'
+        id_column = 's.rowid'
+        clauses.append('parts_search MATCH ?')
+        params.append(_match_expression(query, field))
+    else:
+        source = 'parts_info p'
+        id_column = 'p.id'
+        columns = FIELDS[field][1]
+        clauses.append('(' + ' OR '.join(f"p.{column} LIKE ? ESCAPE '\\'" for column in columns) + ')')
+        params.extend([_like_pattern(query)] * len(columns))
+
+    if cursor:
+        _, last_id = decode_cursor(cursor)
+        clauses.append(f'{id_column} < ?')
+        params.append(last_id)
+
+    sql = f'''
+        SELECT {RESULT_COLUMNS}
+        FROM {source}
+        JOIN basic_info b ON b.id = p.basic_info_id
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {id_column} DESC
+        LIMIT ?
+    '''
+    return sql, params + [limit + 1]
+
+
+def _row_to_dict(row):
+    return {
+        'id': row[0],
+        'part_number': row[1],
+        'part_name': row[2],
+        'quantity': row[3],
+        'unit_price': row[4],
+        'sales_amount': row[5],
+        'basic_info': {
+            'id': row[6],
+            'ページ': row[7],
+            'shipment_date': row[8],
+            'order_number': row[9],
+            'delivery_number': row[10],
+            'person_in_charge': row[11],
+        }
+    }
+
+
+def search_parts(conn, query, field='all', limit=DEFAULT_LIMIT, cursor=None):
+    """Return one page of matching part lines plus the cursor for the next one."""
+    db_cursor = conn.cursor()
+    db_cursor.execute(*search_query(query, field, limit, cursor))
+    rows = db_cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': [_row_to_dict(row) for row in rows],
+        'pagination': {
+            'items_per_page': limit,
+            'has_more': has_more,
+            'next_cursor': encode_cursor('', rows[-1][0]) if has_more and rows else None
+        }
+    }
@@ -0,0 +1,210 @@
+"""Batched edits and deletes of saved records and part lines.
+
+``POST /api/batch`` takes a list of operations on ``basic_info`` and
+``parts_info`` and applies them in one ``BEGIN IMMEDIATE`` transaction with a
+result per operation. The payload is validated as a whole first, like
+``/api/save_data``: one invalid operation rejects the batch and nothing is
+written. Updates are partial (only the given columns change) and run in the
+order given; a missing row or a natural-key clash fails only that operation.
+Deletes then run as set-based statements over the collected ids, part lines
+first, then records together with their remaining parts. Stored totals and
+session totals are recomputed once per affected record and session.
+"""
+import json
+import sqlite3
+
+import import_sessions
+import part_catalog
+from purchase_records import normalize_shipment_date
+
+MAX_OPERATIONS = 1000
+
+TABLES = ('basic_info', 'parts_info')
+OPERATIONS = ('update', 'delete')
+
+# table -> updatable column -> whether it holds an integer
+COLUMNS = {
+    'basic_info': {
+        'page': False,
+        'shipment_date': False,
+        'order_number': False,
+        'delivery_number': False,
+        'person_in_charge': False,
+        'shipping_cost': True,
+        'total_amount': True,
+    },
+    'parts_info': {
+        'part_number': False,
+        'part_name': False,
+        'quantity': True,
+        'unit_price': True,
+        'sales_amount': True,
+    },
+}
+
+# table -> table written; part lines keep their number and name as a part_catalog label
+WRITE_TABLES = {'basic_info': 'basic_info', 'parts_info': 'part_lines'}
+LABEL_COLUMNS = ('part_number', 'part_name')
+
+# Ids are passed as one JSON array parameter so each statement stays set-based
+# whatever the batch size (no per-id loop, no variable-limit chunking).
+IDS = 'SELECT value FROM json_each(?)'
+
+
+def _prepare_operation(operation):
+    """Validate one operation; returns ``(prepared, errors)``."""
+    if not isinstance(operation, dict):
+        return None, ['操作がオブジェクト形式ではありません']
+
+    errors = []
+    op = operation.get('op')
+    table = operation.get('table')
+    row_id = operation.get('id')
+    if op not in OPERATIONS:
+        errors.append(f'opは {", ".join(OPERATIONS)} のいずれかを指定してください')
+    if table not in TABLES:
+        errors.append(f'tableは {", ".join(TABLES)} のいずれかを指定してください')
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        errors.append('idは整数で指定してください')
+    if errors or op == 'delete':
+        return (None if errors else {'op': op, 'table': table, 'id': row_id}), errors
+
+    data = operation.get('data')
+    if not isinstance(data, dict) or not data:
+        return None, ['更新する項目（data）を指定してください']
+
+    values = {}
+    for column, value in data.items():
+        if column not in COLUMNS[table]:
+            errors.append(f'{column}は更新できない項目です')
+        elif COLUMNS[table][column]:
+            try:
+                values[column] = int(value)
+            except (TypeError, ValueError):
+                errors.append(f'{column}が数値ではありません: {value!r}')
+        elif value is None:
+            errors.append(f'{column}が空です')
+        else:
+            values[column] = str(value)
+
+    if 'shipment_date' in values:
+        values['shipment_date_iso'] = normalize_shipment_date(values['shipment_date'])
+    return (None if errors else {'op': op, 'table': table, 'id': row_id, 'values': values}), errors
+
+
+def prepare_operations(data):
+    """Validate a whole batch; returns ``(operations, errors)`` in the shape of ``prepare_records``."""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return [], [{'index': None, 'errors': ['operationsは1件以上の配列で指定してください']}]
+    if len(operations) > MAX_OPERATIONS:
+        return [], [{'index': None, 'errors': [f'operationsは{MAX_OPERATIONS}件以内で指定してください']}]
+
+    prepared = []
+    errors = []
+    for index, operation in enumerate(operations):
+        converted, operation_errors = _prepare_operation(operation)
+        if operation_errors:
+            errors.append({'index': index, 'errors': operation_errors})
+        else:
+            prepared.append(converted)
+    return prepared, errors
+
+
+def _ids(rows):
+    return json.dumps(sorted(set(rows)))
+
+
+def _update(cursor, operation):
+    values = dict(operation['values'])
+    if any(column in values for column in LABEL_COLUMNS):
+        # A partial update keeps the other half of the stored label.
+        cursor.execute('SELECT part_number, part_name FROM parts_info WHERE id = ?', (operation['id'],))
+        stored = cursor.fetchone()
+        if stored is None:
+            return False
+        label = tuple(values.pop(column, value) for column, value in zip(LABEL_COLUMNS, stored))
+        values['label_id'] = part_catalog.intern(cursor, [label])[label]
+
+    assignments = ', '.join(f'{column} = ?' for column in values)
+    cursor.execute(
+        f"UPDATE {WRITE_TABLES[operation['table']]} SET {assignments} WHERE id = ?",
+        (*values.values(), operation['id'])
+    )
+    return cursor.rowcount > 0
+
+
+def _records_of_parts(cursor, part_ids):
+    cursor.execute(f'SELECT id, basic_info_id FROM part_lines WHERE id IN ({IDS})', (_ids(part_ids),))
+    return dict(cursor.fetchall())
+
+
+def _sessions_of_records(cursor, record_ids):
+    cursor.execute(f'''
+        SELECT DISTINCT import_session_id FROM basic_info
+        WHERE id IN ({IDS}) AND import_session_id IS NOT NULL
+    ''', (_ids(record_ids),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def delete_parts(cursor, part_ids):
+    """Delete part lines by id; returns the ids that existed."""
+    records = _records_of_parts(cursor, part_ids)
+    if records:
+        cursor.execute(f'DELETE FROM part_lines WHERE id IN ({IDS})', (_ids(records),))
+    return set(records)
+
+
+def delete_records(cursor, record_ids):
+    """Delete records and all their part lines; returns the ids that existed."""
+    cursor.execute(f'SELECT id FROM basic_info WHERE id IN ({IDS})', (_ids(record_ids),))
+    found = {row[0] for row in cursor.fetchall()}
+    if found:
+        ids = _ids(found)
+        cursor.execute(f'DELETE FROM part_lines WHERE basic_info_id IN ({IDS})', (ids,))
+        cursor.execute(f'DELETE FROM basic_info WHERE id IN ({IDS})', (ids,))
+    return found
+
+
+def apply_operations(cursor, operations):
+    """Apply prepared operations in the caller's transaction; returns one result per operation.
+
+    Each result is ``{'index', 'status'}`` with status ``updated``,
+    ``deleted``, ``not_found`` or ``conflict`` (with an ``error`` message).
+    """
+    part_ids = [op['id'] for op in operations if op['table'] == 'parts_info']
+    record_of_part = _records_of_parts(cursor, part_ids) if part_ids else {}
+    touched_records = {op['id'] for op in operations if op['table'] == 'basic_info'}
+    touched_records.update(record_of_part.values())
+    sessions = _sessions_of_records(cursor, touched_records) if touched_records else set()
+
+    results = [None] * len(operations)
+    for index, operation in enumerate(operations):
+        if operation['op'] != 'update':
+            continue
+        try:
+            found = _update(cursor, operation)
+        except sqlite3.IntegrityError:
+            # The failed statement is rolled back on its own; the batch carries on.
+            results[index] = {'index': index, 'status': 'conflict',
+                              'error': '同じ受注番号・ページ・出荷日のデータが既に登録されています'}
+            continue
+        results[index] = {'index': index, 'status': 'updated' if found else 'not_found'}
+
+    deleted = {
+        'parts_info': delete_parts(cursor, [op['id'] for op in operations
+                                            if op['op'] == 'delete' and op['table'] == 'parts_info']),
+        'basic_info': delete_records(cursor, [op['id'] for op in operations
+                                              if op['op'] == 'delete' and op['table'] == 'basic_info']),
+    }
+    for index, operation in enumerate(operations):
+        if operation['op'] == 'delete':
+            status = 'deleted' if operation['id'] in deleted[operation['table']] else 'not_found'
+            results[index] = {'index': index, 'status': status}
+
+    changed_records = set(record_of_part.values()) - deleted['basic_info']
+    if changed_records:
+        import_sessions.refresh_records(cursor, changed_records)
+    for session_id in sessions:
+        import_sessions.refresh_session(cursor, session_id)
+    return results
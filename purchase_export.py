@@ -0,0 +1,90 @@
+"""CSV export of saved purchases, one row per part line.
+
+The export takes the same filters as the list (``build_filters``) and is
+produced by a generator: rows are stepped out of a SQLite cursor a batch at a
+time, written to a small text buffer and yielded as UTF-8, so memory stays
+flat however many rows match. The file starts with a BOM and uses CRLF line
+ends so Excel opens it with the Japanese headers intact. When the client goes
+away the WSGI server closes the generator, which ends the read transaction
+and closes the connection instead of reading the rest of the table.
+"""
+import csv
+import io
+import logging
+
+import db
+import metrics
+from purchase_queries import build_filters
+
+logger = logging.getLogger(__name__)
+
+BOM = '\ufeff'
+BATCH_ROWS = 500
+
+# Same column names as the JSON import; records without parts get one row with empty part columns.
+HEADERS = ['ページ', '出荷日', '受注番号', '納入先番号', '担当者', '運賃', '税抜合計',
+           '部品番号', '部品名', '数量', '売上単価', '売上金額']
+
+# Text starting with these is run as a formula by spreadsheet applications
+# (OWASP CSV injection). Amounts are written as numbers and keep their sign.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_query(clauses, params):
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    sql = f'''
+        SELECT b.page, b.shipment_date, b.order_number, b.delivery_number, b.person_in_charge,
+               b.shipping_cost, b.total_amount,
+               l.part_number, l.part_name, p.quantity, p.unit_price, p.sales_amount
+        FROM basic_info b
+        LEFT JOIN part_lines p ON p.basic_info_id = b.id
+        LEFT JOIN part_labels l ON l.id = p.label_id
+        {where}
+        ORDER BY b.shipment_date_iso DESC, b.id DESC, p.id
+    '''
+    return sql, params
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(search='', person_in_charge='', date_from=None, date_to=None):
+    """Yield the export as encoded chunks; the connection lives as long as the generator."""
+    clauses, params = build_filters(search, person_in_charge, date_from, date_to)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = 0
+
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        # One snapshot for the whole file even if saves commit meanwhile.
+        cursor.execute('BEGIN')
+        cursor.execute(*export_query(clauses, params))
+
+        buffer.write(BOM)
+        writer.writerow(HEADERS)
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            writer.writerows([_cell(value) for value in row] for row in batch)
+            rows += len(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    except GeneratorExit:
+        logger.info('CSV export closed by the client', extra={'rows': rows})
+        raise
+    finally:
+        conn.rollback()
+        conn.close()
+        metrics.BATCH_SIZE.observe(rows, kind='csv_export_rows')
@@ -0,0 +1,213 @@
+"""Paginated, filtered reads of saved purchases for the list screen.
+
+Pages are fetched with keyset pagination: the cursor carries the sort value and
+id of the last row on the previous page, so every page is a bounded index range
+scan no matter how deep the user scrolls. Filters are written so they can be
+answered from indexes (prefix ranges instead of ``LIKE '%…%'``), and the
+unfiltered total is read from a trigger-maintained counter instead of a
+``COUNT(*)`` over the table.
+"""
+import base64
+import json
+
+from purchase_records import normalize_shipment_date
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# sort parameter -> column; every column is indexed and ties break on id
+SORT_COLUMNS = {
+    'shipment_date': 'shipment_date_iso',
+    'order_number': 'order_number',
+    'created_at': 'id',
+}
+
+# Upper bound for prefix ranges: sorts after any string starting with the prefix.
+PREFIX_SENTINEL = '\U0010ffff'
+
+LIST_COLUMNS = '''id, page, shipment_date, order_number, delivery_number, person_in_charge,
+               shipping_cost, total_amount, created_at'''
+
+
+class QueryError(ValueError):
+    """Invalid list parameters; the message is shown to the user."""
+
+
+def _row_to_dict(row):
+    return {
+        'id': row[0],
+        'ページ': row[1],
+        'shipment_date': row[2],
+        'order_number': row[3],
+        'delivery_number': row[4],
+        'person_in_charge': row[5],
+        'shipping_cost': row[6],
+        'total_amount': row[7],
+        'created_at': row[8]
+    }
+
+
+def encode_cursor(sort_value, record_id):
+    raw = json.dumps([sort_value, record_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return sort_value, int(record_id)
+    except (ValueError, TypeError):
+        raise QueryError('cursorの形式が正しくありません')
+
+
+def to_iso_date(value):
+    """Parse a date filter (``YYYY-MM-DD`` from date inputs, or ``YY/MM/DD``)."""
+    iso = normalize_shipment_date(value)
+    if not iso:
+        raise QueryError(f'日付の形式が正しくありません: {value}')
+    return iso
+
+
+def parse_list_args(args):
+    """Validate request args into the keyword arguments of ``list_purchases``."""
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+        page = int(args['page']) if args.get('page') else None
+    except ValueError:
+        raise QueryError('limitとpageは整数で指定してください')
+
+    sort = args.get('sort', 'shipment_date')
+    if sort not in SORT_COLUMNS:
+        raise QueryError(f'sortは {", ".join(SORT_COLUMNS)} のいずれかを指定してください')
+
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise QueryError('orderは asc または desc を指定してください')
+
+    cursor = args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+
+    return dict(
+        parse_filter_args(args),
+        limit=max(1, min(limit, MAX_LIMIT)),
+        page=page if page and page > 0 else None,
+        cursor=cursor,
+        sort=sort,
+        order=order,
+    )
+
+
+def parse_filter_args(args):
+    """Validate the filter args shared by the list and the export into ``build_filters`` arguments."""
+    return {
+        'search': (args.get('search') or '').strip(),
+        'person_in_charge': (args.get('person_in_charge') or '').strip(),
+        'date_from': to_iso_date(args['date_from']) if args.get('date_from') else None,
+        'date_to': to_iso_date(args['date_to']) if args.get('date_to') else None,
+    }
+
+
+def build_filters(search='', person_in_charge='', date_from=None, date_to=None):
+    """WHERE clauses and parameters shared by the list, count and export queries."""
+    clauses = []
+    params = []
+
+    if search:
+        # Prefix match on the identifying columns; each branch is an index range.
+        upper = search + PREFIX_SENTINEL
+        clauses.append('''(
+            (order_number >= ? AND order_number < ?)
+            OR (delivery_number >= ? AND delivery_number < ?)
+            OR (person_in_charge >= ? AND person_in_charge < ?)
+        )''')
+        params.extend([search, upper] * 3)
+
+    if person_in_charge:
+        clauses.append('person_in_charge = ?')
+        params.append(person_in_charge)
+
+    if date_from:
+        clauses.append('shipment_date_iso >= ?')
+        params.append(date_from)
+
+    if date_to:
+        clauses.append('shipment_date_iso <= ?')
+        params.append(date_to)
+
+    return clauses, params
+
+
+def count_purchases(cursor, clauses, params):
+    if not clauses:
+        cursor.execute("SELECT row_count FROM row_counts WHERE table_name = 'basic_info'")
+        row = cursor.fetchone()
+        if row is not None:
+            return row[0]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor.execute(f'SELECT COUNT(*) FROM basic_info {where}', params)
+    return cursor.fetchone()[0]
+
+
+def page_query(clauses, params, limit=DEFAULT_LIMIT, page=None, cursor=None, sort='shipment_date', order='desc'):
+    """SQL and parameters for one page of the list; fetches ``limit + 1`` rows."""
+    column = SORT_COLUMNS[sort]
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    comparison = '<' if order == 'desc' else '>'
+
+    page_clauses = list(clauses)
+    page_params = list(params)
+    offset = 0
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        page_clauses.append(f'({column}, id) {comparison} (?, ?)')
+        page_params.extend([sort_value, last_id])
+    elif page:
+        offset = (page - 1) * limit
+
+    # The sort key is selected last so the next cursor can be built from the row.
+    where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ''
+    sql = f'''
+        SELECT {LIST_COLUMNS}, {column}
+        FROM basic_info
+        {where}
+        ORDER BY {column} {direction}, id {direction}
+        LIMIT ? OFFSET ?
+    '''
+    return sql, page_params + [limit + 1, offset]
+
+
+def list_purchases(conn, limit=DEFAULT_LIMIT, page=None, cursor=None, sort='shipment_date', order='desc',
+                   search='', person_in_charge='', date_from=None, date_to=None):
+    """Return one page of purchases plus pagination metadata.
+
+    ``cursor`` (from a previous page's ``next_cursor``) is the fast path;
+    ``page`` is accepted for compatibility and falls back to OFFSET.
+    """
+    clauses, params = build_filters(search, person_in_charge, date_from, date_to)
+    db_cursor = conn.cursor()
+    total = count_purchases(db_cursor, clauses, params)
+
+    db_cursor.execute(*page_query(clauses, params, limit, page, cursor, sort, order))
+    rows = db_cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [_row_to_dict(row) for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][0])
+
+    return {
+        'items': items,
+        'pagination': {
+            'total_items': total,
+            'items_per_page': limit,
+            'total_pages': (total + limit - 1) // limit,
+            'current_page': page if page and not cursor else None,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+    }
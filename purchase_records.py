@@ -0,0 +1,279 @@
+"""Validation and bulk writes for imported purchase records.
+
+``/api/save_data`` receives the staged records in their Japanese-keyed import
+shape. ``prepare_records`` validates and converts the whole payload up front,
+collecting every problem per record, and ``save_records`` then upserts them
+inside one transaction: records are matched on their natural key (order
+number, page, shipment date), new ones are written with two ``executemany``
+calls, changed ones are rewritten in place and identical ones are left alone,
+so saving the same scans twice does not duplicate anything.
+"""
+import re
+from datetime import date
+
+import import_sessions
+import part_catalog
+
+BASIC_TEXT_FIELDS = ('出荷日', '受注番号', '納入先番号', '担当者')
+BASIC_INT_FIELDS = ('運賃', '税抜合計')
+PART_FIELDS = ('部品番号', '部品名', '数量', '売上単価', '売上金額')
+PART_INT_FIELDS = ('数量', '売上単価', '売上金額')
+
+SHIPMENT_DATE_PATTERN = re.compile(r'(\d{2}|\d{4})[-/.](\d{1,2})[-/.](\d{1,2})')
+
+# The natural key as indexed by idx_basic_info_natural_key. The date is the
+# ISO form when it could be parsed, so '25/08/01' and '2025-08-01' match.
+NATURAL_KEY_SQL = "order_number, COALESCE(page, ''), COALESCE(NULLIF(shipment_date_iso, ''), shipment_date)"
+NATURAL_KEY_MATCH = (
+    "order_number = ? AND COALESCE(page, '') = ? "
+    "AND COALESCE(NULLIF(shipment_date_iso, ''), shipment_date) = ?"
+)
+
+
+def normalize_shipment_date(value):
+    """Return ``YYYY-MM-DD`` for a ``YY/MM/DD`` (or ISO) date, '' if unparseable.
+
+    ``shipment_date`` keeps the text as extracted; this sortable form is what
+    ``shipment_date_iso`` stores for range filters and ordering.
+    """
+    match = SHIPMENT_DATE_PATTERN.fullmatch(str(value or '').strip())
+    if not match:
+        return ''
+    year, month, day = match.groups()
+    try:
+        return date(int(year) + 2000 if len(year) == 2 else int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return ''
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        value = value.replace(',', '').strip()
+    return int(value)
+
+
+def _int_column(field, values, count, errors):
+    """Convert the first ``count`` values, falling back per item only on failure."""
+    try:
+        return list(map(int, values[:count]))
+    except (TypeError, ValueError):
+        pass
+
+    converted = []
+    for i, value in enumerate(values[:count]):
+        try:
+            converted.append(_to_int(value))
+        except (TypeError, ValueError):
+            errors.append(f'{i + 1}行目の{field}が数値ではありません: {value!r}')
+    return converted
+
+
+def prepare_record(record):
+    """Convert one import record; returns ``(prepared, errors)``."""
+    errors = []
+    if not isinstance(record, dict):
+        return None, ['レコードがオブジェクト形式ではありません']
+
+    for field in BASIC_TEXT_FIELDS:
+        if field not in record or record[field] is None:
+            errors.append(f'{field}がありません')
+
+    amounts = {}
+    for field in BASIC_INT_FIELDS:
+        try:
+            amounts[field] = _to_int(record[field])
+        except KeyError:
+            errors.append(f'{field}がありません')
+        except (TypeError, ValueError):
+            errors.append(f'{field}が数値ではありません: {record[field]!r}')
+
+    columns = {}
+    for field in PART_FIELDS:
+        value = record.get(field, [])
+        if not isinstance(value, list):
+            errors.append(f'{field}が配列ではありません')
+            value = []
+        columns[field] = value
+
+    parts_count = len(columns['部品番号'])
+    short_fields = [field for field in PART_FIELDS[1:] if len(columns[field]) < parts_count]
+    for field in short_fields:
+        errors.append(f'{field}の件数が部品番号の件数（{parts_count}）より少ないです')
+
+    parts = []
+    if not short_fields:
+        int_columns = [_int_column(field, columns[field], parts_count, errors) for field in PART_INT_FIELDS]
+        parts = list(zip(columns['部品番号'], columns['部品名'][:parts_count], *int_columns))
+
+    if errors:
+        return None, errors
+
+    page = record.get('ページ')
+    return {
+        'page': '' if page is None else str(page),
+        'shipment_date': record['出荷日'],
+        'shipment_date_iso': normalize_shipment_date(record['出荷日']),
+        'order_number': str(record['受注番号']),
+        'delivery_number': record['納入先番号'],
+        'person_in_charge': record['担当者'],
+        'shipping_cost': amounts['運賃'],
+        'total_amount': amounts['税抜合計'],
+        'parts_total': sum(part[4] for part in parts),
+        'parts': parts
+    }, None
+
+
+def prepare_records(data):
+    """Validate a whole payload; returns ``(prepared, errors)``.
+
+    ``errors`` holds one ``{'index', 'errors'}`` entry per invalid record and
+    ``prepared`` is only meaningful when it is empty.
+    """
+    if not isinstance(data, list):
+        return [], [{'index': None, 'errors': ['データは配列形式である必要があります']}]
+
+    prepared = []
+    errors = []
+    for index, record in enumerate(data):
+        converted, record_errors = prepare_record(record)
+        if record_errors:
+            errors.append({'index': index, 'errors': record_errors})
+        else:
+            prepared.append(converted)
+    return prepared, errors
+
+
+def _next_basic_info_id(cursor):
+    # AUTOINCREMENT hands out max(sqlite_sequence.seq, MAX(id)) + 1; ids are
+    # assigned explicitly so parts can reference them without lastrowid.
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'basic_info'")
+    row = cursor.fetchone()
+    seq = row[0] if row else 0
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM basic_info')
+    return max(seq, cursor.fetchone()[0]) + 1
+
+
+def natural_key(record):
+    """The ``NATURAL_KEY_SQL`` values of a prepared record."""
+    return (record['order_number'], record['page'], record['shipment_date_iso'] or str(record['shipment_date']))
+
+
+def _comparable(record):
+    """A prepared record's stored fields and parts, in the form SQLite returns them."""
+    fields = (str(record['shipment_date']), str(record['delivery_number']), str(record['person_in_charge']),
+              record['shipping_cost'], record['total_amount'])
+    parts = [(str(number), str(name), quantity, price, sales)
+             for number, name, quantity, price, sales in record['parts']]
+    return fields, parts
+
+
+def _stored_record(cursor, key):
+    """The stored row for a key as ``(id, session_id, fields, parts)``, or None."""
+    cursor.execute(f'''
+        SELECT id, import_session_id, shipment_date, delivery_number, person_in_charge,
+               shipping_cost, total_amount
+        FROM basic_info
+        WHERE {NATURAL_KEY_MATCH}
+    ''', key)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    cursor.execute('''
+        SELECT part_number, part_name, quantity, unit_price, sales_amount
+        FROM parts_info
+        WHERE basic_info_id = ?
+        ORDER BY id
+    ''', (row[0],))
+    return row[0], row[1], tuple(row[2:]), cursor.fetchall()
+
+
+def save_records(conn, prepared, session_id):
+    """Upsert prepared records in one IMMEDIATE transaction under a new session.
+
+    Returns ``{'ids', 'inserted', 'updated', 'unchanged', 'parts'}``. A key given twice
+    in one payload keeps its last record, and ``ids`` follows the order in
+    which the distinct keys first appear. Every matched record moves to the
+    new session so the basic info screen shows the whole save; changed ones
+    get their fields and parts rewritten. The caller owns the commit so
+    other writes can share the transaction.
+    """
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute('BEGIN IMMEDIATE')
+
+    records = list({natural_key(r): r for r in prepared}.values())
+    ids = [None] * len(records)
+    new = []
+    changed = []
+    unchanged = 0
+    old_sessions = set()
+    for position, record in enumerate(records):
+        stored = _stored_record(cursor, natural_key(record))
+        if stored is None:
+            new.append(position)
+            continue
+        record_id, old_session, fields, parts = stored
+        ids[position] = record_id
+        old_sessions.add(old_session)
+        if (fields, parts) == _comparable(record):
+            unchanged += 1
+        else:
+            changed.append(position)
+
+    import_sessions.create_session(cursor, session_id)
+
+    first_id = _next_basic_info_id(cursor)
+    for offset, position in enumerate(new):
+        ids[position] = first_id + offset
+
+    cursor.executemany('''
+        INSERT INTO basic_info
+        (id, page, shipment_date, shipment_date_iso, order_number, delivery_number, person_in_charge,
+         shipping_cost, total_amount, parts_total, import_session_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        (ids[i], r['page'], r['shipment_date'], r['shipment_date_iso'], r['order_number'], r['delivery_number'],
+         r['person_in_charge'], r['shipping_cost'], r['total_amount'], r['parts_total'], session_id)
+        for i, r in ((i, records[i]) for i in new)
+    ))
+
+    cursor.executemany('''
+        UPDATE basic_info
+        SET shipment_date = ?, shipment_date_iso = ?, delivery_number = ?, person_in_charge = ?,
+            shipping_cost = ?, total_amount = ?, parts_total = ?
+        WHERE id = ?
+    ''', (
+        (r['shipment_date'], r['shipment_date_iso'], r['delivery_number'], r['person_in_charge'],
+         r['shipping_cost'], r['total_amount'], r['parts_total'], ids[i])
+        for i, r in ((i, records[i]) for i in changed)
+    ))
+    cursor.executemany('DELETE FROM part_lines WHERE basic_info_id = ?', ((ids[i],) for i in changed))
+
+    written = sorted(new + changed)
+    labels = part_catalog.intern(cursor, [part[:2] for i in written for part in records[i]['parts']])
+    cursor.executemany('''
+        INSERT INTO part_lines
+        (basic_info_id, label_id, quantity, unit_price, sales_amount)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (ids[i], labels.get(part[:2])) + part[2:]
+        for i in written
+        for part in records[i]['parts']
+    ))
+
+    inserted_ids = {ids[i] for i in new}
+    cursor.executemany(
+        'UPDATE basic_info SET import_session_id = ? WHERE id = ?',
+        ((session_id, record_id) for record_id in ids if record_id not in inserted_ids)
+    )
+    for old_session in old_sessions - {session_id}:
+        import_sessions.refresh_session(cursor, old_session)
+    import_sessions.refresh_session(cursor, session_id)
+
+    return {
+        'ids': ids,
+        'inserted': len(new),
+        'updated': len(changed),
+        'unchanged': unchanged,
+        'parts': sum(len(r['parts']) for r in records)
+    }
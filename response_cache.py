@@ -0,0 +1,139 @@
+"""Conditional GET and a response cache for the read APIs.
+
+Every write route bumps a single counter in ``data_version`` inside its own
+transaction. A read API wrapped in ``cached_json`` reads that counter first,
+in the same read transaction as its queries, and:
+
+- answers ``304`` without running the view when ``If-None-Match`` carries the
+  ETag for (endpoint, arguments, version);
+- otherwise serves the serialized body cached for the same key and version,
+  or runs the view and caches its ``200`` body.
+
+The ETag depends only on the key and the counter, so every worker process
+hands out the same tag for the same data. The body cache is per process and
+is dropped as a whole when the counter moves (``RESPONSE_CACHE_*``).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+import metrics
+from config import ResponseCacheConfig
+from db import get_db
+
+
+def bump(cursor):
+    """Invalidate cached responses and ETags; call inside the writing transaction."""
+    cursor.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+
+
+def current_version(cursor):
+    cursor.execute('SELECT version FROM data_version WHERE id = 1')
+    return cursor.fetchone()[0]
+
+
+class _BodyCache:
+    """LRU of serialized bodies, all belonging to one data version."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                return None
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, version, body):
+        if len(body) > ResponseCacheConfig.MAX_BYTES:
+            return
+        with self._lock:
+            if version != self._version:
+                if self._version is not None and version < self._version:
+                    return
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while (len(self._entries) > ResponseCacheConfig.MAX_ENTRIES
+                   or self._bytes > ResponseCacheConfig.MAX_BYTES):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+_bodies = _BodyCache()
+
+
+def _request_key(view_args):
+    return (
+        request.endpoint,
+        tuple(sorted(view_args.items())),
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+
+def _etag(key, version):
+    digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+
+def _json_response(body, etag):
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Always revalidate; an unchanged list then costs one counter lookup.
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_json(view):
+    """Serve a read-only JSON view with an ETag, a 304 path and the body cache."""
+    @wraps(view)
+    def wrapper(**view_args):
+        if not ResponseCacheConfig.ENABLED:
+            return view(**view_args)
+
+        conn = get_db()
+        # One read transaction, so the counter and the view's queries see the same snapshot.
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+        try:
+            version = current_version(conn.cursor())
+            key = _request_key(view_args)
+            etag = _etag(key, version)
+
+            if request.if_none_match.contains(etag):
+                metrics.RESPONSE_CACHE_LOOKUPS.inc(endpoint=request.endpoint, result='not_modified')
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.cache_control.no_cache = True
+                return response
+
+            body = _bodies.get(key, version)
+            if body is not None:
+                metrics.RESPONSE_CACHE_LOOKUPS.inc(endpoint=request.endpoint, result='hit')
+                return _json_response(body, etag)
+
+            metrics.RESPONSE_CACHE_LOOKUPS.inc(endpoint=request.endpoint, result='miss')
+            response = make_response(view(**view_args))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            _bodies.put(key, version, body)
+            return _json_response(body, etag)
+        finally:
+            conn.rollback()
+
+    return wrapper
@@ -0,0 +1,242 @@
+"""Monthly reporting rollups kept up to date by triggers.
+
+``rollup_monthly`` holds, per shipment month, the record count and the
+shipping / 税抜合計 / parts totals for every 担当者 and every 納入先番号;
+``rollup_part_monthly`` holds line count, quantity and sales per part number.
+Triggers on ``basic_info`` and ``part_lines`` (created by migrations 008 and
+012) apply each insert, update and delete as a delta in the writing statement's own transaction, so saves, edits,
+deletes and the dedup tool keep the rollups exact without any route having to
+remember them. The summary endpoints read only these tables, so their cost
+depends on the months and keys asked for, not on how much history is stored.
+
+Records whose shipment date could not be parsed are counted under month ``''``.
+Run directly to rebuild the tables from scratch, or to only compare them:
+
+    python rollups.py --check
+    python rollups.py --database backup.db
+"""
+import argparse
+import re
+
+from purchase_queries import QueryError
+
+# Dimension name -> basic_info column; also the accepted ``dimension`` values.
+RECORD_DIMENSIONS = {
+    'person_in_charge': 'person_in_charge',
+    'delivery_number': 'delivery_number',
+}
+DIMENSIONS = ('month',) + tuple(RECORD_DIMENSIONS) + ('part_number',)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+MONTH_PATTERN = re.compile(r'\d{4}-\d{2}')
+
+
+def _month(row):
+    return f"COALESCE(substr({row}.shipment_date_iso, 1, 7), '')"
+
+
+def _aggregate_records_sql():
+    return '\nUNION ALL\n'.join(f'''
+        SELECT '{name}', {_month('basic_info')}, COALESCE({column}, ''), COUNT(*),
+               SUM(shipping_cost), SUM(total_amount), SUM(COALESCE(parts_total, 0))
+        FROM basic_info
+        GROUP BY 2, 3''' for name, column in RECORD_DIMENSIONS.items())
+
+
+_AGGREGATE_PARTS_SQL = f'''
+    SELECT COALESCE({_month('b')}, ''), p.part_number, COUNT(*), SUM(p.quantity), SUM(p.sales_amount)
+    FROM parts_info p
+    LEFT JOIN basic_info b ON b.id = p.basic_info_id
+    GROUP BY 1, 2
+'''
+
+
+def rebuild(cursor):
+    """Recompute both rollup tables from ``basic_info`` / ``parts_info``."""
+    cursor.execute('DELETE FROM rollup_monthly')
+    cursor.execute(f'''
+        INSERT INTO rollup_monthly
+        (dimension, month, key, record_count, shipping_total, amount_total, parts_total)
+        {_aggregate_records_sql()}
+    ''')
+    cursor.execute('DELETE FROM rollup_part_monthly')
+    cursor.execute(f'''
+        INSERT INTO rollup_part_monthly (month, part_number, line_count, quantity_total, sales_total)
+        {_AGGREGATE_PARTS_SQL}
+    ''')
+
+
+def differences(cursor):
+    """Rows where the stored rollups disagree with a fresh aggregation (empty when consistent)."""
+    cursor.execute(f'''
+        SELECT 'rollup_monthly', * FROM (
+            SELECT * FROM ({_aggregate_records_sql()})
+            EXCEPT SELECT * FROM rollup_monthly
+        )
+        UNION ALL
+        SELECT 'rollup_monthly', * FROM (
+            SELECT * FROM rollup_monthly
+            EXCEPT SELECT * FROM ({_aggregate_records_sql()})
+        )
+    ''')
+    rows = cursor.fetchall()
+    cursor.execute(f'''
+        SELECT 'rollup_part_monthly', * FROM (
+            SELECT * FROM ({_AGGREGATE_PARTS_SQL}) EXCEPT SELECT * FROM rollup_part_monthly
+        )
+        UNION ALL
+        SELECT 'rollup_part_monthly', * FROM (
+            SELECT * FROM rollup_part_monthly EXCEPT SELECT * FROM ({_AGGREGATE_PARTS_SQL})
+        )
+    ''')
+    return rows + cursor.fetchall()
+
+
+def _to_month(value):
+    value = value.strip()
+    if MONTH_PATTERN.fullmatch(value):
+        return value
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', value):
+        return value[:7]
+    raise QueryError(f'月の形式が正しくありません（YYYY-MM）: {value}')
+
+
+def parse_summary_args(dimension, args):
+    """Validate the summary request into the keyword arguments of ``summary``."""
+    if dimension not in DIMENSIONS:
+        raise QueryError(f'集計軸は {", ".join(DIMENSIONS)} のいずれかを指定してください')
+
+    group = args.get('group', 'month')
+    if group not in ('month', 'total'):
+        raise QueryError('groupは month または total を指定してください')
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('limitは整数で指定してください')
+
+    return {
+        'dimension': dimension,
+        'group': group,
+        'month_from': _to_month(args['from']) if args.get('from') else None,
+        'month_to': _to_month(args['to']) if args.get('to') else None,
+        'key': (args.get('key') or '').strip(),
+        'limit': max(1, min(limit, MAX_LIMIT)),
+    }
+
+
+def _month_filters(month_from, month_to):
+    clauses = []
+    params = []
+    if month_from:
+        clauses.append('month >= ?')
+        params.append(month_from)
+    if month_to:
+        clauses.append('month <= ?')
+        params.append(month_to)
+    return clauses, params
+
+
+def summary_query(dimension, group='month', month_from=None, month_to=None, key='', limit=DEFAULT_LIMIT):
+    """SQL, parameters and field names for one summary request.
+
+    ``month`` rows are the sum of the 担当者 rollup, which has exactly one row
+    per record, and ignore ``group`` and ``key``. Rows come newest month
+    first, then by amount descending; with ``group='total'`` the month
+    column is empty and every key is summed over the whole range.
+    """
+    clauses, params = _month_filters(month_from, month_to)
+    month_column = 'month' if group == 'month' else "''"
+
+    if dimension == 'part_number':
+        if key:
+            clauses.append('part_number = ?')
+            params.append(key)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = f'''
+            SELECT {month_column}, part_number, SUM(line_count), SUM(quantity_total), SUM(sales_total)
+            FROM rollup_part_monthly
+            {where}
+            GROUP BY 1, 2
+            ORDER BY 1 DESC, 5 DESC, 2
+            LIMIT ?
+        '''
+        fields = ('month', 'part_number', 'line_count', 'quantity_total', 'sales_total')
+    elif dimension == 'month':
+        sql = f'''
+            SELECT month, SUM(record_count), SUM(shipping_total), SUM(amount_total), SUM(parts_total)
+            FROM rollup_monthly
+            WHERE {' AND '.join(["dimension = 'person_in_charge'"] + clauses)}
+            GROUP BY month
+            ORDER BY month DESC
+            LIMIT ?
+        '''
+        fields = ('month', 'record_count', 'shipping_total', 'amount_total', 'parts_total')
+    else:
+        clauses.insert(0, 'dimension = ?')
+        params.insert(0, dimension)
+        if key:
+            clauses.append('key = ?')
+            params.append(key)
+        sql = f'''
+            SELECT {month_column}, key, SUM(record_count), SUM(shipping_total), SUM(amount_total), SUM(parts_total)
+            FROM rollup_monthly
+            WHERE {' AND '.join(clauses)}
+            GROUP BY 1, 2
+            ORDER BY 1 DESC, 5 DESC, 2
+            LIMIT ?
+        '''
+        fields = ('month', dimension, 'record_count', 'shipping_total', 'amount_total', 'parts_total')
+
+    return sql, params + [limit], fields
+
+
+def summary(cursor, dimension, group='month', **options):
+    """Run ``summary_query`` and return its rows as dicts (no ``month`` key for totals)."""
+    sql, params, fields = summary_query(dimension, group, **options)
+    cursor.execute(sql, params)
+    rows = [dict(zip(fields, row)) for row in cursor.fetchall()]
+    if group == 'total' and dimension != 'month':
+        for row in rows:
+            del row['month']
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='集計テーブル（月別の担当者・納入先・部品）を basic_info / parts_info から作り直します。')
+    parser.add_argument('--database', help='対象のDBファイル（省略時は DATABASE_PATH）')
+    parser.add_argument('--check', action='store_true', help='作り直さずに差分を表示するだけ')
+    args = parser.parse_args()
+
+    if args.database:
+        from config import DatabaseConfig
+        DatabaseConfig.PATH = args.database
+    import db
+    import response_cache
+
+    conn = db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        diff = differences(cursor)
+        for row in diff:
+            print(' '.join(str(value) for value in row))
+
+        if args.check:
+            conn.rollback()
+            print(f'差分 {len(diff)}行（--check のため作り直していません）')
+            return
+
+        rebuild(cursor)
+        if diff:
+            response_cache.bump(cursor)
+        conn.commit()
+        print(f'集計テーブルを作り直しました（差分 {len(diff)}行）')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
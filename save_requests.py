@@ -0,0 +1,41 @@
+"""Idempotency keys for ``/api/save_data``.
+
+A client may send an ``Idempotency-Key`` header with a save. The response of
+the first save under a key is stored in ``save_requests`` in the same
+transaction as the records, and a retry with the same key and payload gets
+that response back without writing anything again. Reusing a key for a
+different payload is refused. Keys expire after
+``SaveDataConfig.IDEMPOTENCY_TTL_HOURS``; expired ones are pruned whenever a
+new key is stored.
+"""
+import hashlib
+import json
+
+from config import SaveDataConfig
+
+MAX_KEY_LENGTH = 255
+
+
+def payload_hash(data):
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def find(cursor, key):
+    """Return ``(payload_hash, response)`` stored for a live key, or None."""
+    cursor.execute('''
+        SELECT payload_hash, response FROM save_requests
+        WHERE idempotency_key = ? AND created_at >= datetime('now', ?)
+    ''', (key, f'-{SaveDataConfig.IDEMPOTENCY_TTL_HOURS} hours'))
+    row = cursor.fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+def record(cursor, key, digest, response):
+    cursor.execute('''
+        DELETE FROM save_requests WHERE created_at < datetime('now', ?)
+    ''', (f'-{SaveDataConfig.IDEMPOTENCY_TTL_HOURS} hours',))
+    cursor.execute('''
+        INSERT OR REPLACE INTO save_requests (idempotency_key, payload_hash, response)
+        VALUES (?, ?, ?)
+    ''', (key, digest, json.dumps(response, ensure_ascii=False)))
@@ -58,13 +58,8 @@ onDOMReady(() => {
 
 
 
-    let pending = null;
-    try {
-        const raw = localStorage.getItem('pendingImport');
-        pending = raw ? JSON.parse(raw) : null;
-    } catch (e) {
-        pending = null;
-    }
+    // 未保存データ（PendingStore のエントリ { id, record } の配列、取込順）
+    let pending = [];
 
     function enableSave(enabled) {
         if (saveBtn) saveBtn.disabled = !enabled;
@@ -75,103 +70,132 @@ onDOMReady(() => {
         return val;
     }
 
+    // 失敗した保存を同じ選択で再送するときは同じキーを使い、二重保存を防ぐ
+    let saveAttempt = null;
+
+    function idempotencyKey(ids) {
+        const selection = ids.join(',');
+        if (!saveAttempt || saveAttempt.selection !== selection) {
+            const key = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+            saveAttempt = { selection, key };
+        }
+        return saveAttempt.key;
+    }
+
+    function savedMessage(result) {
+        const counts = `新規${result.inserted_count}件・更新${result.updated_count}件・変更なし${result.unchanged_count}件`;
+        return pending.length > 0
+            ? `選択したデータを保存しました（${counts}）`
+            : `選択したデータを保存しました（${counts}、全件保存済み）`;
+    }
+
+    // 画面外の行はDOMにないので、選択状態は行番号の集合で持つ
+    let selected = new Set();
+    let table = null;
+
+    function rowView(row) {
+        const shippingCost = parseNumber(getVal(row, ['運賃','shipping_cost','shippingCost']));
+        const saRaw = row['売上金額'] || row['sales_amounts'] || row['salesAmounts'];
+        const qtRaw = row['数量'] || row['quantities'] || row['quantities'];
+        const upRaw = row['売上単価'] || row['unit_prices'] || row['unitPrices'];
+        let partsTotal = 0;
+        if (Array.isArray(saRaw) && saRaw.length > 0) {
+            partsTotal = saRaw.reduce((s, v) => s + parseNumber(v), 0);
+        } else if ((Array.isArray(qtRaw) && qtRaw.length > 0) || (Array.isArray(upRaw) && upRaw.length > 0)) {
+            const L = Math.max(Array.isArray(qtRaw) ? qtRaw.length : 0, Array.isArray(upRaw) ? upRaw.length : 0);
+            for (let i = 0; i < L; i++) {
+                const q = Array.isArray(qtRaw) ? parseNumber(qtRaw[i]) : 0;
+                const p = Array.isArray(upRaw) ? parseNumber(upRaw[i]) : 0;
+                partsTotal += q * p;
+            }
+        } else {
+            partsTotal = parseNumber(getVal(row, ['部品合計','parts_total','partsTotal']));
+        }
+        const totalRaw = parseNumber(getVal(row, ['税抜合計','total_amount','totalAmount']));
+        let total;
+        if (Array.isArray(saRaw) || Array.isArray(qtRaw) || Array.isArray(upRaw)) {
+            total = partsTotal + shippingCost;
+        } else {
+            total = totalRaw || (partsTotal + shippingCost);
+        }
+        return {
+            page: getVal(row, ['ページ','page','pageNumber']),
+            shipmentDate: getVal(row, ['出荷日','shipment_date','shipmentDate']),
+            orderNumber: getVal(row, ['受注番号','order_number','orderNumber']),
+            deliveryNo: getVal(row, ['納入先番号','delivery_number','deliveryNumber']),
+            person: getVal(row, ['担当者','person_in_charge','personInCharge']),
+            shippingCost,
+            partsTotal,
+            total
+        };
+    }
+
+    function renderCells(entry, idx) {
+        const v = rowView(entry.record);
+        return `
+            <td>
+                <input type="checkbox" class="row-checkbox" data-index="${idx}" ${selected.has(idx) ? 'checked' : ''}>
+            </td>
+            <td>${v.page}</td>
+            <td>${formatDate(v.shipmentDate)}</td>
+            <td>${v.orderNumber}</td>
+            <td>${v.deliveryNo}</td>
+            <td>${v.person}</td>
+            <td>${formatCurrency(v.shippingCost)}</td>
+            <td>${formatCurrency(v.partsTotal)}</td>
+            <td>${formatCurrency(v.total)}</td>
+            <td>
+                <a href="/parts_info/pending?id=${entry.id}" class="btn btn-info">部品詳細</a>
+            </td>
+            <td>
+                <button class="btn btn-warning" data-action="edit" data-index="${idx}">編集</button>
+                <button class="btn btn-danger" data-action="delete" data-index="${idx}">削除</button>
+            </td>
+        `;
+    }
+
     function renderTable(data) {
         if (!Array.isArray(data) || data.length === 0) {
+            if (table) {
+                table.destroy();
+                table = null;
+            }
             tableContainer.innerHTML = '<div class="empty-state">保存対象のデータがありません。</div>';
             return;
         }
-        let html = `
-            <table>
-                <thead>
-                    <tr>
-                        <th>
-                            <input type="checkbox" id="masterCheckbox" class="master-checkbox" aria-label="全選択/全解除">
-                            <label for="masterCheckbox">選択</label>
-                        </th>
-                        <th>ページ</th>
-                        <th>出荷日</th>
-                        <th>受注番号</th>
-                        <th>納入先番号</th>
-                        <th>担当者</th>
-                        <th>運賃</th>
-                        <th>部品合計</th>
-                        <th>税抜合計</th>
-                        <th>部品詳細</th>
-                        <th>操作</th>
-                    </tr>
-                </thead>
-                <tbody>
-        `;
-        data.forEach((row, idx) => {
-            const page = getVal(row, ['ページ','page','pageNumber']);
-            const shipmentDate = getVal(row, ['出荷日','shipment_date','shipmentDate']);
-            const orderNumber  = getVal(row, ['受注番号','order_number','orderNumber']);
-            const deliveryNo   = getVal(row, ['納入先番号','delivery_number','deliveryNumber']);
-            const person       = getVal(row, ['担当者','person_in_charge','personInCharge']);
-            const shippingCost = parseNumber(getVal(row, ['運賃','shipping_cost','shippingCost']));
-            const saRaw = row['売上金額'] || row['sales_amounts'] || row['salesAmounts'];
-            const qtRaw = row['数量'] || row['quantities'] || row['quantities'];
-            const upRaw = row['売上単価'] || row['unit_prices'] || row['unitPrices'];
-            let partsTotal = 0;
-            if (Array.isArray(saRaw) && saRaw.length > 0) {
-                partsTotal = saRaw.reduce((s, v) => s + parseNumber(v), 0);
-            } else if ((Array.isArray(qtRaw) && qtRaw.length > 0) || (Array.isArray(upRaw) && upRaw.length > 0)) {
-                const L = Math.max(Array.isArray(qtRaw) ? qtRaw.length : 0, Array.isArray(upRaw) ? upRaw.length : 0);
-                for (let i = 0; i < L; i++) {
-                    const q = Array.isArray(qtRaw) ? parseNumber(qtRaw[i]) : 0;
-                    const p = Array.isArray(upRaw) ? parseNumber(upRaw[i]) : 0;
-                    partsTotal += q * p;
-                }
-            } else {
-                partsTotal = parseNumber(getVal(row, ['部品合計','parts_total','partsTotal']));
-            }
-            const totalRaw = parseNumber(getVal(row, ['税抜合計','total_amount','totalAmount']));
-            let total;
-            if (Array.isArray(saRaw) || Array.isArray(qtRaw) || Array.isArray(upRaw)) {
-                total = partsTotal + shippingCost;
-            } else {
-                total = totalRaw || (partsTotal + shippingCost);
-            }
-            html += `
-                <tr data-mode="pending" data-index="${idx}">
-                    <td>
-                        <input type="checkbox" class="row-checkbox" data-index="${idx}">
-                    </td>
-                    <td>${page}</td>
-                    <td>${formatDate(shipmentDate)}</td>
-                    <td>${orderNumber}</td>
-                    <td>${deliveryNo}</td>
-                    <td>${person}</td>
-                    <td>${formatCurrency(shippingCost)}</td>
-                    <td>${formatCurrency(partsTotal)}</td>
-                    <td>${formatCurrency(total)}</td>
-                    <td>
-                        <a href="/parts_info/pending?index=${idx}" class="btn btn-info">部品詳細</a>
-                    </td>
-                    <td>
-                        <button class="btn btn-warning" data-action="edit" data-index="${idx}">編集</button>
-                        <button class="btn btn-danger" data-action="delete" data-index="${idx}">削除</button>
-                    </td>
-                </tr>
-            `;
-        });
-        html += `
-                </tbody>
-            </table>
-        `;
-        tableContainer.innerHTML = html;
+        if (!table) {
+            table = new VirtualTable(tableContainer, {
+                columns: [
+                    {
+                        label: `<input type="checkbox" id="masterCheckbox" class="master-checkbox" aria-label="全選択/全解除">
+                                <label for="masterCheckbox">選択</label>`,
+                        width: '80px'
+                    },
+                    'ページ', '出荷日', '受注番号', '納入先番号', '担当者', '運賃', '部品合計', '税抜合計',
+                    { label: '部品詳細', width: '120px' },
+                    { label: '操作', width: '170px' }
+                ],
+                rowHeight: 56,
+                renderCells: renderCells,
+                rowAttributes: (row, idx) => `data-mode="pending" data-index="${idx}"`,
+            });
+        }
+        table.setData(data);
+        updateMasterCheckbox();
     }
 
-    function loadPendingAndRender() {
-        let data = [];
+    async function loadPendingAndRender() {
         try {
-            const raw = localStorage.getItem('pendingImport');
-            data = raw ? JSON.parse(raw) : [];
+            pending = await PendingStore.getAll();
         } catch (e) {
-            data = [];
+            console.error('Staging store error:', e);
+            tableContainer.innerHTML = `<div class="empty-state">未保存データの読み込みに失敗しました: ${e.message || e}</div>`;
+            enableSave(false);
+            return;
         }
-        pending = data;
-        enableSave(Array.isArray(pending) && pending.length > 0);
+        enableSave(pending.length > 0);
         renderTable(pending);
     }
 
@@ -181,16 +205,14 @@ onDOMReady(() => {
                 showMessage('保存対象のデータがありません', 'warning');
                 return;
             }
-            const checked = Array.from(document.querySelectorAll('input.row-checkbox[type="checkbox"]:checked'))
-                .map(cb => parseInt(cb.dataset.index, 10))
-                .filter(i => !isNaN(i));
+            const checked = Array.from(selected).sort((a, b) => a - b);
 
             if (checked.length === 0) {
                 showMessage('保存するデータを選択してください', 'warning');
                 return;
             }
 
-            const toSave = checked.map(i => pending[i]).filter(Boolean);
+            const toSave = checked.map(i => pending[i]).filter(Boolean).map(entry => entry.record);
             const payload = toSave.map(item => mapToJapaneseRecord(item));
             console.log('Saving payload:', payload);
 
@@ -198,30 +220,43 @@ onDOMReady(() => {
                 showMessage('データを保存中...', 'info');
                 const result = await apiCall('/api/save_data', {
                     method: 'POST',
+                    headers: { 'Idempotency-Key': idempotencyKey(checked.map(i => pending[i].id)) },
                     body: JSON.stringify(payload)
                 });
                 if (result && result.success) {
+                    saveAttempt = null;
+                    const saved = new Set(checked);
                     const keep = [];
-                    pending.forEach((item, i) => {
-                        if (!checked.includes(i)) keep.push(item);
+                    pending.forEach((entry, i) => {
+                        if (!saved.has(i)) keep.push(entry);
                     });
-                    pending = keep;
-                    if (pending.length > 0) {
-                        try { localStorage.setItem('pendingImport', JSON.stringify(pending)); } catch (e) {}
-                        showMessage('選択したデータを保存しました', 'success');
-                        renderTable(pending);
-                        enableSave(true);
-                    } else {
-                        localStorage.removeItem('pendingImport');
-                        showMessage('選択したデータを保存しました（全件保存済み）', 'success');
-                        tableContainer.innerHTML = '<div class="empty-state">保存対象のデータがありません。</div>';
-                        enableSave(false);
+                    // 保存済みの行だけを未保存データから消す
+                    try {
+                        await PendingStore.remove(checked.map(i => pending[i].id));
+                    } catch (err) {
+                        console.error('Staging store error:', err);
+                        showMessage(`保存しましたが、未保存データから削除できませんでした: ${err.message || err}`, 'warning');
+                        return;
                     }
+                    pending = keep;
+                    selected = new Set();
+                    renderTable(pending);
+                    enableSave(pending.length > 0);
+                    showMessage(savedMessage(result), 'success');
                 } else {
                     showMessage((result && result.error) || 'データの保存に失敗しました', 'error');
                 }
             } catch (error) {
-                const msg = (error && error.message) ? `データの保存中にエラーが発生しました: ${error.message}` : 'データの保存中にエラーが発生しました';
+                let msg = (error && error.message) ? `データの保存中にエラーが発生しました: ${error.message}` : 'データの保存中にエラーが発生しました';
+                const recordErrors = error && error.data && Array.isArray(error.data.errors) ? error.data.errors : [];
+                if (recordErrors.length > 0) {
+                    // errors[].index は送信した payload 内の位置なので、画面の行番号に戻して表示する
+                    const details = recordErrors.slice(0, 5).map(e => {
+                        const row = (e.index !== null && checked[e.index] !== undefined) ? `${checked[e.index] + 1}行目` : '全体';
+                        return `${row}: ${e.errors.join('、')}`;
+                    });
+                    msg += ` (${details.join(' / ')})`;
+                }
                 showMessage(msg, 'error');
                 console.error('Save selected error:', error);
             }
@@ -241,24 +276,26 @@ onDOMReady(() => {
 
         if (action === 'delete') {
             if (!confirm('この行を削除しますか？（未保存データ）')) return;
-            const next = [];
-            pending.forEach((item, i) => { if (i !== index) next.push(item); });
-            pending = next;
-            if (pending.length > 0) {
-                try { localStorage.setItem('pendingImport', JSON.stringify(pending)); } catch (e) {}
-                renderTable(pending);
-                enableSave(true);
-            } else {
-                localStorage.removeItem('pendingImport');
-                tableContainer.innerHTML = '<div class="empty-state">保存対象のデータがありません。</div>';
-                enableSave(false);
+            try {
+                await PendingStore.remove([pending[index].id]);
+            } catch (err) {
+                console.error('Staging store error:', err);
+                showMessage(`未保存データの削除に失敗しました: ${err.message || err}`, 'error');
+                return;
             }
+            pending.splice(index, 1);
+            // 削除した行より後ろの選択は1つ前にずらす
+            selected = new Set(Array.from(selected)
+                .filter(i => i !== index)
+                .map(i => (i > index ? i - 1 : i)));
+            renderTable(pending);
+            enableSave(pending.length > 0);
             showMessage('未保存データの行を削除しました', 'success');
             return;
         }
 
         if (action === 'edit') {
-            const row = pending[index];
+            const row = pending[index].record;
             const modal = document.createElement('div');
             modal.className = 'modal show';
             modal.innerHTML = `
@@ -321,7 +358,7 @@ onDOMReady(() => {
             });
 
             const saveEl = modal.querySelector('[data-save]');
-            saveEl.addEventListener('click', () => {
+            saveEl.addEventListener('click', async () => {
                 const form = modal.querySelector('#editFormPending');
                 const fd = new FormData(form);
                 const updated = {
@@ -342,9 +379,16 @@ onDOMReady(() => {
                     部品合計: Number(fd.get('parts_total') || 0),
                     税抜合計: Number(fd.get('total_amount') || 0),
                 };
-                pending[index] = Object.assign({}, pending[index], updated);
-                try { localStorage.setItem('pendingImport', JSON.stringify(pending)); } catch (e) {}
-                renderTable(pending);
+                const entry = pending[index];
+                const record = Object.assign({}, entry.record, updated);
+                try {
+                    await PendingStore.put(entry.id, record);
+                } catch (err) {
+                    console.error('Staging store error:', err);
+                    showMessage(`未保存データの更新に失敗しました: ${err.message || err}`, 'error');
+                    return;
+                }
+                table.updateRow(index, { id: entry.id, record });
                 close();
                 showMessage('未保存データを更新しました', 'success');
             });
@@ -354,8 +398,8 @@ onDOMReady(() => {
     }, true);
 
     function updateMasterCheckbox() {
-        const rowCheckboxes = document.querySelectorAll('.row-checkbox');
-        const checkedCount = document.querySelectorAll('.row-checkbox:checked').length;
+        const total = Array.isArray(pending) ? pending.length : 0;
+        const checkedCount = selected.size;
         const masterCheckbox = document.getElementById('masterCheckbox');
         
         if (!masterCheckbox) return;
@@ -363,7 +407,7 @@ onDOMReady(() => {
         if (checkedCount === 0) {
             masterCheckbox.checked = false;
             masterCheckbox.indeterminate = false;
-        } else if (checkedCount === rowCheckboxes.length) {
+        } else if (checkedCount === total) {
             masterCheckbox.checked = true;
             masterCheckbox.indeterminate = false;
         } else {
@@ -376,15 +420,13 @@ onDOMReady(() => {
     }
     
     function toggleAllCheckboxes(checked) {
-        const rowCheckboxes = document.querySelectorAll('.row-checkbox');
-        rowCheckboxes.forEach(checkbox => {
-            checkbox.checked = checked;
-        });
+        selected = checked && Array.isArray(pending) ? new Set(pending.map((_, i) => i)) : new Set();
+        if (table) table.refresh();
         updateMasterCheckbox();
     }
     
     function updateSelectedCount() {
-        const checkedCount = document.querySelectorAll('.row-checkbox:checked').length;
+        const checkedCount = selected.size;
         const selectedCountElement = document.getElementById('selectedCount');
         if (selectedCountElement) {
             selectedCountElement.textContent = `${checkedCount}件選択中`;
@@ -393,9 +435,8 @@ onDOMReady(() => {
     }
     
     function updateSaveButtonState() {
-        const checkedCount = document.querySelectorAll('.row-checkbox:checked').length;
         if (saveBtn) {
-            saveBtn.disabled = checkedCount === 0;
+            saveBtn.disabled = selected.size === 0;
         }
     }
     
@@ -403,9 +444,21 @@ onDOMReady(() => {
         if (e.target.id === 'masterCheckbox') {
             toggleAllCheckboxes(e.target.checked);
         } else if (e.target.classList.contains('row-checkbox')) {
+            const index = parseInt(e.target.dataset.index, 10);
+            if (isNaN(index)) return;
+            if (e.target.checked) {
+                selected.add(index);
+            } else {
+                selected.delete(index);
+            }
             updateMasterCheckbox();
         }
     });
 
+    // 部品詳細から「戻る」で戻ったときはキャッシュされた画面ではなく最新の内容を出す
+    window.addEventListener('pageshow', (e) => {
+        if (e.persisted) loadPendingAndRender();
+    });
+
     loadPendingAndRender();
 });
@@ -10,6 +10,15 @@ onDOMReady(() => {
     
     let currentData = null;
     
+    const ACTIVE_JOB_KEY = 'activeImportJob';
+    // 取込ジョブで最後に受け取ったイベントの番号（再読込後はその続きから受け取る）
+    const ACTIVE_JOB_SEQ_KEY = 'activeImportJobSeq';
+    // 取込ジョブのレコードで取込データを置き換え始めたか（それまでは前回の未保存の取込データを残す）
+    const ACTIVE_JOB_STAGED_KEY = 'activeImportJobStaged';
+    const CLIENT_ID_KEY = 'importClientId';
+    const previewContainer = document.getElementById('importPreview');
+    let previewTable = null;
+    
     // ファイル名表示関連の要素
     const selectedFilesSection = document.getElementById('selectedFilesSection');
     const selectedFilesList = document.getElementById('selectedFilesList');
@@ -70,40 +79,191 @@ onDOMReady(() => {
         for (let i = 0; i < files.length; i++) {
             formData.append('files', files[i]);
         }
+        formData.append('client_id', clientId());
         
+        const submitBtn = difyUploadForm.querySelector('button[type="submit"]');
         try {
-            const submitBtn = difyUploadForm.querySelector('button[type="submit"]');
             submitBtn.disabled = true;
-            submitBtn.textContent = `Difyで分析中... (${files.length}ファイル)`;
+            submitBtn.textContent = `Difyで分析中... (0/${files.length})`;
             showMessage(`${files.length}個のファイルをDifyで分析中...`, 'info');
             
-            const response = await fetch('/api/dify/fetch-data-multiple', {
+            const response = await fetch('/api/import_jobs', {
                 method: 'POST',
                 body: formData
             });
             
             const result = await response.json();
             
-            if (response.ok && result.success) {
-                currentData = result.data;
-                try {
-                    localStorage.setItem('pendingImport', JSON.stringify(result.data));
-                } catch (e) {}
-                window.location.href = '/basic_info';
-            } else {
-                const errorMessage = result.error || result.errors?.join('; ') || 'Difyからのデータ取得に失敗しました';
-                showMessage(errorMessage, 'error');
+            if (!response.ok || !result.success) {
+                showMessage(result.error || 'Difyからのデータ取得に失敗しました', 'error');
+                resetDifySubmit();
+                return;
             }
+            
+            try {
+                localStorage.setItem(ACTIVE_JOB_KEY, result.job_id);
+                localStorage.setItem(ACTIVE_JOB_SEQ_KEY, '0');
+                localStorage.removeItem(ACTIVE_JOB_STAGED_KEY);
+            } catch (e) {}
+            resetPreview([]);
+            followImportJob(result.job_id, 0, files.length);
         } catch (error) {
             showMessage('Difyからのデータ取得中にエラーが発生しました', 'error');
             console.error('Dify fetch error:', error);
-        }finally {
-            const submitBtn = difyUploadForm.querySelector('button[type="submit"]');
-            submitBtn.disabled = false;
-            submitBtn.textContent = 'Difyでデータ分析';
+            resetDifySubmit();
         }
     });
     
+    // このブラウザのID。同時に取り込む人どうしで順番にDifyへ送るためにサーバーへ渡す
+    function clientId() {
+        let id = localStorage.getItem(CLIENT_ID_KEY);
+        if (!id) {
+            id = window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            try {
+                localStorage.setItem(CLIENT_ID_KEY, id);
+            } catch (e) {}
+        }
+        return id;
+    }
+    
+    function resetDifySubmit() {
+        const submitBtn = difyUploadForm.querySelector('button[type="submit"]');
+        submitBtn.disabled = false;
+        submitBtn.textContent = 'Difyでデータ分析';
+    }
+    
+    function forgetActiveJob() {
+        localStorage.removeItem(ACTIVE_JOB_KEY);
+        localStorage.removeItem(ACTIVE_JOB_SEQ_KEY);
+        localStorage.removeItem(ACTIVE_JOB_STAGED_KEY);
+    }
+    
+    function resetPreview(records) {
+        if (previewTable) {
+            previewTable.destroy();
+            previewTable = null;
+        }
+        previewContainer.style.display = 'block';
+        previewTable = new VirtualTable(previewContainer, {
+            columns: ['ページ', '出荷日', '受注番号', '納入先番号', '担当者', '税抜合計'],
+            renderCells: record => `
+                <td>${record['ページ'] || ''}</td>
+                <td>${formatDate(record['出荷日'])}</td>
+                <td>${record['受注番号']}</td>
+                <td>${record['納入先番号']}</td>
+                <td>${record['担当者']}</td>
+                <td>${formatCurrency(record['税抜合計'])}</td>
+            `,
+            data: records,
+            maxHeight: '40vh',
+        });
+    }
+    
+    // 取込ジョブの進捗をサーバー送信イベントで受け取り、解析が終わったファイルの
+    // レコードからプレビューと取込データに追加していく。接続が切れても
+    // EventSource が最後に受け取ったイベント番号から自動的に再接続する。
+    // 前回の未保存の取込データは、最初のレコードが届くまで置き換えない
+    function followImportJob(jobId, lastSeq, fileCount) {
+        const submitBtn = difyUploadForm.querySelector('button[type="submit"]');
+        submitBtn.disabled = true;
+        submitBtn.textContent = `Difyで分析中... (${lastSeq}/${fileCount || '?'})`;
+        
+        const query = lastSeq ? `?last_event_id=${lastSeq}` : '';
+        const source = new EventSource(`/api/import_jobs/${jobId}/events${query}`);
+        // 取込データへの追加が終わってから番号を記録するよう、イベントは順番に処理する
+        let queue = Promise.resolve();
+        
+        source.addEventListener('file', (e) => {
+            const file = JSON.parse(e.data);
+            queue = queue.then(async () => {
+                if (file.records.length > 0) {
+                    if (localStorage.getItem(ACTIVE_JOB_STAGED_KEY)) {
+                        await PendingStore.append(file.records);
+                    } else {
+                        await PendingStore.replaceAll(file.records);
+                        localStorage.setItem(ACTIVE_JOB_STAGED_KEY, '1');
+                    }
+                    if (previewTable) previewTable.append(file.records);
+                }
+                localStorage.setItem(ACTIVE_JOB_SEQ_KEY, e.lastEventId);
+                submitBtn.textContent = `Difyで分析中... (${file.finished_count}/${file.file_count})`;
+                showMessage(`Difyで分析中... ${file.finished_count}/${file.file_count}ファイル完了`, 'info');
+            }).catch(error => {
+                source.close();
+                console.error('Staging store error:', error);
+                showMessage(`取込データを保存できませんでした: ${error.message || error}`, 'error');
+                resetDifySubmit();
+            });
+        });
+        
+        source.addEventListener('done', () => {
+            source.close();
+            queue = queue.then(() => finishImportJob(jobId));
+        });
+        
+        source.onerror = () => {
+            // CONNECTING のときはブラウザが再接続する。CLOSED はジョブが見つからない場合など
+            if (source.readyState === EventSource.CLOSED) {
+                forgetActiveJob();
+                showMessage('取込ジョブの進捗を取得できませんでした', 'error');
+                resetDifySubmit();
+            }
+        };
+    }
+    
+    // 全ファイル完了後はファイル順に並んだ結果で取込データを置き換え、基本情報画面へ遷移する
+    async function finishImportJob(jobId) {
+        let job;
+        try {
+            const response = await fetch(`/api/import_jobs/${jobId}`);
+            job = await response.json();
+            if (!response.ok) {
+                forgetActiveJob();
+                showMessage(job.error || '取込ジョブの取得に失敗しました', 'error');
+                resetDifySubmit();
+                return;
+            }
+        } catch (error) {
+            console.error('Import job fetch error:', error);
+            showMessage('取込ジョブの取得に失敗しました', 'error');
+            resetDifySubmit();
+            return;
+        }
+        
+        forgetActiveJob();
+        
+        if (job.status === 'completed') {
+            currentData = job.data;
+            try {
+                await PendingStore.replaceAll(job.data);
+            } catch (e) {
+                console.error('Staging store error:', e);
+                showMessage(`取込データを保存できませんでした: ${e.message || e}`, 'error');
+                resetDifySubmit();
+                return;
+            }
+            if (job.errors.length > 0) {
+                alert(`${job.processed_count}/${job.total_count}ファイルを取り込みました。\n${job.errors.join('\n')}`);
+            }
+            window.location.href = '/basic_info';
+        } else {
+            showMessage(`すべてのファイルの処理に失敗しました。エラー: ${job.errors.join('; ')}`, 'error');
+            resetDifySubmit();
+        }
+    }
+    
+    // ページ再読込時も実行中のジョブがあれば、受け取り済みの続きから進捗の受信を再開する
+    const activeJobId = localStorage.getItem(ACTIVE_JOB_KEY);
+    if (activeJobId) {
+        showMessage('実行中の取込ジョブの進捗を確認しています...', 'info');
+        const lastSeq = parseInt(localStorage.getItem(ACTIVE_JOB_SEQ_KEY) || '0', 10) || 0;
+        const staged = localStorage.getItem(ACTIVE_JOB_STAGED_KEY) ? PendingStore.getAll() : Promise.resolve([]);
+        staged
+            .then(entries => resetPreview(entries.map(entry => entry.record)))
+            .catch(error => console.error('Staging store error:', error))
+            .finally(() => followImportJob(activeJobId, lastSeq, null));
+    }
+    
     fileInput.addEventListener('change', (e) => {
         const file = e.target.files[0];
         if (file) {
@@ -138,8 +298,12 @@ onDOMReady(() => {
             if (result.success) {
                 currentData = result.data;
                 try {
-                    localStorage.setItem('pendingImport', JSON.stringify(result.data));
-                } catch (e) {}
+                    await PendingStore.replaceAll(result.data);
+                } catch (e) {
+                    console.error('Staging store error:', e);
+                    showMessage(`取込データを保存できませんでした: ${e.message || e}`, 'error');
+                    return;
+                }
                 window.location.href = '/basic_info';
             } else {
                 showMessage(result.error || 'ファイルの読み込みに失敗しました', 'error');
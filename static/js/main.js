@@ -35,11 +35,11 @@ function formatCurrency(amount) {
 async function apiCall(url, options = {}) {
     try {
         const response = await fetch(url, {
+            ...options,
             headers: {
                 'Content-Type': 'application/json',
                 ...options.headers
-            },
-            ...options
+            }
         });
 
         let data = null;
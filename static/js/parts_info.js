@@ -1,5 +1,6 @@
 onDOMReady(() => {
     const tableContainer = document.getElementById('partsInfoTable');
+    let table = null;
     
     loadPartsInfo();
     
@@ -22,60 +23,56 @@ onDOMReady(() => {
     }
     
     function displayPartsInfo(data) {
-        const totalSalesAmount = data.reduce((sum, part) => sum + part.sales_amount, 0);
-        
-        let html = `
+        tableContainer.innerHTML = `
             <div class="parts-summary">
-                <p><strong>売上金額合計:</strong> ${formatCurrency(totalSalesAmount)}</p>
+                <p><strong>売上金額合計:</strong> <span id="partsSalesTotal"></span></p>
             </div>
-            <table>
-                <thead>
-                    <tr>
-                        <th>部品番号</th>
-                        <th>部品名</th>
-                        <th>数量</th>
-                        <th>売上単価</th>
-                        <th>売上金額</th>
-                    </tr>
-                </thead>
-                <tbody>
+            <div id="partsInfoRows"></div>
         `;
         
-        data.forEach(part => {
-            html += `
-                <tr>
-                    <td>${part.part_number}</td>
-                    <td>${part.part_name}</td>
-                    <td>${part.quantity}</td>
-                    <td>${formatCurrency(part.unit_price)}</td>
-                    <td>${formatCurrency(part.sales_amount)}</td>
-                </tr>
-            `;
+        table = new VirtualTable(document.getElementById('partsInfoRows'), {
+            columns: ['部品番号', '部品名', '数量', '売上単価', '売上金額', { label: '操作', width: '170px' }],
+            rowHeight: 56,
+            renderCells: part => `
+                <td>${part.part_number}</td>
+                <td>${part.part_name}</td>
+                <td>${part.quantity}</td>
+                <td>${formatCurrency(part.unit_price)}</td>
+                <td>${formatCurrency(part.sales_amount)}</td>
+                <td>
+                    <button class="btn btn-warning" onclick="editPart(${part.id})">編集</button>
+                    <button class="btn btn-danger" onclick="deletePart(${part.id})">削除</button>
+                </td>
+            `,
+            data: data,
         });
-        
-        html += `
-                </tbody>
-            </table>
-        `;
-        
-        tableContainer.innerHTML = html;
+        updateSummary();
     }
     
-    window.editPart = async function(id) {
-        try {
-            const data = await apiCall(`/api/parts_info/${basicId}`);
-            const part = data.find(p => p.id === id);
-            
-            if (!part) {
-                showMessage('部品情報が見つかりません', 'error');
-                return;
-            }
-            
-            showEditModal(part);
-        } catch (error) {
-            showMessage('部品情報の取得に失敗しました', 'error');
-            console.error('Edit error:', error);
+    function updateSummary() {
+        const total = table.data.reduce((sum, part) => sum + part.sales_amount, 0);
+        document.getElementById('partsSalesTotal').textContent = formatCurrency(total);
+    }
+    
+    function findPartIndex(id) {
+        return table ? table.data.findIndex(p => p.id === id) : -1;
+    }
+    
+    function notifyPartsUpdated() {
+        localStorage.setItem('partsUpdated', JSON.stringify({
+            basicInfoId: basicId,
+            timestamp: Date.now()
+        }));
+    }
+    
+    window.editPart = function(id) {
+        const index = findPartIndex(id);
+        if (index === -1) {
+            showMessage('部品情報が見つかりません', 'error');
+            return;
         }
+        
+        showEditModal(table.data[index]);
     };
     
     window.deletePart = async function(id) {
@@ -90,12 +87,18 @@ onDOMReady(() => {
             
             if (result.success) {
                 showMessage('部品情報を削除しました', 'success');
-                loadPartsInfo(); // Reload the table
                 
-                localStorage.setItem('partsUpdated', JSON.stringify({
-                    basicInfoId: basicId,
-                    timestamp: Date.now()
-                }));
+                const index = findPartIndex(id);
+                if (index !== -1) table.removeRow(index);
+                if (table.length === 0) {
+                    table.destroy();
+                    table = null;
+                    tableContainer.innerHTML = '<div class="empty-state">部品情報がありません</div>';
+                } else {
+                    updateSummary();
+                }
+                
+                notifyPartsUpdated();
             } else {
                 showMessage(result.error || '削除に失敗しました', 'error');
             }
@@ -191,12 +194,21 @@ onDOMReady(() => {
             if (result.success) {
                 showMessage('部品情報を更新しました', 'success');
                 closeModal();
-                loadPartsInfo(); // Reload the table
                 
-                localStorage.setItem('partsUpdated', JSON.stringify({
-                    basicInfoId: basicId,
-                    timestamp: Date.now()
-                }));
+                // 保存した内容でこの行だけを差し替える
+                const index = findPartIndex(id);
+                if (index !== -1) {
+                    table.updateRow(index, Object.assign({}, table.data[index], {
+                        part_number: data.part_number,
+                        part_name: data.part_name,
+                        quantity: parseInt(data.quantity, 10),
+                        unit_price: parseInt(data.unit_price, 10),
+                        sales_amount: parseInt(data.sales_amount, 10)
+                    }));
+                    updateSummary();
+                }
+                
+                notifyPartsUpdated();
             } else {
                 showMessage(result.error || '更新に失敗しました', 'error');
             }
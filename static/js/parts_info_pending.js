@@ -17,21 +17,23 @@ onDOMReady(() => {
         const n = Number(s);
         return isNaN(n) ? 0 : n;
     }
-    function loadPendingAll() {
+    // 部品配列を書き戻し、このレコードだけを保存する
+    async function saveParts(id, rec, pn, pm, qt, up, sa) {
+        const next = Object.assign({}, rec, { 部品番号: pn, 部品名: pm, 数量: qt, 売上単価: up, 売上金額: sa });
         try {
-            const raw = localStorage.getItem('pendingImport');
-            return raw ? JSON.parse(raw) : [];
-        } catch (_) {
-            return [];
+            await PendingStore.put(id, next);
+            Object.assign(rec, next);
+            return true;
+        } catch (e) {
+            console.error('Staging store error:', e);
+            showMessage(`未保存データの更新に失敗しました: ${e.message || e}`, 'error');
+            return false;
         }
     }
-    function savePendingAll(data) {
-        try {
-            localStorage.setItem('pendingImport', JSON.stringify(data));
-        } catch (_) {}
-    }
 
-    function render(rec, idx) {
+    let table = null;
+
+    function partRows(rec) {
         const partNumbers = arr(rec['部品番号'] || rec['part_numbers'] || rec['partNumbers']);
         const partNames   = arr(rec['部品名']   || rec['part_names']   || rec['partNames']);
         const quantities  = arr(rec['数量']     || rec['quantities']   || rec['quantities']);
@@ -41,70 +43,60 @@ onDOMReady(() => {
         const rows = [];
         const L = Math.max(partNumbers.length, partNames.length, quantities.length, unitPrices.length, salesAmts.length);
         for (let i = 0; i < L; i++) {
-            const qty = parseNumber(quantities[i]);
-            const price = parseNumber(unitPrices[i]);
-            const amt = salesAmts[i] != null ? parseNumber(salesAmts[i]) : (qty * price);
-            rows.push({
-                no: partNumbers[i] || '',
-                name: partNames[i] || '',
-                qty,
-                price,
-                amt
-            });
+            rows.push(partRow(partNumbers[i], partNames[i], quantities[i], unitPrices[i], salesAmts[i]));
         }
-        const total = rows.reduce((s, r) => s + (r.amt != null ? r.amt : (r.qty * r.price)), 0);
+        return rows;
+    }
+
+    function partRow(no, name, qtyRaw, priceRaw, amtRaw) {
+        const qty = parseNumber(qtyRaw);
+        const price = parseNumber(priceRaw);
+        const amt = amtRaw != null ? parseNumber(amtRaw) : (qty * price);
+        return { no: no || '', name: name || '', qty, price, amt };
+    }
+
+    function updateSummary() {
+        const total = table.data.reduce((s, r) => s + (r.amt != null ? r.amt : (r.qty * r.price)), 0);
+        document.getElementById('pendingPartsTotal').textContent = formatCurrency(total);
+    }
 
-        let html = `
+    function render(rec, id) {
+        container.innerHTML = `
             <div class="parts-summary">
-                <p><strong>売上金額合計:</strong> ${formatCurrency(total)}</p>
+                <p><strong>売上金額合計:</strong> <span id="pendingPartsTotal"></span></p>
             </div>
-            <table>
-                <thead>
-                    <tr>
-                        <th>部品番号</th>
-                        <th>部品名</th>
-                        <th>数量</th>
-                        <th>売上単価</th>
-                        <th>売上金額</th>
-                        <th>操作</th>
-                    </tr>
-                </thead>
-                <tbody>
+            <div id="pendingPartsRows"></div>
         `;
-        rows.forEach((p, i) => {
-            const amt = p.amt != null ? p.amt : (p.qty * p.price);
-            html += `
-                <tr data-i="${i}">
-                    <td>${p.no}</td>
-                    <td>${p.name}</td>
-                    <td>${p.qty}</td>
-                    <td>${formatCurrency(p.price)}</td>
-                    <td>${formatCurrency(amt)}</td>
-                    <td>
-                        <button class="btn btn-warning" data-action="edit" data-index="${i}">編集</button>
-                        <button class="btn btn-danger" data-action="delete" data-index="${i}">削除</button>
-                    </td>
-                </tr>
-            `;
+        table = new VirtualTable(document.getElementById('pendingPartsRows'), {
+            columns: ['部品番号', '部品名', '数量', '売上単価', '売上金額', { label: '操作', width: '170px' }],
+            rowHeight: 56,
+            renderCells: (p, i) => `
+                <td>${p.no}</td>
+                <td>${p.name}</td>
+                <td>${p.qty}</td>
+                <td>${formatCurrency(p.price)}</td>
+                <td>${formatCurrency(p.amt != null ? p.amt : (p.qty * p.price))}</td>
+                <td>
+                    <button class="btn btn-warning" data-action="edit" data-index="${i}">編集</button>
+                    <button class="btn btn-danger" data-action="delete" data-index="${i}">削除</button>
+                </td>
+            `,
+            data: partRows(rec),
         });
-        html += `</tbody></table>`;
-        container.innerHTML = html;
+        updateSummary();
 
-        container.onclick = (e) => {
+        container.onclick = async (e) => {
             const btn = e.target.closest('[data-action]');
             if (!btn || !container.contains(btn)) return;
             const action = btn.dataset.action;
             const i = Number(btn.dataset.index);
             if (Number.isNaN(i)) return;
 
-            const all = loadPendingAll();
-            if (!Array.isArray(all) || !all[idx]) return;
-
-            const pn = arr(all[idx]['部品番号'] || all[idx]['part_numbers'] || all[idx]['partNumbers']);
-            const pm = arr(all[idx]['部品名']   || all[idx]['part_names']   || all[idx]['partNames']);
-            const qt = arr(all[idx]['数量']     || all[idx]['quantities']   || all[idx]['quantities']);
-            const up = arr(all[idx]['売上単価'] || all[idx]['unit_prices']  || all[idx]['unitPrices']);
-            const sa = arr(all[idx]['売上金額'] || all[idx]['sales_amounts']|| all[idx]['salesAmounts']);
+            const pn = arr(rec['部品番号'] || rec['part_numbers'] || rec['partNumbers']);
+            const pm = arr(rec['部品名']   || rec['part_names']   || rec['partNames']);
+            const qt = arr(rec['数量']     || rec['quantities']   || rec['quantities']);
+            const up = arr(rec['売上単価'] || rec['unit_prices']  || rec['unitPrices']);
+            const sa = arr(rec['売上金額'] || rec['sales_amounts']|| rec['salesAmounts']);
 
             if (action === 'delete') {
                 if (!confirm('この部品情報を削除しますか？')) return;
@@ -113,13 +105,9 @@ onDOMReady(() => {
                 qt.splice(i, 1);
                 up.splice(i, 1);
                 sa.splice(i, 1);
-                all[idx]['部品番号'] = pn;
-                all[idx]['部品名'] = pm;
-                all[idx]['数量'] = qt;
-                all[idx]['売上単価'] = up;
-                all[idx]['売上金額'] = sa;
-                savePendingAll(all);
-                render(all[idx], idx);
+                if (!await saveParts(id, rec, pn, pm, qt, up, sa)) return;
+                table.removeRow(i);
+                updateSummary();
                 showMessage('部品情報を削除しました（未保存）', 'success');
                 return;
             }
@@ -169,7 +157,7 @@ onDOMReady(() => {
                 qtyInput.addEventListener('input', recalc);
                 priceInput.addEventListener('input', recalc);
 
-                modal.querySelector('[data-save]').addEventListener('click', () => {
+                modal.querySelector('[data-save]').addEventListener('click', async () => {
                     const fd = new FormData(form);
                     const no = fd.get('no') || '';
                     const name = fd.get('name') || '';
@@ -182,28 +170,34 @@ onDOMReady(() => {
                     qt[i] = qty;
                     up[i] = price;
                     sa[i] = amt;
-
-                    all[idx]['部品番号'] = pn;
-                    all[idx]['部品名'] = pm;
-                    all[idx]['数量'] = qt;
-                    all[idx]['売上単価'] = up;
-                    all[idx]['売上金額'] = sa;
-                    savePendingAll(all);
+                    if (!await saveParts(id, rec, pn, pm, qt, up, sa)) return;
 
                     close();
-                    render(all[idx], idx);
+                    table.updateRow(i, partRow(no, name, qty, price, amt));
+                    updateSummary();
                     showMessage('部品情報を更新しました（未保存）', 'success');
                 });
             }
         };
     }
 
-    const indexStr = getParam('index');
-    const index = Number(indexStr);
-    const all = loadPendingAll();
-    if (Number.isNaN(index) || !Array.isArray(all) || !all[index]) {
-        container.innerHTML = '<div class="empty-state">未保存データが見つかりません</div>';
-        return;
+    // 表示するレコード1件だけを読む
+    async function load() {
+        const id = Number(getParam('id'));
+        let rec;
+        try {
+            rec = Number.isInteger(id) ? await PendingStore.get(id) : undefined;
+        } catch (e) {
+            console.error('Staging store error:', e);
+            container.innerHTML = `<div class="empty-state">未保存データの読み込みに失敗しました: ${e.message || e}</div>`;
+            return;
+        }
+        if (!rec) {
+            container.innerHTML = '<div class="empty-state">未保存データが見つかりません</div>';
+            return;
+        }
+        render(rec, id);
     }
-    render(all[index], index);
+
+    load();
 });
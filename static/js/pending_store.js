@@ -0,0 +1,124 @@
+// 未保存の取込データ（保存前の仕入データ）の置き場所
+// IndexedDB に1レコード1オブジェクトで保存し、編集・削除・一部保存は該当
+// レコードだけを書き換える。以前の localStorage['pendingImport'] にデータが
+// 残っていれば、最初に開いたときに一度だけ移し替えてから削除する。
+//
+// 各エントリは { id, record } で、id は取込順に採番される（一覧の並び順）。
+// 失敗（容量超過など）は Promise の reject で返すので、呼び出し側で表示する。
+const PendingStore = (() => {
+    const DB_NAME = 'purchase-staging';
+    const DB_VERSION = 1;
+    const STORE = 'pendingRecords';
+    const LEGACY_KEY = 'pendingImport';
+
+    let opening = null;
+
+    function done(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error || new Error('IndexedDB transaction aborted'));
+        });
+    }
+
+    // スキーマの変更は oldVersion ごとに段階的に適用する
+    function upgrade(db, oldVersion) {
+        if (oldVersion < 1) {
+            db.createObjectStore(STORE, { keyPath: 'id', autoIncrement: true });
+        }
+    }
+
+    async function migrateLegacy(db) {
+        let records;
+        try {
+            const raw = localStorage.getItem(LEGACY_KEY);
+            if (raw === null) return;
+            records = JSON.parse(raw);
+        } catch (e) {
+            console.error('Legacy pendingImport could not be read:', e);
+            return;
+        }
+        if (Array.isArray(records) && records.length > 0) {
+            const tx = db.transaction(STORE, 'readwrite');
+            const store = tx.objectStore(STORE);
+            store.clear();
+            records.forEach(record => store.add({ record }));
+            await done(tx);
+        }
+        // 書き込みが完了してから消す（途中で失敗しても元データは残る）
+        localStorage.removeItem(LEGACY_KEY);
+    }
+
+    function open() {
+        if (!opening) {
+            opening = new Promise((resolve, reject) => {
+                if (!window.indexedDB) {
+                    reject(new Error('このブラウザではIndexedDBが利用できません'));
+                    return;
+                }
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = (e) => upgrade(request.result, e.oldVersion);
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            }).then(async (db) => {
+                // 別タブで新しいバージョンに上げられたら閉じて開き直させる
+                db.onversionchange = () => {
+                    db.close();
+                    opening = null;
+                };
+                await migrateLegacy(db);
+                return db;
+            });
+            opening.catch(() => { opening = null; });
+        }
+        return opening;
+    }
+
+    async function run(mode, fn) {
+        const db = await open();
+        const tx = db.transaction(STORE, mode);
+        const result = fn(tx.objectStore(STORE));
+        await done(tx);
+        return result instanceof IDBRequest ? result.result : result;
+    }
+
+    return {
+        // 取込結果で置き換える
+        replaceAll(records) {
+            return run('readwrite', store => {
+                store.clear();
+                records.forEach(record => store.add({ record }));
+            });
+        },
+
+        // 末尾に追加する（取込ジョブで完了したファイルの分から順に入れる）
+        append(records) {
+            return run('readwrite', store => {
+                records.forEach(record => store.add({ record }));
+            });
+        },
+
+        // [{ id, record }, ...] を取込順で返す
+        getAll() {
+            return run('readonly', store => store.getAll());
+        },
+
+        // 1件だけ読む（見つからなければ undefined）
+        async get(id) {
+            const entry = await run('readonly', store => store.get(id));
+            return entry ? entry.record : undefined;
+        },
+
+        put(id, record) {
+            return run('readwrite', store => { store.put({ id, record }); });
+        },
+
+        remove(ids) {
+            return run('readwrite', store => { ids.forEach(id => store.delete(id)); });
+        },
+
+        count() {
+            return run('readonly', store => store.count());
+        },
+    };
+})();
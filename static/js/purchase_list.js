@@ -1,9 +1,36 @@
 onDOMReady(() => {
+    const PAGE_SIZE = 100;
     const confirmBtn = document.getElementById('confirmData');
     const tableContainer = document.getElementById('purchaseListTable');
     const deleteAllBtn = document.getElementById('deleteAll');
-    
+    const filterForm = document.getElementById('purchaseListFilters');
+    const moreContainer = document.getElementById('purchaseListMore');
+    const loadMoreBtn = document.getElementById('loadMore');
+    const exportBtn = document.getElementById('exportCsv');
+    const deleteSelectedBtn = document.getElementById('deleteSelected');
+
+    // 一覧の読み込み状態（次ページはサーバーが返すカーソルで取得する）
+    let nextCursor = null;
+    let loading = false;
+    let requestSeq = 0;
+    let table = null;
+    // 絞り込み条件に合う総件数（削除した分はその場で差し引く）
+    let totalItems = 0;
+    // チェックしたレコードのid（スクロールで行が作り直されても保持する）
+    let selected = new Set();
+
     confirmBtn.addEventListener('click', loadPurchaseList);
+    loadMoreBtn.addEventListener('click', loadNextPage);
+    // 絞り込み条件をそのまま使い、部品明細込みのCSVをダウンロードする
+    exportBtn.addEventListener('click', () => {
+        window.location.href = `/api/purchase_list/export?${filterParams().toString()}`;
+    });
+    deleteSelectedBtn.addEventListener('click', deleteSelected);
+    filterForm.addEventListener('submit', (e) => {
+        e.preventDefault();
+        loadPurchaseList();
+    });
+
     if (deleteAllBtn) {
         deleteAllBtn.addEventListener('click', async () => {
             const ok = window.confirm('本当にデータベース内の仕入データを全て削除しますか？（開発用）');
@@ -12,6 +39,10 @@ onDOMReady(() => {
             try {
                 const res = await apiCall('/api/delete_all_data', { method: 'POST' });
                 if (res && res.success) {
+                    nextCursor = null;
+                    moreContainer.style.display = 'none';
+                    dropTable();
+                    clearSelection();
                     tableContainer.innerHTML = '<div class="empty-state">データがありません</div>';
                     alert('全件削除しました（開発用）');
                 } else {
@@ -25,68 +56,203 @@ onDOMReady(() => {
             }
         });
     }
-    
+
+    // 選択したレコードを部品ごと1回のバッチ要求でまとめて削除する
+    async function deleteSelected() {
+        const ids = Array.from(selected);
+        if (ids.length === 0) return;
+        if (!window.confirm(`選択した${ids.length}件のデータを部品情報ごと削除しますか？`)) return;
+
+        deleteSelectedBtn.disabled = true;
+        try {
+            const res = await apiCall('/api/batch', {
+                method: 'POST',
+                body: JSON.stringify({
+                    operations: ids.map(id => ({ op: 'delete', table: 'basic_info', id }))
+                })
+            });
+            // 既に削除済み（not_found）のものも一覧からは外す
+            const removed = new Set(res.results.map(r => ids[r.index]));
+            if (table) {
+                table.setData(table.data.filter(record => !removed.has(record.id)));
+                const deleted = res.results.filter(r => r.status === 'deleted').length;
+                updatePagination({
+                    has_more: Boolean(nextCursor),
+                    next_cursor: nextCursor,
+                    total_items: Math.max(0, totalItems - deleted)
+                });
+            }
+            clearSelection();
+            alert(`${res.applied_count}件削除しました`);
+        } catch (e) {
+            console.error('delete selected error', e);
+            alert(e.message || '削除中にエラーが発生しました');
+        } finally {
+            updateSelection();
+        }
+    }
+
+    function clearSelection() {
+        selected = new Set();
+        updateSelection();
+    }
+
+    function updateSelection() {
+        const count = selected.size;
+        const countElement = document.getElementById('selectedCount');
+        countElement.textContent = `${count}件選択中`;
+        countElement.style.display = count > 0 ? 'inline' : 'none';
+        deleteSelectedBtn.disabled = count === 0;
+
+        const master = document.getElementById('masterCheckbox');
+        if (!master) return;
+        const total = table ? table.length : 0;
+        master.checked = count > 0 && count === total;
+        master.indeterminate = count > 0 && count < total;
+    }
+
+    tableContainer.addEventListener('change', (e) => {
+        if (e.target.id === 'masterCheckbox') {
+            selected = e.target.checked && table ? new Set(table.data.map(record => record.id)) : new Set();
+            if (table) table.refresh();
+            updateSelection();
+        } else if (e.target.classList.contains('row-checkbox')) {
+            const id = parseInt(e.target.dataset.id, 10);
+            if (e.target.checked) {
+                selected.add(id);
+            } else {
+                selected.delete(id);
+            }
+            updateSelection();
+        }
+    });
+
+    function filterParams() {
+        const params = new URLSearchParams();
+        const formData = new FormData(filterForm);
+        ['search', 'date_from', 'date_to'].forEach(name => {
+            const value = (formData.get(name) || '').trim();
+            if (value) params.set(name, value);
+        });
+        return params;
+    }
+
+    function buildQuery(cursor) {
+        const params = filterParams();
+        params.set('limit', PAGE_SIZE);
+        params.set('sort', 'shipment_date');
+        params.set('order', 'desc');
+        if (cursor) params.set('cursor', cursor);
+        return params.toString();
+    }
+
     async function loadPurchaseList() {
+        const seq = ++requestSeq;
+        nextCursor = null;
+        moreContainer.style.display = 'none';
+        dropTable();
+        clearSelection();
+        loading = true;
         try {
             tableContainer.innerHTML = '<div class="loading">データを読み込み中...</div>';
-            
-            const data = await apiCall('/api/purchase_list');
-            
-            if (data.length === 0) {
+
+            const result = await apiCall(`/api/purchase_list?${buildQuery(null)}`);
+            if (seq !== requestSeq) return;
+            const { items, pagination } = result.data;
+
+            if (items.length === 0) {
                 tableContainer.innerHTML = '<div class="empty-state">データがありません</div>';
                 return;
             }
-            
-            displayPurchaseList(data);
+
+            renderTable();
+            appendRows(items);
+            updatePagination(pagination);
         } catch (error) {
-            tableContainer.innerHTML = '<div class="empty-state">データの読み込みに失敗しました</div>';
+            if (seq !== requestSeq) return;
+            tableContainer.innerHTML = `<div class="empty-state">データの読み込みに失敗しました${error.message ? `: ${error.message}` : ''}</div>`;
             console.error('Load error:', error);
+        } finally {
+            if (seq === requestSeq) loading = false;
+        }
+    }
+
+    async function loadNextPage() {
+        if (loading || !nextCursor) return;
+        const seq = requestSeq;
+        loading = true;
+        loadMoreBtn.disabled = true;
+        try {
+            const result = await apiCall(`/api/purchase_list?${buildQuery(nextCursor)}`);
+            if (seq !== requestSeq) return;
+            appendRows(result.data.items);
+            updatePagination(result.data.pagination);
+        } catch (error) {
+            console.error('Load more error:', error);
+            alert('続きの読み込みに失敗しました');
+        } finally {
+            loadMoreBtn.disabled = false;
+            if (seq === requestSeq) loading = false;
         }
     }
-    
-    function displayPurchaseList(data) {
-        
-        let html = `
+
+    function updatePagination(pagination) {
+        nextCursor = pagination.has_more ? pagination.next_cursor : null;
+        moreContainer.style.display = nextCursor ? '' : 'none';
+        totalItems = pagination.total_items;
+        const total = document.getElementById('purchaseListTotal');
+        if (total) total.textContent = totalItems;
+        const loaded = document.getElementById('purchaseListLoaded');
+        if (loaded && table) loaded.textContent = table.length;
+    }
+
+    function dropTable() {
+        if (table) {
+            table.destroy();
+            table = null;
+        }
+    }
+
+    function renderTable() {
+        tableContainer.innerHTML = `
             <div class="list-summary">
-                <p><strong>総件数:</strong> ${data.length}件</p>
+                <p><strong>総件数:</strong> <span id="purchaseListTotal">0</span>件（表示中: <span id="purchaseListLoaded">0</span>件）</p>
             </div>
-            <table>
-                <thead>
-                    <tr>
-                        <th>ページ</th>
-                        <th>出荷日</th>
-                        <th>受注番号</th>
-                        <th>納入先番号</th>
-                        <th>担当者</th>
-                        <th>運賃</th>
-                        <th>税抜合計</th>
-                        <th>登録日時</th>
-                    </tr>
-                </thead>
-                <tbody>
+            <div id="purchaseListRows"></div>
         `;
-        
-        data.forEach(record => {
-            const createdAt = new Date(record.created_at).toLocaleString('ja-JP');
-            html += `
-                <tr>
-                    <td>${record.ページ || ''}</td>
-                    <td>${formatDate(record.shipment_date)}</td>
-                    <td>${record.order_number}</td>
-                    <td>${record.delivery_number}</td>
-                    <td>${record.person_in_charge}</td>
-                    <td>${formatCurrency(record.shipping_cost)}</td>
-                    <td>${formatCurrency(record.total_amount)}</td>
-                    <td>${createdAt}</td>
-                </tr>
-            `;
+        // 最後の方までスクロールしたら次のページを読み込む
+        table = new VirtualTable(document.getElementById('purchaseListRows'), {
+            columns: [
+                {
+                    label: `<input type="checkbox" id="masterCheckbox" class="master-checkbox" aria-label="全選択/全解除">`,
+                    width: '48px'
+                },
+                'ページ', '出荷日', '受注番号', '納入先番号', '担当者', '運賃', '税抜合計', '登録日時'
+            ],
+            renderCells: renderCells,
+            onNearEnd: loadNextPage,
         });
-        
-        html += `
-                </tbody>
-            </table>
+    }
+
+    function renderCells(record) {
+        const createdAt = new Date(record.created_at).toLocaleString('ja-JP');
+        return `
+            <td>
+                <input type="checkbox" class="row-checkbox" data-id="${record.id}" ${selected.has(record.id) ? 'checked' : ''}>
+            </td>
+            <td>${record.ページ || ''}</td>
+            <td>${formatDate(record.shipment_date)}</td>
+            <td>${record.order_number}</td>
+            <td>${record.delivery_number}</td>
+            <td>${record.person_in_charge}</td>
+            <td>${formatCurrency(record.shipping_cost)}</td>
+            <td>${formatCurrency(record.total_amount)}</td>
+            <td>${createdAt}</td>
         `;
-        
-        tableContainer.innerHTML = html;
+    }
+
+    function appendRows(items) {
+        if (table) table.append(items);
+        updateSelection();
     }
 });
@@ -0,0 +1,133 @@
+// 仮想スクロールのテーブル
+// スクロール領域に見えている行（と前後の余白分）だけをDOMに置き、残りは
+// 上下のスペーサー行の高さで表す。行の高さは固定（rowHeight）で、セルは
+// 折り返さない。編集後は updateRow で該当行だけを差し替える。
+//
+//   const table = new VirtualTable(container, {
+//       columns: ['部品番号', { label: '操作', width: '160px' }],
+//       renderCells: (row, index) => `<td>${row.part_number}</td>...`,
+//       rowHeight: 40,
+//   });
+//   table.setData(rows);
+class VirtualTable {
+    constructor(container, options) {
+        this.container = container;
+        this.columns = options.columns.map(c => (typeof c === 'string' ? { label: c } : c));
+        this.renderCells = options.renderCells;
+        this.rowAttributes = options.rowAttributes || (() => '');
+        this.rowHeight = options.rowHeight || 40;
+        this.overscan = options.overscan !== undefined ? options.overscan : 10;
+        this.onNearEnd = options.onNearEnd || null;
+        this.nearEndRows = options.nearEndRows || 50;
+        this.data = [];
+        this.start = 0;
+        this.end = 0;
+        this.frame = null;
+
+        const colgroup = this.columns
+            .map(c => `<col${c.width ? ` style="width: ${c.width}"` : ''}>`)
+            .join('');
+        const headers = this.columns.map(c => `<th>${c.label}</th>`).join('');
+        container.innerHTML = `
+            <div class="virtual-table-viewport" style="max-height: ${options.maxHeight || '70vh'}">
+                <table class="virtual-table">
+                    <colgroup>${colgroup}</colgroup>
+                    <thead><tr>${headers}</tr></thead>
+                    <tbody></tbody>
+                </table>
+            </div>
+        `;
+        this.viewport = container.querySelector('.virtual-table-viewport');
+        this.tbody = container.querySelector('tbody');
+
+        this.onScroll = () => this.scheduleRender();
+        this.viewport.addEventListener('scroll', this.onScroll, { passive: true });
+        window.addEventListener('resize', this.onScroll);
+
+        this.setData(options.data || []);
+    }
+
+    get length() {
+        return this.data.length;
+    }
+
+    setData(rows) {
+        this.data = rows;
+        this.render(true);
+    }
+
+    append(rows) {
+        this.data.push(...rows);
+        this.render(true);
+    }
+
+    // 1行だけ差し替える（表示範囲外ならデータの更新のみ）
+    updateRow(index, row) {
+        if (row !== undefined) this.data[index] = row;
+        if (index < this.start || index >= this.end) return;
+        const tr = this.tbody.querySelector(`tr[data-row-index="${index}"]`);
+        if (tr) tr.outerHTML = this.rowHtml(index);
+    }
+
+    removeRow(index) {
+        this.data.splice(index, 1);
+        this.render(true);
+    }
+
+    // 表示中の行を描き直す（選択状態の一括変更など）
+    refresh() {
+        this.render(true);
+    }
+
+    scrollToIndex(index) {
+        this.viewport.scrollTop = index * this.rowHeight;
+        this.render();
+    }
+
+    destroy() {
+        this.viewport.removeEventListener('scroll', this.onScroll);
+        window.removeEventListener('resize', this.onScroll);
+        if (this.frame) cancelAnimationFrame(this.frame);
+    }
+
+    scheduleRender() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
+    }
+
+    rowHtml(index) {
+        const row = this.data[index];
+        return `<tr data-row-index="${index}" style="height: ${this.rowHeight}px" ${this.rowAttributes(row, index)}>${this.renderCells(row, index)}</tr>`;
+    }
+
+    spacerHtml(rows) {
+        if (rows <= 0) return '';
+        return `<tr class="virtual-table-spacer"><td colspan="${this.columns.length}" style="height: ${rows * this.rowHeight}px"></td></tr>`;
+    }
+
+    render(force = false) {
+        const total = this.data.length;
+        const scrollTop = this.viewport.scrollTop;
+        const viewportHeight = this.viewport.clientHeight || window.innerHeight;
+        const start = Math.max(0, Math.floor(scrollTop / this.rowHeight) - this.overscan);
+        const end = Math.min(total, Math.ceil((scrollTop + viewportHeight) / this.rowHeight) + this.overscan);
+
+        if (force || start !== this.start || end !== this.end) {
+            this.start = start;
+            this.end = end;
+            let html = this.spacerHtml(start);
+            for (let i = start; i < end; i++) {
+                html += this.rowHtml(i);
+            }
+            html += this.spacerHtml(total - end);
+            this.tbody.innerHTML = html;
+        }
+
+        if (this.onNearEnd && total > 0 && end >= total - this.nearEndRows) {
+            this.onNearEnd();
+        }
+    }
+}
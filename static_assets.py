@@ -0,0 +1,65 @@
+"""Content-hashed URLs and long-lived caching for ``/static``.
+
+``url_for('static', filename=...)`` gets a ``v`` query parameter holding a
+short hash of the file's contents, so a changed file gets a new URL and
+templates no longer carry hand-bumped ``?v=`` versions. Responses requested
+with the current hash are cacheable for ``StaticConfig.MAX_AGE`` and marked
+``immutable``; any other static request (stale or missing hash) must
+revalidate, which the ETag Flask sends answers with a 304.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from flask import current_app, request
+
+from config import StaticConfig
+
+
+@lru_cache(maxsize=256)
+def _hash_file(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def asset_version(filename):
+    """Content hash of a file under the static folder, or None if it is missing."""
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    # Keyed on mtime and size too, so an edited file is hashed again.
+    return _hash_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _add_version(endpoint, values):
+    if endpoint != 'static' or 'v' in values or 'filename' not in values:
+        return
+    version = asset_version(values['filename'])
+    if version:
+        values['v'] = version
+
+
+def _cache_headers(response):
+    if request.endpoint != 'static' or response.status_code not in (200, 304):
+        return response
+    filename = (request.view_args or {}).get('filename')
+    version = request.args.get('v')
+    if version and filename and version == asset_version(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = StaticConfig.MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    return response
+
+
+def init_app(app):
+    app.url_defaults(_add_version)
+    app.after_request(_cache_headers)
@@ -0,0 +1,117 @@
+"""Scan uploads spooled to disk once and streamed on from there.
+
+Routes that receive scans for Dify are wrapped in ``scan_upload``. It
+answers 413 from ``Content-Length`` before any of the body is read
+(``UPLOAD_MAX_REQUEST_BYTES``), and has werkzeug write each uploaded file
+straight into a named temporary file under ``UPLOAD_SPOOL_DIR`` instead of
+its in-memory spool, stopping a file as soon as it passes
+``UPLOAD_MAX_FILE_BYTES`` and the request as soon as its files together pass
+``UPLOAD_MAX_REQUEST_BYTES`` (a chunked request has no ``Content-Length``). From there the file is read in chunks: hashed
+for the result cache, handed to the pre-processing pool by path, hard-linked
+into an import job's directory and sent to Dify as a streamed multipart body
+(``dify_client.MultipartFileBody``). Memory per request stays flat whatever
+the batch size. The temporary files are deleted when the request closes its
+files.
+"""
+import os
+import tempfile
+from functools import wraps
+
+from flask import Request, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from config import UploadConfig
+
+
+class RequestTooLarge(RequestEntityTooLarge):
+    """The files of one request together passed ``UPLOAD_MAX_REQUEST_BYTES``."""
+
+
+class SpooledUpload:
+    """Named temporary file that refuses to grow past ``limit`` bytes, or past
+    ``UPLOAD_MAX_REQUEST_BYTES`` together with the other files of ``owner``'s request."""
+
+    def __init__(self, limit, owner):
+        os.makedirs(UploadConfig.SPOOL_DIR, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=UploadConfig.SPOOL_DIR, prefix='scan-')
+        self.limit = limit
+        self.owner = owner
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge()
+        self.owner.spooled_bytes += len(data)
+        if self.owner.spooled_bytes > UploadConfig.MAX_REQUEST_BYTES:
+            raise RequestTooLarge()
+        return self._file.write(data)
+
+    @property
+    def path(self):
+        return self._file.name
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request class whose file uploads go to ``SpooledUpload`` on ``scan_upload`` routes."""
+
+    spool_uploads = False
+    spooled_bytes = 0
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.spool_uploads:
+            return SpooledUpload(UploadConfig.MAX_FILE_BYTES, self)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+
+
+def _too_large(message, limit):
+    return jsonify({'error': f'{message}（上限 {limit // (1024 * 1024)}MB）'}), 413
+
+
+def scan_upload(view):
+    """Enforce the upload limits and spool the request's files before ``view`` runs."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.content_length is not None and request.content_length > UploadConfig.MAX_REQUEST_BYTES:
+            return _too_large('アップロードするファイルの合計が大きすぎます', UploadConfig.MAX_REQUEST_BYTES)
+
+        request.spool_uploads = True
+        try:
+            request.files
+        except RequestTooLarge:
+            return _too_large('アップロードするファイルの合計が大きすぎます', UploadConfig.MAX_REQUEST_BYTES)
+        except RequestEntityTooLarge:
+            return _too_large('ファイルが大きすぎます', UploadConfig.MAX_FILE_BYTES)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def file_path(stream):
+    """Filesystem path holding the contents of an upload or open file, or None if it is only in memory."""
+    stream = getattr(stream, 'stream', stream)
+    if isinstance(stream, SpooledUpload):
+        return stream.path
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and 'r' in getattr(stream, 'mode', '') and os.path.isfile(name):
+        return name
+    return None
+
+
+def save(file, path):
+    """Store an upload at ``path``, by hard link when it is already spooled on the same filesystem."""
+    source = file_path(file)
+    if source:
+        try:
+            os.link(source, path)
+            return
+        except OSError:
+            pass
+    file.save(path)
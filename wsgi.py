@@ -0,0 +1,15 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``gunicorn.conf.py`` preloads this module in the master process, so the
+schema is initialized once before the workers fork; each worker then resumes
+unfinished import jobs and drains its in-flight Dify work on shutdown. Other
+WSGI servers can serve ``app`` from here too (the migrations are safe to run
+from several processes at once) but should call
+``import_jobs.resume_jobs()`` / ``import_jobs.shutdown()`` themselves.
+"""
+from app import create_app, init_db
+
+init_db()
+app = create_app()